@@ -0,0 +1,303 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "exact_models"))
+
+INSTANCES_DIR = os.path.join(ROOT, "instances", "IGP_weight_based")
+# the instances of each tier, as <archive>/<name>. The tiers are bounded by the Nodes column of graphs.csv
+TIERS = {
+    "small": ["zoo/Abilene", "zoo/Cesnet1997", "zoo/Aarnet", "zoo/York"],
+    "medium": ["zoo/Bics", "zoo/Chinanet", "zoo/Surfnet", "defo/synth50_opt_hard"],
+    "large": ["zoo/Intellifiber", "rocketfuel/rf3967_real_hard", "zoo/Cogentco"],
+}
+TIER_NODES = {"small": (0, 25), "medium": (26, 60), "large": (61, 10 ** 9)}
+STAGES = ["parse", "symptoms", "cache", "prune", "wcnf", "verify"]
+SOLVERS = ["ortools", "gurobi", "nuwls-c", "greedy", "portfolio"]
+# timings below this value (in seconds) are considered as noise when comparing to the baseline
+NOISE = 0.05
+
+
+def instance_path(name):
+    """
+    :param name: an instance of TIERS
+    :return: the path to the .routes file, inside its archive
+    """
+    collection, instance = name.split("/")
+    return os.path.join(INSTANCES_DIR, f"{collection}.tar.gz:{collection}/{instance}.routes")
+
+
+def check_tiers():
+    """
+    Check that the instances of each tier match the bounds of TIER_NODES
+    :return: a dictionary mapping each instance to its number of nodes and routes
+    """
+    from utils import read_graphs_csv
+
+    sizes = {}
+    for collection in sorted({name.split("/")[0] for names in TIERS.values() for name in names}):
+        archive = os.path.join(INSTANCES_DIR, f"{collection}.tar.gz")
+        sizes.update(read_graphs_csv(f"{archive}:{collection}/graphs.csv"))
+
+    description = {}
+    for tier, names in TIERS.items():
+        low, high = TIER_NODES[tier]
+        for name in names:
+            nodes, routes = sizes[instance_path(name)]
+            if not low <= nodes <= high:
+                raise ValueError(f"{name} has {nodes} nodes, it does not belong to the {tier} tier")
+            description[name] = {"tier": tier, "nodes": nodes, "routes": routes}
+    return description
+
+
+def extract_suite(names, directory):
+    """
+    Copy the instances (and their reductions) out of the archives, so that the stages do not measure the decompression
+    :param names: instances of TIERS
+    :param directory: the directory receiving the instances
+    :return: a dictionary mapping each instance to the path of its extracted .routes file
+    """
+    from utils import open_instance_file
+
+    paths = {}
+    for name in names:
+        for extension in (".routes", ".rdc"):
+            path = os.path.join(directory, name.replace("/", "_") + extension)
+            with open_instance_file(instance_path(name).replace(".routes", extension), 'rb') as source, \
+                    open(path, 'wb') as target:
+                shutil.copyfileobj(source, target)
+        paths[name] = path.replace(".rdc", ".routes")
+    return paths
+
+
+def run_stage(stage, path, goal, timelimit):
+    """
+    Run one stage of the pipeline on an instance
+    :param stage: an element of STAGES, "solve:<solver>", or "anytime:<solver>" to solve with an incumbent collecting
+                the improving solutions (as --trajectory does)
+    :param path: the path to the instance
+    :param goal: "cover" or "1id"
+    :param timelimit: the timelimit of the solvers, in seconds
+    :return: a dictionary containing the measures of the stage (wall time and stage specific measures)
+    """
+    from instance_cache import load_instance
+    from max_sat import write_clauses_monitor_problem
+    from pruning import prune_constraints
+    from utils import stream_instance
+    from verifier import is_1id, measurement_paths
+
+    if stage.startswith(("solve:", "anytime:")):
+        from anytime import Trajectory
+        from monitor_placement import is_valid, solve_instance
+
+        kind, solver = stage.split(":")
+        start = time.perf_counter()
+        result = solve_instance(path, solver, goal, timelimit=timelimit,
+                                incumbent=Trajectory() if kind == "anytime" else None)
+        return {"wall_time": time.perf_counter() - start, "solve_time": result["solving_time"],
+                "status": str(result["status"]), "monitors": result["monitors_nbr"], "valid": is_valid(result)}
+
+    if stage in ("parse", "symptoms"):
+        start = time.perf_counter()
+        # the symptoms are built while parsing, the symptoms stage rebuilds them from the flat arrays
+        arrays, symptoms = stream_instance(path)
+        parsed = time.perf_counter()
+        if stage == "parse":
+            return {"wall_time": parsed - start, "routes": arrays.m}
+        symptoms = arrays.symptoms()
+        return {"wall_time": time.perf_counter() - parsed, "nonzeros": symptoms.nonzeros()}
+
+    if stage == "cache":
+        load_instance(path)  # fills the cache if needed
+        start = time.perf_counter()
+        load_instance(path)
+        return {"wall_time": time.perf_counter() - start}
+
+    n, symptoms, endpoints = load_instance(path)
+    start = time.perf_counter()
+    if stage == "prune":
+        _, stats = prune_constraints(symptoms, goal)
+        return {"wall_time": time.perf_counter() - start, "constraints": stats["constraints"],
+                "nonzeros": stats["nonzeros"], "kept_constraints": stats["kept_constraints"],
+                "kept_nonzeros": stats["kept_nonzeros"]}
+    if stage == "wcnf":
+        fd, clause_path = tempfile.mkstemp(suffix=".wcnf")
+        os.close(fd)
+        try:
+            write_clauses_monitor_problem(n, symptoms, endpoints, goal, clause_path=clause_path)
+            return {"wall_time": time.perf_counter() - start, "bytes": os.path.getsize(clause_path)}
+        finally:
+            os.remove(clause_path)
+    if stage == "verify":
+        path_mask = measurement_paths(endpoints, range(n))
+        is_1id(symptoms, path_mask)
+        return {"wall_time": time.perf_counter() - start}
+    raise ValueError(f"unknown stage {stage}")
+
+
+def _measure(stage, path, goal, timelimit, cache_dir, connection):
+    """
+    Entry point of the benchmark processes, each measure runs in a fresh process to get its own peak memory
+    """
+    # set before instance_cache is imported, the stages and the solvers use the cache of the suite
+    os.environ["MONITOR_PLACEMENT_CACHE"] = cache_dir
+    try:
+        measures = run_stage(stage, path, goal, timelimit)
+    except Exception as e:
+        measures = {"error": f"{type(e).__name__}: {e}"}
+    # ru_maxrss is in KB on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    measures["peak_rss_mb"] = peak / (1 << 20) if sys.platform == "darwin" else peak / (1 << 10)
+    connection.send(measures)
+    connection.close()
+
+
+def measure(stage, path, goal, timelimit, cache_dir):
+    context = multiprocessing.get_context("spawn")
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=_measure, args=(stage, path, goal, timelimit, cache_dir, sender))
+    process.start()
+    sender.close()
+    try:
+        return receiver.recv()
+    except EOFError:
+        return {"error": f"process exited with code {process.exitcode}"}
+    finally:
+        process.join()
+
+
+def run_suite(tiers, goals, stages, timelimit, repeat=1):
+    """
+    Run the benchmark suite
+    :param tiers: the tiers to run
+    :param goals: the goals to run
+    :param stages: the stages to run (elements of STAGES or "solve:<solver>")
+    :param timelimit: the timelimit of the solvers, in seconds
+    :param repeat: the number of runs of each measure, the fastest one is kept
+    :return: a dictionary containing the description of the machine and the measures, indexed by
+            "<instance>|<goal>|<stage>"
+    """
+    description = check_tiers()
+    results = {}
+    # the instances and the cache are both temporary, the cache of the user is neither read nor written
+    with tempfile.TemporaryDirectory() as directory:
+        paths = extract_suite([name for tier in tiers for name in TIERS[tier]], directory)
+        cache_dir = os.path.join(directory, "cache")
+        for tier in tiers:
+            for name in TIERS[tier]:
+                for goal in goals:
+                    for stage in stages:
+                        runs = [measure(stage, paths[name], goal, timelimit, cache_dir) for _ in range(repeat)]
+                        best = min(runs, key=lambda run: run.get("wall_time", float("inf")))
+                        best.update(description[name])
+                        results[f"{name}|{goal}|{stage}"] = best
+                        print(f"{name:30} {goal:5} {stage:15} " +
+                              (f"{best['wall_time']:9.3f}s {best['peak_rss_mb']:8.1f}MB" if "error" not in best
+                               else best["error"]), flush=True)
+    return {"machine": platform.node(), "python": platform.python_version(), "timelimit": timelimit,
+            "results": results}
+
+
+def compare(results, baseline, tolerance):
+    """
+    Compare the measures with a baseline
+    :param results: the dictionary returned by run_suite
+    :param baseline: a dictionary returned by run_suite on the reference version
+    :param tolerance: the relative slowdown (or memory increase) tolerated, e.g. 0.2 for 20%
+    :return: a list of strings describing the regressions
+    """
+    regressions = []
+    for key, measures in results["results"].items():
+        reference = baseline["results"].get(key)
+        if reference is None or "error" in reference:
+            continue
+        if "error" in measures:
+            regressions.append(f"{key} : {measures['error']}")
+            continue
+        for metric, noise in (("wall_time", NOISE), ("solve_time", NOISE), ("peak_rss_mb", 1)):
+            if metric not in measures or metric not in reference:
+                continue
+            if measures[metric] > reference[metric] * (1 + tolerance) + noise:
+                regressions.append(f"{key} : {metric} {reference[metric]:.3f} -> {measures[metric]:.3f}")
+        if "monitors" in measures and measures.get("valid") and reference.get("valid") and \
+                measures["status"] == reference["status"] and measures["monitors"] > reference["monitors"]:
+            regressions.append(f"{key} : monitors {reference['monitors']} -> {measures['monitors']}")
+    return regressions
+
+
+def compare_anytime(results):
+    """
+    Compare the statuses of the resolutions with and without an incumbent, following the improving solutions must not
+    change the outcome of a resolution
+    :param results: the dictionary returned by run_suite
+    :return: a list of strings describing the differences
+    """
+    from portfolio import is_optimal
+
+    differences = []
+    for key, measures in results["results"].items():
+        name, goal, stage = key.split("|")
+        if not stage.startswith("anytime:"):
+            continue
+        reference = results["results"].get(f"{name}|{goal}|solve:{stage[len('anytime:'):]}")
+        if reference is None or "error" in reference or "error" in measures:
+            continue
+        if is_optimal(measures["status"]) != is_optimal(reference["status"]):
+            differences.append(f"{key} : status {reference['status']} without incumbent, {measures['status']} with")
+    return differences
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="benchmark the pipeline stages and the solvers")
+    parser.add_argument('--tiers', nargs='+', choices=list(TIERS), default=["small", "medium"])
+    parser.add_argument('-g', '--goal', nargs='+', choices=["cover", "1id"], default=["cover", "1id"])
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES)
+    parser.add_argument('-s', '--solver', nargs='*', choices=SOLVERS, default=["ortools"],
+                        help="solvers to benchmark (none to only benchmark the pipeline stages)")
+    parser.add_argument('--anytime', action='store_true',
+                        help="also run each solver with an incumbent and check that it reports the same status")
+    parser.add_argument('-t', '--timelimit', type=int, default=60, help="timelimit of the solvers, in seconds")
+    parser.add_argument('--repeat', type=int, default=1, help="number of runs of each measure, the fastest is kept")
+    parser.add_argument('-o', '--output', help="file to store the results (json)", required=False)
+    parser.add_argument('-b', '--baseline', help="baseline to compare with (json), no comparison without it")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="relative slowdown tolerated (default 0.2)")
+    parser.add_argument('--save-baseline', action='store_true', help="store the results in the baseline file")
+
+    args = parser.parse_args()
+    if args.save_baseline and not args.baseline:
+        parser.error("--save-baseline requires --baseline")
+
+    stages = args.stages + [f"solve:{solver}" for solver in args.solver]
+    if args.anytime:
+        stages += [f"anytime:{solver}" for solver in args.solver]
+    results = run_suite(args.tiers, args.goal, stages, args.timelimit, args.repeat)
+    differences = compare_anytime(results)
+    if args.anytime:
+        print(f"{len(differences)} status difference(s) with an incumbent")
+        for difference in differences:
+            print(f"  {difference}")
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=1)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as file:
+            json.dump(results, file, indent=1)
+    elif args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        print(f"{len(regressions)} regression(s) compared to {args.baseline}")
+        for regression in regressions:
+            print(f"  {regression}")
+        if regressions:
+            sys.exit(1)
+    if differences:
+        sys.exit(1)
@@ -0,0 +1,151 @@
+import queue
+import threading
+from math import ceil, inf
+from time import time
+
+
+class Trajectory:
+    """
+    class recording the improving solutions found by a solver along with the time at which they are found. It has the
+    interface of portfolio.SharedIncumbent, so that it can be given to every backend as their incumbent : NuWLS-c
+    reports the models it prints, Gurobi and CP-SAT report the solutions found by their callbacks. The search is
+    stopped as soon as the target number of monitors is reached, the optimality is proven, or no improving solution has
+    been found for stagnation seconds
+    """
+
+    def __init__(self, target=None, stagnation=None, on_solution=None):
+        """
+        create a Trajectory object
+        :param target: a number of monitors, the search stops once a solution this small is found
+        :param stagnation: a number of seconds, the search stops when no improving solution is found for this long
+                        (after the first one)
+        :param on_solution: a function called with (time, number of monitors, monitors, backend) on each improving
+                        solution, from the thread of the solver
+        """
+        self.target = target
+        self.stagnation = stagnation
+        self.on_solution = on_solution
+        self.lock = threading.Lock()
+        self.start = time()
+        self.last_improvement = None
+        self.lower_bound = 0
+        # set when the consumer of the solutions is gone, see iter_solutions
+        self.stopped = False
+        # (time, number of monitors, monitors, backend) of each improving solution
+        self.points = []
+
+    def report(self, monitors, backend):
+        """
+        Record a solution if it is better than the current one
+        :param monitors: a feasible set of monitors
+        :param backend: the name of the solver that found it
+        :return: True if the solution has been recorded
+        """
+        monitors = sorted(monitors)
+        with self.lock:
+            if len(monitors) >= self.best_size():
+                return False
+            self.last_improvement = time()
+            point = (self.last_improvement - self.start, len(monitors), monitors, backend)
+            self.points.append(point)
+        if self.on_solution is not None:
+            self.on_solution(*point)
+        return True
+
+    def report_bound(self, bound):
+        """
+        Store a lower bound on the number of monitors if it is better than the current one
+        :param bound: a lower bound (the objective bound of a solver)
+        """
+        self.lower_bound = max(self.lower_bound, ceil(bound - 1e-6))
+
+    def best_size(self):
+        return self.points[-1][1] if self.points else inf
+
+    def best(self):
+        """
+        :return: the size of the best solution and the list of its monitors
+        """
+        with self.lock:
+            return (self.points[-1][1], list(self.points[-1][2])) if self.points else (inf, [])
+
+    def stop(self):
+        """
+        Stop the search, the solvers stop at their next check of closed
+        """
+        self.stopped = True
+
+    def closed(self):
+        """
+        :return: True if the search can stop : the target is reached, the best solution is proven optimal, the
+                search stagnates or it has been stopped
+        """
+        if self.stopped:
+            return True
+        size = self.best_size()
+        if self.lower_bound >= size or (self.target is not None and size <= self.target):
+            return True
+        # the stagnation is only measured once a first solution is found, the model may take long to build
+        return self.stagnation is not None and bool(self.points) and \
+            time() - self.last_improvement > self.stagnation
+
+    def time_to_target(self, target):
+        """
+        :param target: a number of monitors
+        :return: the time (in seconds) at which a solution with at most target monitors has been found, None if no
+                such solution has been found
+        """
+        return next((point[0] for point in self.points if point[1] <= target), None)
+
+    def curve(self):
+        """
+        :return: the list of tuples (time, number of monitors, backend) of the improving solutions
+        """
+        return [(elapsed, size, backend) for elapsed, size, _, backend in self.points]
+
+
+def iter_solutions(n, symptoms, endpoints, solver, goal, target=None, stagnation=None, **options):
+    """
+    Solve the monitor placement problem in a background thread and yield the improving solutions as soon as they are
+    found (see Trajectory). The solvers release the GIL while they search, so that the consumer runs meanwhile
+    :param n: number of nodes
+    :param symptoms: a SymptomMatrix, symptoms[i] contains the indexes of the routes that cross node i
+    :param endpoints: a list of tuples : endpoints[j] contains the starting and ending nodes of route j
+    :param solver: "gurobi", "ortools", "nuwls-c", "greedy" or "portfolio"
+    :param goal: "cover" or "1id"
+    :param target: a number of monitors, the search stops once a solution this small is found
+    :param stagnation: a number of seconds, the search stops when no improving solution is found for this long
+                    (after the first one)
+    :param options: the other arguments of monitor_placement.solve_problem
+    :return: a generator of tuples (time, number of monitors, monitors, backend), the dictionary returned by
+            solve_problem is the value of the generator (result = yield from iter_solutions(...)). If the consumer
+            stops iterating, the search is stopped as well
+    """
+    from monitor_placement import solve_problem
+
+    found = queue.SimpleQueue()
+    trajectory = Trajectory(target, stagnation, lambda *point: found.put(point))
+    outcome = {}
+
+    def run():
+        try:
+            outcome["result"] = solve_problem(n, symptoms, endpoints, solver, goal, incumbent=trajectory, **options)
+        except BaseException as error:
+            outcome["error"] = error
+        finally:
+            found.put(None)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    try:
+        point = found.get()
+        while point is not None:
+            yield point
+            point = found.get()
+    finally:
+        # the generator is also closed when the consumer leaves the loop (break, exception, garbage collection)
+        trajectory.stop()
+    thread.join()
+    if "error" in outcome:
+        raise outcome["error"]
+    return outcome["result"]
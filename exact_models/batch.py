@@ -0,0 +1,288 @@
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import posixpath
+import signal
+import sys
+import tarfile
+import time
+from itertools import product
+from multiprocessing.connection import wait
+
+from utils import ARCHIVE_SUFFIXES, archive_instances, read_graphs_csv, split_archive_path
+from monitor_placement import CSV_FIELDS, DEFAULT_TIMEOUT, csv_line, solve_instance
+from profiling import profile_fields
+
+# seconds given to a job after its timelimit before it is killed (loading, model building, verification)
+GRACE_TIME = 60
+# memory limit of each job, in MB
+DEFAULT_MEMORY = 20 * 1000
+# fields identifying a job, used to resume an interrupted sweep
+JOB_KEY = ("instance", "solver", "goal", "reductions")
+
+
+def collect_instances(source):
+    """
+    List the instances of a source and their size
+    :param source: a directory, a tar archive or a graphs.csv file
+    :return: a list of instances paths and a dictionary mapping the instances to their number of nodes and routes
+            (only for the instances described in a graphs.csv file)
+    """
+    if source.endswith('.csv'):
+        sizes = read_graphs_csv(source)
+        return list(sizes), sizes
+
+    if source.endswith(ARCHIVE_SUFFIXES):
+        instances = archive_instances(source)
+        with tarfile.open(source) as tar:
+            descriptions = [member.name for member in tar.getmembers()
+                            if member.isfile() and posixpath.basename(member.name) == 'graphs.csv']
+    else:
+        instances, descriptions = [], []
+        for directory, _, files in os.walk(source):
+            for file in sorted(files):
+                if file.endswith('.routes') and not file.startswith('._'):
+                    instances.append(os.path.join(directory, file))
+                elif file == 'graphs.csv':
+                    descriptions.append(os.path.join(directory, file))
+
+    sizes = {}
+    for description in descriptions:
+        sizes.update(read_graphs_csv(f"{source}:{description}" if source.endswith(ARCHIVE_SUFFIXES) else description))
+    return instances, sizes
+
+
+def instance_size(instance, sizes):
+    """
+    :return: a sort key, the number of routes and nodes of the instance if known, the size of its file otherwise
+    """
+    if instance in sizes:
+        nodes, routes = sizes[instance]
+        return 1, routes, nodes
+    archive, member = split_archive_path(instance)
+    if archive is None:
+        return 0, os.path.getsize(instance), 0
+    with tarfile.open(archive) as tar:
+        return 0, tar.getmember(member).size, 0
+
+
+def make_jobs(sources, solvers, goals, reductions, options):
+    """
+    Build the jobs of a sweep, largest instances first so that the long jobs do not end up alone at the end
+    :param sources: a list of directories, tar archives or graphs.csv files
+    :param solvers: a list of solvers
+    :param goals: a list of goals
+    :param reductions: a list of booleans, whether to use the problem reductions
+    :param options: the other arguments of solve_instance, shared by all the jobs
+    :return: a list of dictionaries, the arguments of solve_instance for each job
+    """
+    instances, sizes = [], {}
+    for source in sources:
+        source_instances, source_sizes = collect_instances(source)
+        instances += source_instances
+        sizes.update(source_sizes)
+    instances.sort(key=lambda instance: instance_size(instance, sizes), reverse=True)
+
+    return [dict(options, instance=instance, solver=solver, goal=goal, reductions=reduction)
+            for instance, solver, goal, reduction in product(instances, solvers, goals, reductions)]
+
+
+def job_key(job):
+    return tuple(str(job[field]) for field in JOB_KEY)
+
+
+def completed_jobs(output):
+    """
+    Read the jobs already written in an output file
+    :param output: the path to a .csv or .jsonl file
+    :return: the set of keys of the completed jobs
+    """
+    if not os.path.isfile(output):
+        return set()
+    with open(output) as file:
+        if output.endswith('.jsonl'):
+            rows = [json.loads(line) for line in file if line.strip()]
+        else:
+            rows = csv.DictReader(file, delimiter=';')
+        return {job_key(row) for row in rows}
+
+
+class ResultWriter:
+    """
+    class writing the results of the jobs as soon as they are available, in csv (same columns as monitor_placement.py
+    -c, with a header) or in jsonl (one dictionary per line)
+    """
+
+    def __init__(self, output=None, profile=False):
+        """
+        create a ResultWriter object
+        :param output: the path to a .csv or .jsonl file, the results are appended to it. If None, the csv lines are
+                    printed on the standard output
+        :param profile: if True, the csv lines end with the measures of each phase (see profiling.profile_fields)
+        """
+        self.jsonl = output is not None and output.endswith('.jsonl')
+        self.profile = profile
+        write_header = output is None or not os.path.isfile(output) or os.path.getsize(output) == 0
+        self.file = open(output, 'a') if output is not None else None
+        if write_header and not self.jsonl:
+            self._write(";".join(CSV_FIELDS + (profile_fields() if profile else ())))
+
+    def _write(self, line):
+        if self.file is None:
+            print(line, flush=True)
+        else:
+            self.file.write(line + "\n")
+            self.file.flush()
+
+    def write(self, result):
+        if self.jsonl:
+            self._write(json.dumps(result, default=str))
+        else:
+            self._write(csv_line(result, self.profile))
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+
+
+def _failed_result(job, status, elapsed):
+    result = {field: None for field in CSV_FIELDS}
+    result.update({field: job[field] for field in JOB_KEY})
+    result.update(status=status, total_time=elapsed, monitors_nbr=0, coverage=False)
+    result["1id"] = False
+    return result
+
+
+def _run_job(job, memory, connection):
+    """
+    Entry point of the job processes
+    """
+    if memory:
+        import resource
+        limit = memory * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    start = time.time()
+    try:
+        result = solve_instance(**job)
+    except MemoryError:
+        result = _failed_result(job, 'MemoryError', time.time() - start)
+    except Exception as e:
+        result = _failed_result(job, f'Error ({type(e).__name__}: {e})', time.time() - start)
+    connection.send(result)
+    connection.close()
+
+
+def run_jobs(jobs, workers, memory, writer):
+    """
+    Run the jobs in parallel, each one in its own process. A job exceeding its timelimit (plus GRACE_TIME) is killed
+    :param jobs: a list of dictionaries, the arguments of solve_instance for each job
+    :param workers: the maximum number of jobs run at the same time
+    :param memory: the memory limit of each job, in MB (0 for no limit)
+    :param writer: a ResultWriter receiving the results
+    """
+    context = multiprocessing.get_context("spawn")
+    pending = list(reversed(jobs))
+    running = {}  # connection -> (process, job, start time)
+    try:
+        while pending or running:
+            while pending and len(running) < workers:
+                job = pending.pop()
+                receiver, sender = context.Pipe(duplex=False)
+                process = context.Process(target=_run_job, args=(job, memory, sender), daemon=True)
+                process.start()
+                sender.close()
+                running[receiver] = (process, job, time.time())
+
+            now = time.time()
+            deadline = min(start + job["timelimit"] + GRACE_TIME for _, job, start in running.values())
+            for receiver in wait(list(running), timeout=max(0, deadline - now)):
+                process, job, start = running.pop(receiver)
+                try:
+                    result = receiver.recv()
+                except EOFError:  # the process died before sending its result
+                    process.join()
+                    status = 'MemoryError' if process.exitcode == -9 else 'Error'
+                    result = _failed_result(job, status, time.time() - start)
+                receiver.close()
+                process.join()
+                writer.write(result)
+
+            now = time.time()
+            for receiver, (process, job, start) in list(running.items()):
+                if now > start + job["timelimit"] + GRACE_TIME:
+                    process.kill()
+                    process.join()
+                    receiver.close()
+                    del running[receiver]
+                    writer.write(_failed_result(job, 'Killed', now - start))
+
+    finally:
+        # interrupted sweep, do not leave orphan jobs behind
+        for process, _, _ in running.values():
+            process.kill()
+            process.join()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="solve every instance of a collection")
+    parser.add_argument('sources', nargs='+',
+                        help="directories, tar archives or graphs.csv files containing the instances")
+    parser.add_argument('-s', '--solver', help="choice of models", nargs='+',
+                        choices=["gurobi", "ortools", "nuwls-c", "greedy", "portfolio"], required=True)
+    parser.add_argument('-g', '--goal', help="goals of models", nargs='+',
+                        choices=["cover", "1id"], required=True)
+    parser.add_argument('-r', '--reductions', help="with or without problem reductions", nargs='+',
+                        choices=["yes", "no"], default=["no"])
+    parser.add_argument('-p', '--prune', help="remove duplicated and subsumed constraints before building the model",
+                        required=False, action='store_true')
+    parser.add_argument('--lazy', help="add the 1-identifiability constraints only when a solution violates them",
+                        required=False, action='store_true')
+    parser.add_argument('--fifo', help="feed the clauses to nuwls-c through a FIFO instead of a temporary file",
+                        required=False, action='store_true')
+    parser.add_argument('--warm-start', help="start the solvers from the solution of the greedy heuristic",
+                        required=False, action='store_const', const="greedy")
+    parser.add_argument('--decompose', help="solve the blocks of the networks separately", required=False,
+                        action='store_true')
+    parser.add_argument('--bounds', help="compute a lower bound first, the jobs stop as soon as a solution reaches it",
+                        required=False, action='store_true')
+    parser.add_argument('--model-cache', help="reuse the pruned models built by previous jobs (same instance, goal and "
+                                              "reductions)", required=False, action='store_true')
+    parser.add_argument('--no-improve', help="do not remove the redundant monitors of the solutions", required=False,
+                        action='store_true')
+    parser.add_argument('--profile', help="measure the time of each phase, the peak RSS and the size of the models "
+                                          "(added to the results)", required=False, action='store_true')
+    parser.add_argument('--profile-memory', help="also measure the peak Python allocations of each phase, the phases "
+                                                 "run several times slower (implies --profile)", required=False,
+                        action='store_true')
+    parser.add_argument('-t', '--timelimit', help="timelimit of each job, in seconds", type=int,
+                        default=DEFAULT_TIMEOUT)
+    parser.add_argument('-m', '--memory', help="memory limit of each job, in MB (0 for no limit), the models are "
+                                               "chosen to fit in it", type=int,
+                        default=DEFAULT_MEMORY)
+    parser.add_argument('-j', '--jobs', help="number of jobs run in parallel", type=int,
+                        default=os.cpu_count())
+    parser.add_argument('-o', '--output', help="file (.csv or .jsonl) receiving the results, the jobs already in this "
+                                               "file are skipped", required=False)
+
+    args = parser.parse_args()
+
+    options = {"prune": args.prune, "lazy": args.lazy, "fifo": args.fifo, "timelimit": args.timelimit,
+               "warm_start": args.warm_start, "decompose": args.decompose,
+               "bounds": args.bounds, "memory": args.memory or None,
+               "model_cache": args.model_cache, "improve": not args.no_improve, "profile": args.profile,
+               "profile_memory": args.profile_memory}
+    jobs = make_jobs(args.sources, args.solver, args.goal, [reduction == "yes" for reduction in args.reductions],
+                     options)
+    if args.output:
+        done = completed_jobs(args.output)
+        jobs = [job for job in jobs if job_key(job) not in done]
+
+    # a terminated sweep stops its running jobs, the next run resumes from the output file
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(1))
+    writer = ResultWriter(args.output, args.profile or args.profile_memory)
+    try:
+        run_jobs(jobs, max(1, args.jobs), args.memory, writer)
+    finally:
+        writer.close()
@@ -0,0 +1,135 @@
+from itertools import chain
+from math import ceil
+from time import time
+
+from reductions import forced_monitors, independent_nodes
+from symptoms import iter_bits, mask_from_indices
+
+# the LP solver gets at most this many seconds, and at most a tenth of the timelimit of the resolution
+BOUND_TIMELIMIT = 60
+
+
+def fixed_monitors(symptoms, endpoints, goal, independant_nodes=None):
+    """
+    :param symptoms: a SymptomMatrix, symptoms[i] contains the indexes of the routes that cross node i
+    :param endpoints: a list of tuples : endpoints[j] contains the starting and ending nodes of route j
+    :param goal: "cover" or "1id"
+    :param independant_nodes: the independent nodes if they are already known (e.g. read from a .rdc file)
+    :return: the sorted list of the nodes that are monitors in every solution : the independent nodes and the monitors
+            forced by the goal (see reductions.forced_monitors)
+    """
+    if independant_nodes is None:
+        independant_nodes = independent_nodes(symptoms, endpoints)
+    return sorted(set(independant_nodes) | set(forced_monitors(symptoms, endpoints, goal)[0]))
+
+
+def relaxed_constraints(symptoms, endpoints, goal, monitors):
+    """
+    Rewrite the constraints that the given monitors do not already satisfy : a route having one endpoint among the
+    monitors is measured as soon as its other endpoint v is a monitor, so all the routes from v to the monitors count
+    once (as x[v]) instead of once per route. This is what makes the linear relaxation tight
+    :param symptoms: a SymptomMatrix, symptoms[i] contains the indexes of the routes that cross node i
+    :param endpoints: a list of tuples : endpoints[j] contains the starting and ending nodes of route j
+    :param goal: "cover" or "1id"
+    :param monitors: nodes that are monitors in every solution
+    :return: a set of tuples (nodes, pairs) : at least one of the nodes, or both nodes of one of the pairs, must be a
+            monitor
+    """
+    monitors = set(monitors)
+    # routes measured by the monitors, and routes between each other node and the monitors
+    measured = mask_from_indices((route for route, (src, dest) in enumerate(endpoints)
+                                  if src in monitors and dest in monitors), symptoms.m)
+    to_monitors = [[] for _ in range(symptoms.n)]
+    free = []  # routes without any endpoint among the monitors
+    for route, (src, dest) in enumerate(endpoints):
+        if src in monitors and dest not in monitors:
+            to_monitors[dest].append(route)
+        elif dest in monitors and src not in monitors:
+            to_monitors[src].append(route)
+        elif src not in monitors:
+            free.append(route)
+    to_monitors = [(node, mask_from_indices(routes, symptoms.m)) for node, routes in enumerate(to_monitors) if routes]
+    free = mask_from_indices(free, symptoms.m)
+
+    masks = symptoms.rows
+    if goal == "1id":
+        masks = chain(masks, (mask for _, _, mask in symptoms.pair_masks()))
+    constraints = set()
+    for mask in masks:
+        if mask & measured:
+            continue
+        nodes = frozenset(node for node, routes in to_monitors if mask & routes)
+        pairs = frozenset(pair for pair in (tuple(sorted(endpoints[route])) for route in iter_bits(mask & free))
+                          if pair[0] not in nodes and pair[1] not in nodes)
+        constraints.add((nodes, pairs))
+    return constraints
+
+
+def lp_bound(n, symptoms, endpoints, goal, monitors, biconnected_components=None, timelimit=60):
+    """
+    Solve the linear relaxation of the problem rewritten by relaxed_constraints with GLOP
+    :param n: number of nodes
+    :param symptoms: a SymptomMatrix, symptoms[i] contains the indexes of the routes that cross node i
+    :param endpoints: a list of tuples : endpoints[j] contains the starting and ending nodes of route j
+    :param goal: "cover" or "1id"
+    :param monitors: nodes that are monitors in every solution
+    :param biconnected_components: a 2D list, containing each biconnected components that contains exactly one
+                                articulation point, this articulation point is not present in the lists
+    :param timelimit: the timelimit of the LP solver, in seconds
+    :return: the optimal value of the relaxation, None if it is not solved to optimality, and the number of
+            constraints of the relaxation
+    """
+    from ortools.linear_solver import pywraplp
+
+    constraints = relaxed_constraints(symptoms, endpoints, goal, monitors)
+    monitors = set(monitors)
+    solver = pywraplp.Solver.CreateSolver("GLOP")
+    solver.SetTimeLimit(int(1000 * timelimit))
+    x = [solver.NumVar(1 if node in monitors else 0, 1, f"x{node}") for node in range(n)]
+    y = {}
+    for nodes, pairs in constraints:
+        for pair in pairs:
+            if pair not in y:
+                # y[u, v] <= x[u] . x[v]
+                y[pair] = solver.NumVar(0, 1, f"y{pair}")
+                solver.Add(y[pair] <= x[pair[0]])
+                solver.Add(y[pair] <= x[pair[1]])
+        solver.Add(sum([x[node] for node in nodes]) + sum([y[pair] for pair in pairs]) >= 1)
+    for component in biconnected_components or []:
+        if monitors.isdisjoint(component):
+            solver.Add(sum([x[node] for node in component]) >= 1)
+    solver.Minimize(sum(x))
+
+    if solver.Solve() != pywraplp.Solver.OPTIMAL:
+        return None, len(constraints)
+    return solver.Objective().Value(), len(constraints)
+
+
+def lower_bound(n, symptoms, endpoints, goal, independant_nodes=None, biconnected_components=None, timelimit=60):
+    """
+    Compute a lower bound on the number of monitors : the number of nodes that are monitors in every solution, raised
+    by the linear relaxation of the problem (see relaxed_constraints). The relaxation of the 1-identifiability problem
+    contains the cover constraints, so its bound is at least the one of the cover problem
+    :param n: number of nodes
+    :param symptoms: a SymptomMatrix, symptoms[i] contains the indexes of the routes that cross node i
+    :param endpoints: a list of tuples : endpoints[j] contains the starting and ending nodes of route j
+    :param goal: "cover" or "1id"
+    :param independant_nodes: the independent nodes if they are already known
+    :param biconnected_components: a 2D list, containing each biconnected components that contains exactly one
+                                articulation point, this articulation point is not present in the lists
+    :param timelimit: the timelimit of the LP solver, in seconds
+    :return: the lower bound, and a dictionary of statistics : the number of fixed monitors, the value of the
+            relaxation (None if it is not solved), its number of constraints (None without OR-Tools) and the
+            computation time
+    """
+    start_timer = time()
+    monitors = fixed_monitors(symptoms, endpoints, goal, independant_nodes)
+    try:
+        relaxation, constraints = lp_bound(n, symptoms, endpoints, goal, monitors, biconnected_components, timelimit)
+    except ImportError:  # OR-Tools is not installed, only the fixed monitors bound the solutions
+        relaxation, constraints = None, None
+    bound = len(monitors)
+    if relaxation is not None:
+        bound = max(bound, ceil(relaxation - 1e-6))
+    return bound, {"fixed": len(monitors), "relaxation": relaxation, "constraints": constraints,
+                   "time": time() - start_timer}
@@ -0,0 +1,236 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from math import ceil, floor
+from time import time
+
+from graph import BlockCutTree
+from greedy import GreedyPlacement
+from max_sat import RUNSOLVER_DELAY
+from portfolio import is_optimal, start_method
+from symptoms import SymptomMatrix
+from utils import Route
+from verifier import is_1id, is_covered, measurement_paths, route_nodes
+
+
+class Subproblem:
+    """
+    class representing the monitor placement problem restricted to a part of the network : a block (biconnected
+    component) and the trees of bridges hanging from it.
+
+    A route entering the part through an articulation point crosses the part as the route starting at this
+    articulation point does, when the routing is consistent. The parts beyond the articulation points are thus replaced
+    by virtual nodes that are monitors for free : the articulation point linking the part to its parent, and one
+    virtual node for each child block. Every node of the network is a real node of exactly one part (the articulation
+    points belong to the part of their parent block), and the subproblem only requires its real nodes to be covered and
+    distinguished. The subproblem is then a relaxation of the whole problem, and the sum of the optimal values of the
+    subproblems is a lower bound of the optimal value
+    """
+
+    def __init__(self, nodes, parent, virtual):
+        """
+        create a Subproblem object
+        :param nodes: the sorted list of the nodes of the part
+        :param parent: the articulation point linking the part to its parent (None for the root)
+        :param virtual: the number of virtual nodes (their local indexes follow the nodes of the part)
+        """
+        self.nodes = nodes
+        self.parent = parent
+        self.local = {node: index for index, node in enumerate(nodes)}
+        self.n = len(nodes) + virtual
+        # the parent articulation point and the virtual nodes are monitors
+        self.forced = list(range(len(nodes), self.n))
+        if parent is not None:
+            self.forced.append(self.local[parent])
+        self.routes = set()
+
+    def add_route(self, start, end, nodes):
+        """
+        Add the part of a route crossing the subproblem, the routes crossing the part in the same way are only added
+        once
+        :param start: the local index of the start of the route (or of the node through which it enters the part)
+        :param end: the local index of the end of the route (or of the node through which it leaves the part)
+        :param nodes: the local indexes of the nodes crossed by the route inside the part
+        """
+        self.routes.add((start, end, frozenset(nodes)))
+
+    def problem(self):
+        """
+        :return: the number of nodes, the symptoms and the endpoints of the subproblem. Each forced node gets its own
+                route, so that it is distinguished from every other node
+        """
+        routes_list = [Route(start, end, set(nodes), index) for index, (start, end, nodes)
+                       in enumerate(sorted(self.routes, key=lambda route: (route[0], route[1], sorted(route[2]))))]
+        for node in self.forced:
+            routes_list.append(Route(node, node, {node}, len(routes_list)))
+        return self.n, SymptomMatrix.from_routes(self.n, routes_list), [(route.start, route.end)
+                                                                        for route in routes_list]
+
+    def monitors(self, local_monitors):
+        """
+        :return: the monitors of the whole problem corresponding to a solution of the subproblem (the forced nodes
+                are not monitors)
+        """
+        forced = set(self.forced)
+        return [self.nodes[node] for node in local_monitors if node not in forced]
+
+
+def decompose(symptoms, endpoints, adjacency):
+    """
+    Split an instance into the subproblems of the parts of its network : the blocks that are not bridges, each one with
+    the trees of bridges hanging from it
+    :param symptoms: a SymptomMatrix, symptoms[i] contains the indexes of the routes that cross node i
+    :param endpoints: a list of tuples : endpoints[j] contains the starting and ending nodes of route j
+    :param adjacency: a list of n sets, adjacency[i] contains the neighbours of node i
+    :return: a list of Subproblem objects, or None if the network has a single part, along with the reason
+    """
+    tree = BlockCutTree(adjacency)
+    if not tree.is_connected():
+        return None, "disconnected network"
+
+    # each bridge joins the part of its parent block
+    part_of = list(range(len(tree.blocks)))
+    for block in sorted(range(len(tree.blocks)), key=lambda block: tree.block_interval[block][0]):
+        if block != tree.root and len(tree.blocks[block]) == 2:
+            part_of[block] = part_of[tree.cut_parent[tree.block_parent[block]]]
+    tops = sorted(set(part_of))
+    if len(tops) == 1:
+        return None, "no articulation point separating two blocks"
+
+    parts = {}
+    for top in tops:
+        nodes = set()
+        children = []  # the child blocks of other parts, with their articulation point
+        for block in range(len(tree.blocks)):
+            if part_of[block] == top:
+                nodes.update(tree.blocks[block])
+                for cut in tree.block_cuts[block]:
+                    if cut != tree.block_parent[block]:
+                        children += [child for child in tree.cut_blocks[cut] if child != block and
+                                     part_of[child] != top]
+        parts[top] = (Subproblem(sorted(nodes), tree.block_parent[top], len(children)), children)
+    node_parts = [set() for _ in range(tree.n)]
+    for top, (subproblem, _) in parts.items():
+        for node in subproblem.nodes:
+            node_parts[node].add(top)
+
+    def local_endpoint(top, node):
+        subproblem, children = parts[top]
+        if node in subproblem.local:
+            return subproblem.local[node]
+        for index, child in enumerate(children):
+            if tree.in_subtree(node, child):
+                return len(subproblem.nodes) + index
+        return subproblem.local[subproblem.parent]
+
+    crossed = route_nodes(symptoms)
+    for index, (start, end) in enumerate(endpoints):
+        for top in set().union(*(node_parts[node] for node in crossed[index])):
+            subproblem, children = parts[top]
+            local_start, local_end = local_endpoint(top, start), local_endpoint(top, end)
+            nodes = {subproblem.local[node] for node in crossed[index] if node in subproblem.local}
+            nodes.update(node for node in (local_start, local_end) if node >= len(subproblem.nodes))
+            if nodes - set(subproblem.forced):
+                subproblem.add_route(local_start, local_end, nodes)
+    return [subproblem for subproblem, _ in parts.values()], None
+
+
+def _solve_subproblem(subproblem, solver, goal, options):
+    """
+    Entry point of the subproblems processes
+    """
+    from monitor_placement import is_valid, solve_problem
+
+    n, symptoms, endpoints = subproblem.problem()
+    result = solve_problem(n, symptoms, endpoints, solver, goal, indy_nodes=subproblem.forced, **options)
+    return result["monitors"], result["status"], is_valid(result)
+
+
+def min_set_decomposition(n, symptoms, endpoints, adjacency, solver, goal, timelimit, independant_nodes=None,
+                          biconnected_components=None, prune=False, lazy=False, fifo=False, threads=None, stats=None):
+    """
+    Solve the subproblems of the parts of the network (see Subproblem) in parallel and merge their solutions. The
+    merged solution is verified on the whole instance : if it is valid and every subproblem is solved to optimality,
+    it is optimal. Otherwise it is repaired with the greedy heuristic and the whole instance is solved in the remaining
+    time, starting from it (except NuWLS-c) and returning it if the solver does not find better, as is the case when
+    the instance cannot be decomposed
+    :param n: number of nodes
+    :param symptoms: a SymptomMatrix, symptoms[i] contains the indexes of the routes that cross node i
+    :param endpoints: a list of tuples : endpoints[j] contains the starting and ending nodes of route j
+    :param adjacency: a list of n sets, adjacency[i] contains the neighbours of node i
+    :param solver: the solver of the subproblems ("gurobi", "ortools", "nuwls-c" or "greedy")
+    :param goal: "cover" or "1id", indicates the goal
+    :param timelimit : the timelimit for the resolution, in seconds
+    :param independant_nodes: a set of integer, it contains the independent nodes (only used by the whole instance)
+    :param biconnected_components: a 2D list, containing each biconnected components that contains exactly one
+                                articulation point (only used by the whole instance)
+    :param prune: if True, remove duplicated and subsumed constraints before building the models
+    :param lazy: if True, add the 1-identifiability constraints only when a solution violates them
+    :param fifo: if True, feed the clauses to nuwls-c through a FIFO
+    :param threads: the number of subproblems solved at the same time (all the cores by default)
+    :param stats: a dictionary, if given the statistics of the decomposition are stored in it
+    :return: a list containing index of monitors in the graph, the total runtime in seconds, the solving time in seconds,
+            the status ('Optimal', or the status of the solver of the whole instance)
+    """
+    from monitor_placement import is_valid, solve_problem
+
+    start_timer = time()
+    subproblems, reason = decompose(symptoms, endpoints, adjacency)
+    decomposition_stats = {"subproblems": len(subproblems) if subproblems else 0, "reason": reason}
+    if stats is not None:
+        stats["decomposition"] = decomposition_stats
+
+    warm_start = None
+    if subproblems:
+        decomposition_stats["largest"] = max(subproblem.n for subproblem in subproblems)
+        workers = min(len(subproblems), threads or len(os.sched_getaffinity(0)))
+        # the subproblems are solved in waves of workers subproblems, they share the timelimit (runsolver may take
+        # RUNSOLVER_DELAY more seconds to stop NuWLS-c)
+        waves = ceil(len(subproblems) / workers)
+        delay = RUNSOLVER_DELAY if solver == "nuwls-c" else 0
+        options = {"prune": prune, "lazy": lazy, "fifo": fifo,
+                   "timelimit": max(1, floor(timelimit / waves) - delay)}
+        # forking is unsafe when other threads run (e.g. in the solve service), see portfolio.start_method
+        context = multiprocessing.get_context(start_method())
+        with ProcessPoolExecutor(workers, mp_context=context) as executor:
+            results = list(executor.map(_solve_subproblem, subproblems, [solver] * len(subproblems),
+                                        [goal] * len(subproblems), [options] * len(subproblems)))
+
+        monitors = set()
+        lower_bound = 0
+        proven = True
+        for subproblem, (local_monitors, status, valid) in zip(subproblems, results):
+            monitors.update(subproblem.monitors(local_monitors))
+            lower_bound += len(local_monitors) - len(subproblem.forced)
+            proven = proven and valid and is_optimal(status)
+        decomposition_stats["lower_bound"] = lower_bound if proven else None
+        decomposition_stats["subproblems_time"] = time() - start_timer
+
+        path_mask = measurement_paths(endpoints, monitors)
+        if (is_1id if goal == "1id" else is_covered)(symptoms, path_mask):
+            total_time = time() - start_timer
+            return sorted(monitors), total_time, total_time, 'Optimal' if proven else 'Feasible'
+
+        # some nodes are not covered or distinguished across the parts
+        placement = GreedyPlacement(symptoms, endpoints, monitors)
+        if placement.solve(goal):
+            placement.remove_redundant(goal)
+            warm_start = sorted(placement.monitors)
+            decomposition_stats["repaired"] = len(warm_start)
+            if proven and len(warm_start) == lower_bound:
+                total_time = time() - start_timer
+                return warm_start, total_time, total_time, 'Optimal'
+
+    remaining = timelimit - (time() - start_timer)
+    if remaining < 1:
+        total_time = time() - start_timer
+        return warm_start or [], total_time, total_time, 'Feasible' if warm_start else 'Timeout'
+
+    # the whole instance is solved within the remaining time, starting from the repaired solution of the subproblems.
+    # NuWLS-c would get it as cardinality clauses, which slow it down : the repaired solution is only kept as fallback
+    result = solve_problem(n, symptoms, endpoints, solver, goal, independant_nodes, biconnected_components,
+                           prune, lazy, fifo, floor(remaining), None if solver == "nuwls-c" else warm_start, threads)
+    total_time = time() - start_timer
+    if warm_start and (not is_valid(result) or result["monitors_nbr"] > len(warm_start)):
+        return warm_start, total_time, result["solving_time"], 'Feasible'
+    return result["monitors"], total_time, result["solving_time"], result["status"]
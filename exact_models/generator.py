@@ -0,0 +1,407 @@
+import argparse
+import os
+import random
+from array import array
+from contextlib import nullcontext
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components, dijkstra
+
+from instance_cache import write_cache
+from reductions import leaf_components, write_reductions
+from symptoms import SymptomMatrix
+from utils import InstanceArrays, open_instance_file
+
+TOPOLOGIES = ("geometric", "waxman", "scale-free", "edges")
+WEIGHTS = ("unit", "distance", "random")
+# number of (source, destination) pairs whose routes are computed at once
+BLOCK_PAIRS = 1 << 20
+# columns of graphs.csv
+GRAPHS_FIELDS = ("Name", "Nodes", "Edges", "Density", "Routes", "Degree_avg", "Degree_std")
+
+
+def random_geometric(n, radius=None, rng=None):
+    """
+    Random geometric graph : n points drawn uniformly in the unit square, linked when they are closer than radius
+    :param n: number of nodes
+    :param radius: the linking distance, by default 1.5 times the connectivity threshold sqrt(log(n) / (pi n))
+    :param rng: a numpy Generator
+    :return: the list of the undirected links (i, j) with i < j, and the positions of the nodes (an n x 2 array)
+    """
+    rng = rng or np.random.default_rng()
+    radius = radius or 1.5 * np.sqrt(np.log(max(n, 2)) / (np.pi * n))
+    positions = rng.random((n, 2))
+    links = []
+    for node in range(n - 1):
+        # the distances to the next nodes only, a row at a time
+        distances = np.linalg.norm(positions[node + 1:] - positions[node], axis=1)
+        links.extend((node, int(other)) for other in node + 1 + np.flatnonzero(distances <= radius))
+    return links, positions
+
+
+def waxman(n, alpha=0.15, beta=0.4, rng=None):
+    """
+    Waxman graph : n points drawn uniformly in the unit square, linked with probability beta · exp(-d / (alpha · L))
+    where d is their distance and L the largest distance between two points
+    :param n: number of nodes
+    :param alpha: the decay of the probability with the distance (the larger, the more long links)
+    :param beta: the probability of linking two points at the same position (the larger, the denser)
+    :param rng: a numpy Generator
+    :return: the list of the undirected links (i, j) with i < j, and the positions of the nodes (an n x 2 array)
+    """
+    rng = rng or np.random.default_rng()
+    positions = rng.random((n, 2))
+    span = max(np.ptp(positions[:, 0]), np.ptp(positions[:, 1])) * np.sqrt(2) or 1
+    links = []
+    for node in range(n - 1):
+        distances = np.linalg.norm(positions[node + 1:] - positions[node], axis=1)
+        drawn = rng.random(len(distances)) < beta * np.exp(-distances / (alpha * span))
+        links.extend((node, int(other)) for other in node + 1 + np.flatnonzero(drawn))
+    return links, positions
+
+
+def scale_free(n, degree=2, rng=None):
+    """
+    Scale-free graph (Barabási-Albert) : starting from a clique of degree + 1 nodes, each new node is linked to degree
+    distinct nodes chosen with a probability proportional to their degree
+    :param n: number of nodes
+    :param degree: number of links of each new node
+    :param rng: a random.Random
+    :return: the list of the undirected links (i, j) with i < j, and None (the nodes have no position)
+    """
+    rng = rng or random.Random()
+    core = min(n, degree + 1)
+    links = [(i, j) for i in range(core) for j in range(i + 1, core)]
+    # each node appears once per link it belongs to
+    ends = [node for link in links for node in link]
+    for node in range(core, n):
+        chosen = set()
+        while len(chosen) < degree:
+            chosen.add(rng.choice(ends))
+        links.extend((other, node) for other in sorted(chosen))
+        ends.extend(chosen)
+        ends.extend([node] * degree)
+    return links, None
+
+
+def read_topology(edges_file):
+    """
+    Read the network of an .edges file, with its IGP weights
+    :param edges_file: the path to the file (possibly inside an archive)
+    :return: the number of nodes and a dictionary mapping each directed edge (src, dest) to its weight (the smallest
+            one if the edge is given several times)
+    """
+    weights = {}
+    with open_instance_file(edges_file) as file:
+        n = int(file.readline().split()[0])
+        for line in file:
+            edge = line.split()
+            if len(edge) >= 2 and edge[0] != edge[1]:
+                key = (int(edge[0]), int(edge[1]))
+                weight = int(edge[2]) if len(edge) >= 3 else 1
+                weights[key] = min(weight, weights.get(key, weight))
+    return n, weights
+
+
+def connect(n, links, positions=None, rng=None):
+    """
+    Link the connected components of a graph to its largest one : through the closest pair of nodes if the nodes have
+    positions, through a random pair otherwise
+    :param n: number of nodes
+    :param links: the list of the undirected links (i, j), extended in place
+    :param positions: the positions of the nodes (an n x 2 array), or None
+    :param rng: a numpy Generator
+    :return: the number of links added
+    """
+    rng = rng or np.random.default_rng()
+    ends = np.array(links, dtype=np.int64).reshape(len(links), 2)
+    graph = csr_matrix((np.ones(len(links)), (ends[:, 0], ends[:, 1])), shape=(n, n))
+    count, labels = connected_components(graph, directed=False)
+    largest = np.argmax(np.bincount(labels))
+    main = np.flatnonzero(labels == largest)
+    added = 0
+    for component in range(count):
+        if component == largest:
+            continue
+        nodes = np.flatnonzero(labels == component)
+        if positions is None:
+            src, dest = int(rng.choice(nodes)), int(rng.choice(main))
+        else:
+            distances = np.linalg.norm(positions[nodes][:, None, :] - positions[main][None, :, :], axis=2)
+            closest = np.unravel_index(np.argmin(distances), distances.shape)
+            src, dest = int(nodes[closest[0]]), int(main[closest[1]])
+        links.append((min(src, dest), max(src, dest)))
+        added += 1
+    return added
+
+
+def igp_weights(links, positions=None, scheme="random", max_weight=10, rng=None):
+    """
+    Give an IGP weight to each link, the same in both directions
+    :param links: the list of the undirected links (i, j)
+    :param positions: the positions of the nodes (an n x 2 array), or None
+    :param scheme: "unit" (hop count), "distance" (proportional to the length of the link, from 1 to max_weight) or
+                "random" (uniform between 1 and max_weight)
+    :param max_weight: the largest weight
+    :param rng: a numpy Generator
+    :return: a dictionary mapping each directed edge (src, dest) to its weight
+    """
+    rng = rng or np.random.default_rng()
+    if scheme == "unit":
+        values = np.ones(len(links), dtype=np.int64)
+    elif scheme == "distance":
+        if positions is None:
+            raise ValueError("the distance weights need the positions of the nodes")
+        ends = np.array(links, dtype=np.int64).reshape(len(links), 2)
+        lengths = np.linalg.norm(positions[ends[:, 0]] - positions[ends[:, 1]], axis=1)
+        values = np.maximum(1, np.rint(lengths / (lengths.max() or 1) * max_weight)).astype(np.int64)
+    else:
+        values = rng.integers(1, max_weight + 1, len(links))
+    weights = {}
+    for (src, dest), weight in zip(links, values.tolist()):
+        weights[src, dest] = weights[dest, src] = weight
+    return weights
+
+
+def route_paths(sources, predecessors):
+    """
+    Rebuild the shortest paths from the predecessors computed by Dijkstra, for all the pairs of a block of sources at
+    once : the paths are walked back from their destination one hop at a time, for every pair together
+    :param sources: an array of B source nodes
+    :param predecessors: the B x n array of the predecessors of each node on a shortest path from each source
+    :return: the arrays (starts, ends, lengths, indices) : the route from starts[p] to ends[p] crosses lengths[p] nodes,
+            listed in order in indices (the routes one after the other)
+    """
+    n = predecessors.shape[1]
+    rows = np.repeat(np.arange(len(sources)), n)
+    ends = np.tile(np.arange(n, dtype=np.int32), len(sources))
+    kept = ends != sources[rows]
+    rows, ends = rows[kept], ends[kept]
+    starts = sources[rows].astype(np.int32)
+
+    steps = [ends]
+    current = ends
+    while True:
+        previous = predecessors[rows, current]
+        valid = previous >= 0
+        if not valid.any():
+            break
+        steps.append(np.where(valid, previous, -1).astype(np.int32))
+        # the walks that reached their source stay on it
+        current = np.where(valid, previous, starts)
+
+    # the steps go from the destination to the source : reversed, the valid entries of each pair are the last ones
+    stacked = np.array(steps[::-1])
+    valid = stacked >= 0
+    return starts, ends, valid.sum(axis=0), stacked.T[valid.T]
+
+
+def shortest_routes(n, weights, block_pairs=BLOCK_PAIRS):
+    """
+    Compute the shortest path (according to the IGP weights) between every ordered pair of distinct nodes, with the
+    compiled Dijkstra of scipy, a block of sources at a time
+    :param n: number of nodes
+    :param weights: a dictionary mapping each directed edge (src, dest) to its weight (at least 1)
+    :param block_pairs: the number of pairs whose routes are computed at once
+    :return: a generator of tuples (starts, ends, lengths, indices), see route_paths
+    """
+    edges = np.array(list(weights), dtype=np.int64).reshape(len(weights), 2)
+    graph = csr_matrix((np.array(list(weights.values()), dtype=np.float64), (edges[:, 0], edges[:, 1])),
+                       shape=(n, n))
+    size = max(1, block_pairs // max(n, 1))
+    for first in range(0, n, size):
+        sources = np.arange(first, min(n, first + size))
+        distances, predecessors = dijkstra(graph, directed=True, indices=sources, return_predecessors=True)
+        if np.isinf(distances).any():
+            raise ValueError("the network is not strongly connected, some pairs of nodes have no route")
+        yield route_paths(sources, predecessors)
+
+
+def interior_counts(n, lengths, indices):
+    """
+    :return: the number of routes crossing each node without being one of its endpoints
+    """
+    interior = np.ones(len(indices), dtype=bool)
+    indptr = np.concatenate(([0], np.cumsum(lengths)))
+    interior[indptr[:-1]] = False
+    interior[indptr[1:] - 1] = False
+    return np.bincount(indices[interior], minlength=n)
+
+
+def packed_symptoms(n, m, lengths, indices):
+    """
+    Build the symptoms of the nodes from the routes, a node at a time with numpy instead of a bit at a time
+    :param n: number of nodes
+    :param m: number of routes
+    :param lengths: the number of nodes crossed by each route
+    :param indices: the nodes crossed by the routes, the routes one after the other
+    :return: a SymptomMatrix
+    """
+    routes = np.repeat(np.arange(m, dtype=np.int64), lengths)
+    order = np.argsort(indices, kind='stable')
+    bounds = np.concatenate(([0], np.cumsum(np.bincount(indices, minlength=n))))
+    bits = np.zeros(m, dtype=bool)
+    rows = []
+    for node in range(n):
+        crossing = routes[order[bounds[node]:bounds[node + 1]]]
+        bits[crossing] = True
+        rows.append(int.from_bytes(np.packbits(bits, bitorder='little').tobytes(), 'little'))
+        bits[crossing] = False
+    return SymptomMatrix(n, m, rows)
+
+
+def write_edges(edges_file, n, weights):
+    """
+    Write the network in the format of the .edges files (see graph.read_edges)
+    """
+    with open(edges_file, 'w') as file:
+        file.write(f"{n}\n")
+        for (src, dest), weight in sorted(weights.items()):
+            file.write(f"{src} {dest} {weight}\n")
+
+
+def write_instance(directory, name, n, weights, binary=False, block_pairs=BLOCK_PAIRS):
+    """
+    Write an instance : its routes (.routes), its network (.edges) and its reductions (.rdc)
+    :param directory: the directory receiving the files
+    :param name: the name of the instance
+    :param n: number of nodes
+    :param weights: a dictionary mapping each directed edge (src, dest) to its weight, the network must be connected
+    :param binary: if True, the .routes file is written in the binary format of the instance cache (see
+                instance_cache.write_cache) instead of text : it is mapped by instance_cache.load_instance without
+                parsing, but the other readers of the text format do not accept it
+    :param block_pairs: the number of pairs whose routes are computed at once
+    :return: the row of the instance in graphs.csv (see GRAPHS_FIELDS)
+    """
+    os.makedirs(directory, exist_ok=True)
+    routes_file = os.path.join(directory, f"{name}.routes")
+    m = n * (n - 1)
+    interior = np.zeros(n, dtype=np.int64)
+    blocks = []
+    with nullcontext() if binary else open(routes_file, 'w') as file:
+        if not binary:
+            file.write(f"{n} {m}\n")
+        for starts, ends, lengths, indices in shortest_routes(n, weights, block_pairs):
+            interior += interior_counts(n, lengths, indices)
+            if binary:
+                blocks.append((starts, ends, lengths, indices))
+                continue
+            nodes = indices.tolist()
+            offset = 0
+            lines = []
+            for start, end, length in zip(starts.tolist(), ends.tolist(), lengths.tolist()):
+                lines.append(f"{start} {end} | {' '.join(map(str, nodes[offset:offset + length]))}\n")
+                offset += length
+            file.writelines(lines)
+
+    if binary:
+        starts, ends, lengths, indices = (np.concatenate(arrays) for arrays in zip(*blocks)) if blocks else \
+            (np.zeros(0, dtype=np.int32),) * 4
+        indptr = np.concatenate(([0], np.cumsum(lengths))).astype(np.int64)
+        arrays = InstanceArrays(n, *(array(typecode, values.astype(dtype).tobytes()) for values, typecode, dtype in
+                                     ((starts, 'i', np.int32), (ends, 'i', np.int32), (indptr, 'q', np.int64),
+                                      (indices, 'i', np.int32))))
+        write_cache(routes_file, arrays, packed_symptoms(n, m, lengths, indices))
+
+    write_edges(os.path.join(directory, f"{name}.edges"), n, weights)
+    adjacency = [set() for _ in range(n)]
+    for src, dest in weights:
+        adjacency[src].add(dest)
+        adjacency[dest].add(src)
+    write_reductions(os.path.join(directory, f"{name}.rdc"), np.flatnonzero(interior == 0).tolist(),
+                     leaf_components(adjacency))
+
+    degrees = np.array([len(neighbours) for neighbours in adjacency])
+    links = int(degrees.sum()) // 2
+    return [f"{os.path.basename(os.path.normpath(directory))}/{name}.routes", n, links,
+            links / (n * (n - 1) / 2) if n > 1 else 0, m, degrees.mean(), degrees.std()]
+
+
+def append_graphs_csv(path, rows):
+    """
+    Add the description of instances to a graphs.csv file (see utils.read_graphs_csv), created if needed
+    :param path: the path to the file
+    :param rows: a list of rows (see GRAPHS_FIELDS)
+    """
+    write_header = not os.path.isfile(path) or os.path.getsize(path) == 0
+    with open(path, 'a') as file:
+        if write_header:
+            file.write(";".join(GRAPHS_FIELDS) + "\n")
+        for row in rows:
+            file.write(";".join(str(value) for value in row) + "\n")
+
+
+def generate_topology(topology, n, seed, radius=None, alpha=0.15, beta=0.4, degree=2, weights="random",
+                      max_weight=10, edges_file=None):
+    """
+    Build a connected network with IGP weights
+    :param topology: "geometric", "waxman", "scale-free" or "edges" (the network of edges_file, with its weights)
+    :param n: number of nodes (ignored for "edges")
+    :param seed: the seed of the random generators
+    :param radius: the linking distance of the geometric graphs (see random_geometric)
+    :param alpha: the distance decay of the Waxman graphs (see waxman)
+    :param beta: the density of the Waxman graphs
+    :param degree: the number of links of each new node of the scale-free graphs (see scale_free)
+    :param weights: the IGP weights, see igp_weights
+    :param max_weight: the largest IGP weight
+    :param edges_file: the .edges file of the "edges" topology
+    :return: the number of nodes, a dictionary mapping each directed edge to its weight, and the number of links added
+            to connect the network
+    """
+    rng = np.random.default_rng(seed)
+    if topology == "edges":
+        n, edge_weights = read_topology(edges_file)
+        return n, edge_weights, 0
+    if topology == "geometric":
+        links, positions = random_geometric(n, radius, rng)
+    elif topology == "waxman":
+        links, positions = waxman(n, alpha, beta, rng)
+    else:
+        links, positions = scale_free(n, degree, random.Random(seed))
+    added = connect(n, links, positions, rng)
+    return n, igp_weights(links, positions, weights, max_weight, rng), added
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="generate synthetic instances : a network with IGP weights and the "
+                                                 "shortest path between every pair of nodes")
+    parser.add_argument('-t', '--topology', help="model of the network, or the network of an .edges file",
+                        choices=TOPOLOGIES, required=True)
+    parser.add_argument('-n', '--nodes', help="numbers of nodes, one instance per number", nargs='+', type=int,
+                        default=[100])
+    parser.add_argument('--edges', help=".edges file of the edges topology (its IGP weights are kept)", required=False)
+    parser.add_argument('--count', help="number of instances of each size, with consecutive seeds", type=int,
+                        default=1)
+    parser.add_argument('--seed', help="seed of the first instance", type=int, default=0)
+    parser.add_argument('--radius', help="linking distance of the geometric graphs (in the unit square)", type=float,
+                        required=False)
+    parser.add_argument('--alpha', help="distance decay of the Waxman graphs", type=float, default=0.15)
+    parser.add_argument('--beta', help="density of the Waxman graphs", type=float, default=0.4)
+    parser.add_argument('--degree', help="number of links of each new node of the scale-free graphs", type=int,
+                        default=2)
+    parser.add_argument('-w', '--weights', help="IGP weights of the generated networks", choices=WEIGHTS,
+                        default="random")
+    parser.add_argument('--max-weight', help="largest IGP weight", type=int, default=10)
+    parser.add_argument('--binary', help="write the routes in the binary format of the instance cache",
+                        required=False, action='store_true')
+    parser.add_argument('-o', '--output', help="directory receiving the instances and their graphs.csv entries",
+                        required=True)
+
+    args = parser.parse_args()
+    if args.topology == "edges" and args.edges is None:
+        parser.error("the edges topology needs --edges")
+
+    sizes = [None] if args.topology == "edges" else args.nodes
+    for size in sizes:
+        for index in range(1 if args.topology == "edges" else args.count):
+            seed = args.seed + index
+            n, edge_weights, added = generate_topology(args.topology, size, seed, args.radius, args.alpha, args.beta,
+                                                       args.degree, args.weights, args.max_weight, args.edges)
+            if args.topology == "edges":
+                name = os.path.basename(args.edges).replace('.edges', '')
+            else:
+                name = f"{args.topology}{n}_{args.weights}_{seed}"
+            row = write_instance(args.output, name, n, edge_weights, args.binary)
+            append_graphs_csv(os.path.join(args.output, "graphs.csv"), [row])
+            print(f"{name} : {n} nodes, {row[2]} links ({added} added to connect the network), {row[4]} routes")
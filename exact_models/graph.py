@@ -0,0 +1,174 @@
+from utils import open_instance_file
+
+
+def read_edges(edges_file):
+    """
+    Parse an .edges file (the number of nodes, then one directed edge "src dest weight" per line)
+    :param edges_file: the path to the file (possibly inside an archive)
+    :return: the number of nodes and the adjacency of the undirected graph, a list of n sets of nodes
+    """
+    with open_instance_file(edges_file) as file:
+        n = int(file.readline().split()[0])
+        adjacency = [set() for _ in range(n)]
+        for line in file:
+            edge = line.split()
+            if len(edge) >= 2 and edge[0] != edge[1]:
+                src, dest = int(edge[0]), int(edge[1])
+                adjacency[src].add(dest)
+                adjacency[dest].add(src)
+    return n, adjacency
+
+
+def biconnected_components(adjacency):
+    """
+    Compute the biconnected components (blocks) and the articulation points of an undirected graph, with an iterative
+    version of the algorithm of Hopcroft and Tarjan, in O(n + e)
+    :param adjacency: a list of n sets, adjacency[i] contains the neighbours of node i
+    :return: a list of blocks (sorted lists of nodes, a bridge is a block of two nodes) and the set of articulation
+            points. Isolated nodes do not belong to any block
+    """
+    n = len(adjacency)
+    depth = [-1] * n
+    low = [0] * n
+    blocks = []
+    articulation_points = set()
+
+    for root in range(n):
+        if depth[root] != -1 or not adjacency[root]:
+            continue
+        depth[root] = 0
+        root_children = 0
+        edges = []  # stack of the tree and back edges of the current blocks
+        stack = [(root, -1, iter(adjacency[root]))]
+        while stack:
+            node, parent, neighbours = stack[-1]
+            child = next(neighbours, None)
+            if child is None:
+                stack.pop()
+                if parent == -1:
+                    continue
+                low[parent] = min(low[parent], low[node])
+                if low[node] >= depth[parent]:
+                    # parent separates the subtree of node from the rest of the graph
+                    if depth[parent] > 0:
+                        articulation_points.add(parent)
+                    block = set()
+                    while True:
+                        src, dest = edges.pop()
+                        block.add(src)
+                        block.add(dest)
+                        if (src, dest) == (parent, node):
+                            break
+                    blocks.append(sorted(block))
+            elif depth[child] == -1:
+                depth[child] = depth[node] + 1
+                low[child] = depth[child]
+                edges.append((node, child))
+                if node == root:
+                    root_children += 1
+                stack.append((child, node, iter(adjacency[child])))
+            elif child != parent and depth[child] < depth[node]:
+                low[node] = min(low[node], depth[child])
+                edges.append((node, child))
+        if root_children > 1:
+            articulation_points.add(root)
+
+    return blocks, articulation_points
+
+
+class BlockCutTree:
+    """
+    class representing the block-cut tree of a connected graph : its vertices are the blocks and the articulation
+    points, each block is linked to the articulation points it contains. The tree is rooted at a block
+    """
+
+    def __init__(self, adjacency, root=None):
+        """
+        create a BlockCutTree object
+        :param adjacency: a list of n sets, adjacency[i] contains the neighbours of node i
+        :param root: the index of the root block, the largest block by default
+        """
+        self.n = len(adjacency)
+        self.blocks, self.articulation_points = biconnected_components(adjacency)
+        self.block_cuts = [[node for node in block if node in self.articulation_points] for block in self.blocks]
+        # node_block[v] : the block containing v if v is not an articulation point, cut_blocks[a] : the blocks
+        # containing the articulation point a
+        self.node_block = [-1] * self.n
+        self.cut_blocks = {node: [] for node in self.articulation_points}
+        for index, block in enumerate(self.blocks):
+            for node in block:
+                if node in self.articulation_points:
+                    self.cut_blocks[node].append(index)
+                else:
+                    self.node_block[node] = index
+
+        # parent of each block (an articulation point, None for the root), parent of each articulation point (a
+        # block), and the preorder interval [start, end) of the subtree of each vertex
+        self.block_parent = [None] * len(self.blocks)
+        self.cut_parent = {}
+        self.block_interval = [None] * len(self.blocks)
+        self.cut_interval = {}
+        self.root = None
+        if self.blocks:
+            self.root = max(range(len(self.blocks)), key=lambda block: len(self.blocks[block])) if root is None \
+                else root
+            self._root()
+
+    def _root(self):
+        clock = 0
+        stack = [("block", self.root, False)]
+        while stack:
+            kind, vertex, closing = stack.pop()
+            intervals = self.block_interval if kind == "block" else self.cut_interval
+            if closing:
+                intervals[vertex] = (intervals[vertex], clock)
+                continue
+            intervals[vertex] = clock
+            clock += 1
+            stack.append((kind, vertex, True))
+            if kind == "block":
+                for cut in self.block_cuts[vertex]:
+                    if cut != self.block_parent[vertex]:
+                        self.cut_parent[cut] = vertex
+                        stack.append(("cut", cut, False))
+            else:
+                for block in self.cut_blocks[vertex]:
+                    if block != self.cut_parent[vertex]:
+                        self.block_parent[block] = vertex
+                        stack.append(("block", block, False))
+
+    def is_connected(self):
+        """
+        :return: True if every node belongs to the tree
+        """
+        return bool(self.blocks) and all(interval is not None for interval in self.block_interval) and \
+            all(self.node_block[node] != -1 or node in self.cut_interval for node in range(self.n))
+
+    def in_subtree(self, node, block):
+        """
+        :return: True if node belongs to the subtree of the tree rooted at block
+        """
+        if node in self.articulation_points:
+            position = self.cut_interval[node][0]
+        else:
+            position = self.block_interval[self.node_block[node]][0]
+        start, end = self.block_interval[block]
+        return start <= position < end
+
+
+def infer_adjacency(routes_file):
+    """
+    Rebuild the network from the links used by the routes (the nodes of each route are listed in order)
+    :param routes_file: the path to the .routes file (possibly inside an archive)
+    :return: the adjacency of the undirected graph, a list of n sets of nodes
+    """
+    with open_instance_file(routes_file) as file:
+        n, m = (int(value) for value in file.readline().split()[:2])
+        adjacency = [set() for _ in range(n)]
+        for _ in range(m):
+            nodes = [int(node) for node in file.readline().split('|')[1].split()]
+            for src, dest in zip(nodes, nodes[1:]):
+                if src != dest:
+                    adjacency[src].add(dest)
+                    adjacency[dest].add(src)
+    return adjacency
@@ -0,0 +1,198 @@
+import heapq
+from collections import Counter, defaultdict
+from time import time
+
+from symptoms import mask_from_indices, popcount
+from verifier import IdentifiabilityChecker, endpoint_masks
+
+
+class GreedyPlacement:
+    """
+    class implementing the greedy heuristic of MNMP (MonitorSelection.java) on packed bitsets : the leaf nodes are
+    monitors, then the monitor covering the most uncovered nodes is added until every node is covered, then (for
+    1-identifiability) the monitor distinguishing the most pairs of nodes is added until every node is 1-identifiable.
+
+    The gains are not recomputed from the routes at each iteration : each candidate keeps the nodes reached by its
+    routes to the current monitors (a bitset over the nodes) and the fingerprints these routes give to the nodes, both
+    updated when a monitor is added. The candidates are then evaluated lazily from a priority queue of their last
+    known gains.
+    """
+
+    def __init__(self, symptoms, endpoints, monitors=(), seed=0, nodes=None):
+        """
+        create a GreedyPlacement object
+        :param symptoms: a SymptomMatrix, symptoms[i] contains the indexes of the routes that cross node i
+        :param endpoints: a list of tuples : endpoints[j] contains the starting and ending nodes of route j
+        :param monitors: nodes that are monitors from the start (in addition to the leaf nodes)
+        :param seed: seed of the random route weights
+        :param nodes: the nodes to identify, all the nodes if None
+        """
+        self.n = symptoms.n
+        self.checker = IdentifiabilityChecker(symptoms, endpoints, seed=seed, nodes=nodes)
+        self.route_masks = [mask_from_indices(nodes, self.n) for nodes in self.checker.route_nodes]
+
+        # routes between each pair of nodes, in both directions
+        self.routes_between = [defaultdict(list) for _ in range(self.n)]
+        for index, (src, dest) in enumerate(endpoints):
+            if src >= 0 and dest >= 0 and src != dest:
+                self.routes_between[src][dest].append(index)
+                self.routes_between[dest][src].append(index)
+
+        # reach[v] : nodes crossed by a route between v and a monitor, fingerprints[v][x] : xor of the weights of
+        # these routes crossing x
+        self.reach = [0] * self.n
+        self.fingerprints = [[0] * self.n for _ in range(self.n)]
+        self.uncovered = mask_from_indices(self.checker.nodes, self.n)
+
+        for node in sorted(set(self.leaf_nodes(symptoms, endpoints)) | set(monitors)):
+            self.add_monitor(node)
+
+    def leaf_nodes(self, symptoms, endpoints):
+        """
+        :return: the list of nodes to identify that are never crossed by a route without being one of its endpoints,
+                they are monitors in every solution
+        """
+        starting, ending = endpoint_masks(self.n, endpoints)
+        rows = symptoms.rows
+        return [node for node in self.checker.nodes if rows[node] & ~(starting[node] | ending[node]) == 0]
+
+    @property
+    def monitors(self):
+        return self.checker.monitors
+
+    def add_monitor(self, node):
+        """
+        Add a monitor and update the reach and the fingerprints of the remaining candidates
+        :param node: the new monitor
+        """
+        if node in self.monitors:
+            return
+        self.checker.add_monitor(node)
+        self.uncovered &= ~self.reach[node]
+        weights = self.checker.weights
+        route_nodes = self.checker.route_nodes
+        for candidate, routes in self.routes_between[node].items():
+            if candidate in self.monitors:
+                continue
+            fingerprints = self.fingerprints[candidate]
+            for route in routes:
+                self.reach[candidate] |= self.route_masks[route]
+                weight = weights[route]
+                for crossed in route_nodes[route]:
+                    fingerprints[crossed] ^= weight
+
+    def cover_gain(self, candidate):
+        """
+        :return: the number of uncovered nodes that would be covered by adding candidate as a monitor
+        """
+        return popcount(self.reach[candidate] & self.uncovered)
+
+    def id_gain(self, candidate):
+        """
+        :return: the number of indistinguishable pairs of nodes that would be distinguished by adding candidate as a
+                monitor
+        """
+        fingerprints = self.fingerprints[candidate]
+        gain = 0
+        for group in self.checker.groups.values():
+            if len(group) > 1:
+                # the group is split according to the new routes crossing its nodes
+                gain += len(group) * (len(group) - 1) // 2
+                for size in Counter(fingerprints[node] for node in group).values():
+                    gain -= size * (size - 1) // 2
+        return gain
+
+    def done(self, goal):
+        if goal == "cover":
+            return self.uncovered == 0
+        return self.uncovered == 0 and self.checker.collisions == 0
+
+    def _choose(self, gain, lazy):
+        """
+        Choose the candidate with the best gain
+        :param gain: the gain function
+        :param lazy: if True, only the candidates whose last known gain is larger than the best refreshed gain are
+                    evaluated
+        :return: the best candidate and its gain, None if there is no candidate left
+        """
+        if not lazy or not self._queue:
+            self._queue = [(-gain(node), node) for node in range(self.n) if node not in self.monitors]
+            heapq.heapify(self._queue)
+        while self._queue:
+            _, node = heapq.heappop(self._queue)
+            if node in self.monitors:
+                continue
+            value = gain(node)
+            if not self._queue or -value <= self._queue[0][0]:
+                if value == 0 and lazy:
+                    # the gains are not submodular (a new monitor brings new routes to every candidate), stale
+                    # gains are only trusted while they are positive
+                    return self._choose(gain, False)
+                return node, value
+            heapq.heappush(self._queue, (-value, node))
+        return None, 0
+
+    def solve(self, goal="1id", lazy=True, timelimit=None):
+        """
+        Add monitors until the goal is reached
+        :param goal: "cover" or "1id"
+        :param lazy: if True, use lazy evaluations of the gains
+        :param timelimit: the timelimit in seconds (None for no limit)
+        :return: True if the goal is reached, False otherwise (timelimit reached or unreachable goal)
+        """
+        start = time()
+        for phase in ("cover", "1id") if goal == "1id" else ("cover",):
+            gain = self.cover_gain if phase == "cover" else self.id_gain
+            self._queue = []
+            while not self.done(phase):
+                if timelimit is not None and time() - start > timelimit:
+                    return False
+                node, _ = self._choose(gain, lazy)
+                if node is None:
+                    return False
+                self.add_monitor(node)
+        return True
+
+    def remove_redundant(self, goal="1id"):
+        """
+        Iterate over the monitors (by index) and remove the ones whose removal keeps the goal reached
+        :param goal: "cover" or "1id"
+        :return: the list of removed monitors
+        """
+        removed = []
+        for node in sorted(self.monitors):
+            uncovered, collisions = self.checker.delta(remove=(node,), goal=goal)
+            if uncovered == 0 and not collisions:
+                self.checker.remove_monitor(node)
+                removed.append(node)
+        return removed
+
+
+def min_set_greedy(n, symptoms, endpoints, timelimit, independant_nodes=None, goal="cover", lazy=True, nodes=None):
+    """
+    Greedy heuristic for the monitor placement problem (see GreedyPlacement), followed by the elimination of the
+    redundant monitors
+    :param n: number of nodes
+    :param symptoms: a SymptomMatrix, symptoms[i] contains the indexes of the routes that cross node i
+    :param endpoints: a list of tuples : endpoints[j] contains the starting and ending nodes of route j
+    :param timelimit : the timelimit, in seconds
+    :param independant_nodes: a set of integer, it contains the independent nodes (they are monitors from the start)
+    :param goal: "cover" or "1id", indicates the goal
+    :param lazy: if True, use lazy evaluations of the gains
+    :param nodes: the nodes to identify, all the nodes if None
+    :return: a list containing index of monitors in the graph, the total runtime in seconds, the solving time in seconds
+            (same as the total runtime) and the status ('Feasible', 'Timeout' or 'Infeasible')
+    """
+    start_timer = time()
+    placement = GreedyPlacement(symptoms, endpoints, independant_nodes or (), nodes=nodes)
+    reached = placement.solve(goal, lazy, timelimit)
+    if reached:
+        placement.remove_redundant(goal)
+        status = 'Feasible'
+    elif time() - start_timer > timelimit:
+        status = 'Timeout'
+    else:
+        status = 'Infeasible'
+    total_time = time() - start_timer
+
+    return sorted(placement.monitors), total_time, total_time, status
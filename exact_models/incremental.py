@@ -0,0 +1,323 @@
+import argparse
+from time import time
+
+from greedy import GreedyPlacement
+from instance_cache import load_instance
+from model_cache import Model
+from monitor_placement import DEFAULT_TIMEOUT, csv_line, solve_problem
+from pruning import minimal_masks
+from symptoms import popcount
+from utils import Route, open_instance_file, read_solution
+from verifier import indistinguishable_pairs, is_1id, is_covered, measurement_paths, route_nodes, uncovered_nodes
+
+
+class IncrementalInstance:
+    """
+    class representing an instance whose routes change over time (link failure, IGP weight update), along with the
+    monitors placed on it. The symptoms are updated in place : only the columns of the changed routes are touched, and
+    the monitors are repaired from the previous placement instead of solving the instance from scratch.
+
+    The constraints of the exact model (the cover constraint of each node and, for 1-identifiability, the constraint
+    of each pair of nodes) stay in memory between two resolutions, only those of the nodes whose symptom changed are
+    computed again. The greedy repair and the solvers models are built again at each resolution
+    """
+
+    def __init__(self, n, symptoms, endpoints, monitors=()):
+        """
+        create an IncrementalInstance object
+        :param n: the number of nodes
+        :param symptoms: a SymptomMatrix, symptoms[i] contains the indexes of the routes that cross node i (it is
+                        copied)
+        :param endpoints: a list of tuples : endpoints[j] contains the starting and ending nodes of route j
+        :param monitors: the monitors of the current placement
+        """
+        self.n = n
+        self.symptoms = symptoms.copy()
+        self.endpoints = list(endpoints)
+        self.route_nodes = route_nodes(symptoms)
+        self.routes_index = {route: index for index, route in enumerate(self.endpoints)}
+        self.monitors = set(monitors)
+        # nodes whose symptom changed since the last resolution
+        self.dirty = set()
+        # constraints of the exact model, indexed by node (cover) or by pair of nodes (1id), and the nodes whose
+        # symptom changed since they were computed (including the nodes of a renumbered route)
+        self.constraints = None
+        self.constraints_goal = None
+        self.stale = set()
+
+    def _set_nodes(self, index, nodes):
+        """
+        Replace the nodes crossed by a route, only the rows of the nodes leaving or joining the route are updated
+        """
+        bit = 1 << index
+        rows = self.symptoms.rows
+        old, new = set(self.route_nodes[index]), set(nodes)
+        for node in old - new:
+            rows[node] &= ~bit
+        for node in new - old:
+            rows[node] |= bit
+        self.dirty |= old ^ new
+        self.stale |= old ^ new
+        self.route_nodes[index] = tuple(sorted(new))
+
+    def add_route(self, start, end, nodes):
+        """
+        Add a route at the end of the matrix, or replace its nodes if a route between start and end already exists
+        """
+        if (start, end) in self.routes_index:
+            self.change_route(start, end, nodes)
+            return
+        index = len(self.endpoints)
+        self.endpoints.append((start, end))
+        self.route_nodes.append(())
+        self.routes_index[(start, end)] = index
+        self.symptoms.m += 1
+        self._set_nodes(index, nodes)
+
+    def remove_route(self, start, end):
+        """
+        Remove a route, the last route takes its index so that the route indexes stay contiguous
+        """
+        if (start, end) not in self.routes_index:
+            raise ValueError(f"no route between {start} and {end}")
+        index = self.routes_index.pop((start, end))
+        self._set_nodes(index, ())
+        last = len(self.endpoints) - 1
+        if index != last:
+            # the last route moves to the free index, the symptoms of its nodes are unchanged up to the renaming
+            moved, last_bit = 1 << index, 1 << last
+            rows = self.symptoms.rows
+            for node in self.route_nodes[last]:
+                rows[node] = (rows[node] & ~last_bit) | moved
+            self.stale.update(self.route_nodes[last])
+            self.endpoints[index] = self.endpoints[last]
+            self.route_nodes[index] = self.route_nodes[last]
+            self.routes_index[self.endpoints[index]] = index
+        self.endpoints.pop()
+        self.route_nodes.pop()
+        self.symptoms.m -= 1
+
+    def change_route(self, start, end, nodes):
+        """
+        Replace the nodes crossed by a route (its path changed)
+        """
+        if (start, end) not in self.routes_index:
+            raise ValueError(f"no route between {start} and {end}")
+        self._set_nodes(self.routes_index[(start, end)], nodes)
+
+    def apply_delta(self, added=(), removed=(), changed=()):
+        """
+        Apply a route delta to the symptoms
+        :param added: a list of Route objects, the new routes
+        :param removed: a list of tuples (start, end), the removed routes
+        :param changed: a list of Route objects, the routes whose path changed
+        :return: the set of nodes whose symptom changed since the last resolution
+        """
+        for start, end in removed:
+            self.remove_route(start, end)
+        for route in changed:
+            self.change_route(route.start, route.end, route.nodes)
+        for route in added:
+            self.add_route(route.start, route.end, route.nodes)
+        return self.dirty
+
+    def patch_constraints(self, goal):
+        """
+        Update the constraints of the exact model : they are all built on the first call (or when the goal changes),
+        then only the constraints of the nodes whose symptom changed are computed again
+        :param goal: "cover" or "1id"
+        :return: the number of nodes whose constraints were computed again
+        """
+        rows = self.symptoms.rows
+        if self.constraints is None or self.constraints_goal != goal:
+            self.constraints = dict(enumerate(rows))
+            if goal == "1id":
+                self.constraints.update(((node_a, node_b), mask) for node_a, node_b, mask in self.symptoms.pair_masks())
+            self.constraints_goal = goal
+            patched = self.n
+        else:
+            for node in self.stale:
+                row = rows[node]
+                self.constraints[node] = row
+                if goal == "1id":
+                    for other in range(self.n):
+                        if other != node:
+                            self.constraints[(node, other) if node < other else (other, node)] = row ^ rows[other]
+            patched = len(self.stale)
+        self.stale = set()
+        return patched
+
+    def model(self, goal, prune=False):
+        """
+        Build the model of the exact solvers from the constraints kept in memory (see patch_constraints)
+        :param goal: "cover" or "1id"
+        :param prune: if True, remove the duplicated and subsumed constraints (see pruning.minimal_masks)
+        :return: a model_cache.Model, its statistics are those of pruning.prune_constraints
+        """
+        self.patch_constraints(goal)
+        masks = [mask for mask in self.constraints.values() if mask]
+        stats = {
+            "constraints": len(self.constraints),
+            "nonzeros": sum(popcount(mask) for mask in masks),
+            "uncoverable_nodes": [node for node in range(self.n) if not self.constraints[node]],
+            "identical_pairs": [key for key, mask in self.constraints.items() if isinstance(key, tuple) and not mask],
+        }
+        stats["infeasible"] = bool(stats["uncoverable_nodes"] or stats["identical_pairs"])
+        if prune:
+            masks = [masks[index] for index in sorted(minimal_masks(masks, self.symptoms.m))]
+        stats["kept_constraints"] = len(masks)
+        stats["kept_nonzeros"] = sum(popcount(mask) for mask in masks) if prune else stats["nonzeros"]
+        stats["removed_constraints"] = stats["constraints"] - stats["kept_constraints"]
+        stats["removed_nonzeros"] = stats["nonzeros"] - stats["kept_nonzeros"]
+        return Model(self.n, self.endpoints, goal, masks, stats=stats)
+
+    def resolve(self, goal="1id", solver=None, exact=False, timelimit=DEFAULT_TIMEOUT, prune=False, threads=None):
+        """
+        Place the monitors again after the routes changed. The previous monitors are kept and the greedy heuristic
+        adds monitors until the goal is reached again (local repair), then the redundant monitors are removed. The
+        exact solver is only called if the repaired placement is larger than the previous one, starting from it
+        :param goal: "cover" or "1id"
+        :param solver: the exact solver ("gurobi", "ortools", "nuwls-c" or "portfolio"), None to only repair
+        :param exact: if True, always call the exact solver after the repair
+        :param timelimit: the timelimit of the repair and of the exact solver, in seconds
+        :param prune: if True, prune the constraints of the exact model
+        :param threads: the number of threads of the exact solver
+        :return: a dictionary containing the solution and the statistics of the resolution (see solve_problem), and
+                the statistics of the repair in "incremental"
+        """
+        start_timer = time()
+        previous = set(self.monitors)
+        path_mask = measurement_paths(self.endpoints, previous)
+        stats = {"dirty_nodes": len(self.dirty), "previous": len(previous),
+                 "uncovered": len(uncovered_nodes(self.symptoms, path_mask)),
+                 "indistinguishable": len(indistinguishable_pairs(self.symptoms, path_mask)) if goal == "1id" else 0}
+
+        placement = GreedyPlacement(self.symptoms, self.endpoints, previous)
+        kept = placement.done(goal)
+        reached = placement.solve(goal, timelimit=timelimit)
+        added = len(placement.monitors) - len(previous)
+        removed = placement.remove_redundant(goal) if reached else []
+        monitors = sorted(placement.monitors)
+        stats.update(added=added, removed=len(removed), repair_time=time() - start_timer)
+
+        if solver is not None and (exact or not reached or len(monitors) > len(previous)):
+            model_start = time()
+            patched = self.patch_constraints(goal)
+            model = self.model(goal, prune)
+            stats.update(patched_nodes=patched, model_time=time() - model_start)
+            result = solve_problem(self.n, self.symptoms, self.endpoints, solver, goal, prune=prune,
+                                   timelimit=timelimit, warm_start=monitors if reached else None, threads=threads,
+                                   instance_name="incremental", model=model)
+            result["total_time"] += stats["repair_time"] + stats["model_time"]
+        else:
+            total_time = time() - start_timer
+            path_mask = measurement_paths(self.endpoints, monitors)
+            result = {
+                "solver": "incremental",
+                "goal": goal,
+                "nodes": self.n,
+                "routes": len(self.endpoints),
+                "monitors": monitors,
+                "monitors_nbr": len(monitors),
+                "solving_time": total_time,
+                "total_time": total_time,
+                "status": ('Unchanged' if kept and not removed else 'Repaired') if reached else 'Infeasible',
+                "coverage": is_covered(self.symptoms, path_mask),
+                "1id": is_1id(self.symptoms, path_mask),
+                "cuts": None,
+                "warm_start": None,
+                "portfolio": None,
+                "pruning": None,
+            }
+
+        result["incremental"] = stats
+        if result["monitors"]:
+            self.monitors = set(result["monitors"])
+        self.dirty = set()
+        return result
+
+
+def read_route_delta(delta_file):
+    """
+    Parse a route delta file, one route per line :
+        + start end | nodes     a new route
+        - start end             a removed route
+        ~ start end | nodes     a route whose path changed
+    empty lines and lines starting with # are ignored
+    :param delta_file: the path to the file (possibly inside an archive)
+    :return: a tuple (added, removed, changed), added and changed are lists of Route objects, removed is a list of
+            tuples (start, end)
+    """
+    added, removed, changed = [], [], []
+    with open_instance_file(delta_file) as file:
+        for line in file:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            kind, line = line[0], line[1:]
+            indexes, _, route_string = line.partition('|')
+            start, end = (int(node) for node in indexes.split())
+            if kind == '-':
+                removed.append((start, end))
+            elif kind in '+~':
+                route = Route(start, end, set(int(node) for node in route_string.split()), -1)
+                (added if kind == '+' else changed).append(route)
+            else:
+                raise ValueError(f"unknown route delta {kind}, expected +, - or ~")
+    return added, removed, changed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="place the monitors again after the routes of an instance changed")
+    parser.add_argument('-i', '--input', help="instance file, or <archive>.tar.gz:<member> to read it from an archive",
+                        required=True)
+    parser.add_argument('-d', '--delta', help="route delta files, applied and solved one after the other",
+                        nargs='+', required=True)
+    parser.add_argument('--previous', help="file containing the monitors placed before the changes (see "
+                                           "monitor_placement.py --solution), the greedy heuristic is used if not "
+                                           "given", required=False)
+    parser.add_argument('-g', '--goal', help="goal of model", choices=["cover", "1id"], required=True)
+    parser.add_argument('-s', '--solver', help="exact solver called when the repair needs more monitors than before",
+                        choices=["gurobi", "ortools", "nuwls-c", "portfolio"], required=False)
+    parser.add_argument('--exact', help="always call the exact solver after the repair", required=False,
+                        action='store_true')
+    parser.add_argument('-p', '--prune', help="remove duplicated and subsumed constraints before building the model",
+                        required=False, action='store_true')
+    parser.add_argument('--threads', help="number of threads of the exact solver", required=False, type=int)
+    parser.add_argument('-c', '--csv', help="set the output in csv format", required=False, action='store_true')
+    parser.add_argument('--solution', help="file to save the last solution", required=False)
+    parser.add_argument('-t', '--timelimit', help="timelimit of each resolution, in seconds", type=int,
+                        default=DEFAULT_TIMEOUT)
+
+    args = parser.parse_args()
+
+    n, symptoms, endpoints = load_instance(args.input)
+    if args.previous:
+        monitors = read_solution(args.previous)
+    else:
+        monitors = solve_problem(n, symptoms, endpoints, "greedy", args.goal, timelimit=args.timelimit)["monitors"]
+    incremental = IncrementalInstance(n, symptoms, endpoints, monitors)
+
+    for delta in args.delta:
+        incremental.apply_delta(*read_route_delta(delta))
+        result = incremental.resolve(args.goal, args.solver, args.exact, args.timelimit, args.prune, args.threads)
+        result["instance"] = delta
+        result["reductions"] = False
+        stats = result["incremental"]
+        if args.csv:
+            print(csv_line(result))
+        else:
+            print(f"{delta}\n"
+                  f"  Status : {result['status']}\n"
+                  f"  Number of monitors : {stats['previous']} -> {result['monitors_nbr']} "
+                  f"(+{stats['added']} -{stats['removed']} in the repair)\n"
+                  f"  Changed symptoms : {stats['dirty_nodes']} nodes, {stats['uncovered']} uncovered, "
+                  f"{stats['indistinguishable']} indistinguishable pairs\n"
+                  f"  Repair Time (s) : {stats['repair_time']}\n"
+                  f"  Total Time (s) : {result['total_time']}\n"
+                  f"  Coverage : {result['coverage']}\n"
+                  f"  1id : {result['1id']}")
+
+    if args.solution:
+        with open(args.solution, 'w') as file:
+            file.write(" ".join(str(monitor) for monitor in sorted(incremental.monitors)))
@@ -0,0 +1,178 @@
+from array import array
+import hashlib
+import mmap
+import os
+import struct
+import sys
+import tempfile
+
+from symptoms import SymptomMatrix
+from utils import InstanceArrays, open_instance_file, split_archive_path, stream_instance
+
+# the cache can be moved out of the source tree with the MONITOR_PLACEMENT_CACHE environment variable
+CACHE_DIR = os.environ.get("MONITOR_PLACEMENT_CACHE", os.path.join(os.path.dirname(__file__), "tmp/cache"))
+CACHE_VERSION = 1
+# magic, version, number of nodes, number of routes, number of (route, node) incidences
+HEADER = struct.Struct("<4sIIIQ")
+MAGIC = b"MPIC"
+
+
+def content_hash(path, cache_dir=CACHE_DIR):
+    """
+    Compute the hash of the content of an instance file. The hash is stored in the cache under a key made of the path,
+    the modification time and the size of the file, so that the file is only read again when it changes
+    :param path: path to the .routes file (possibly inside an archive)
+    :param cache_dir: the directory containing the stored hashes
+    :return: a string containing the sha256 digest of the file
+    """
+    archive = split_archive_path(path)[0]
+    stat = os.stat(path if archive is None else archive)
+    key = f"{os.path.abspath(path)}\0{stat.st_mtime_ns}\0{stat.st_size}"
+    stamp = os.path.join(cache_dir, "hashes", hashlib.sha256(key.encode()).hexdigest())
+    try:
+        with open(stamp) as file:
+            return file.read().strip()
+    except OSError:
+        pass
+
+    digest = hashlib.sha256()
+    with open_instance_file(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b''):
+            digest.update(chunk)
+    digest = digest.hexdigest()
+
+    try:
+        os.makedirs(os.path.dirname(stamp), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(stamp), suffix=".tmp")
+        with os.fdopen(fd, 'w') as file:
+            file.write(digest)
+        os.replace(tmp, stamp)
+    except OSError:
+        pass  # read-only cache, the file is hashed again by the next run
+    return digest
+
+
+def cache_file(digest, cache_dir=CACHE_DIR):
+    """
+    :param digest: the content hash of the instance
+    :param cache_dir: the directory containing the cached instances
+    :return: the path to the cached instance
+    """
+    return os.path.join(cache_dir, f"{digest}.v{CACHE_VERSION}.bin")
+
+
+def _padding(offset):
+    return -offset % 8
+
+
+def write_cache(path, arrays, symptoms):
+    """
+    Store an instance in binary format : a header followed by the routes endpoints, the CSR arrays of the routes and
+    the packed symptom rows. The file is written atomically so that concurrent runs can share the cache.
+    :param path: path to the cache file
+    :param arrays: an InstanceArrays
+    :param symptoms: the SymptomMatrix of the instance
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    row_bytes = (symptoms.m + 7) >> 3
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            file.write(HEADER.pack(MAGIC, CACHE_VERSION, arrays.n, arrays.m, len(arrays.indices)))
+            for values, typecode in ((arrays.starts, 'i'), (arrays.ends, 'i'), (arrays.indptr, 'q'),
+                                     (arrays.indices, 'i')):
+                file.write(bytes(_padding(file.tell())))
+                data = array(typecode, values)
+                if sys.byteorder != 'little':
+                    data.byteswap()
+                data.tofile(file)
+            for row in symptoms.rows:
+                file.write(row.to_bytes(row_bytes, 'little'))
+        os.replace(tmp, path)
+    except BaseException:
+        # e.g. full disk, do not leave the partial file in the cache
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def read_cache(path):
+    """
+    Map a cached instance in memory, the arrays are views over the mapped file (nothing is parsed)
+    :param path: path to the cache file
+    :return: an InstanceArrays and the SymptomMatrix of the instance
+    """
+    with open(path, 'rb') as file:
+        buffer = memoryview(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
+
+    magic, version, n, m, nnz = HEADER.unpack_from(buffer)
+    if magic != MAGIC or version != CACHE_VERSION or sys.byteorder != 'little':
+        raise ValueError(f"{path} is not a valid instance cache")
+
+    offset = HEADER.size
+    views = []
+    for length, typecode, size in ((m, 'i', 4), (m, 'i', 4), (m + 1, 'q', 8), (nnz, 'i', 4)):
+        offset += _padding(offset)
+        views.append(buffer[offset:offset + length * size].cast(typecode))
+        offset += length * size
+
+    row_bytes = (m + 7) >> 3
+    rows = [int.from_bytes(buffer[start:start + row_bytes], 'little')
+            for start in range(offset, offset + n * row_bytes, row_bytes)]
+
+    return InstanceArrays(n, *views), SymptomMatrix(n, m, rows)
+
+
+def is_binary_instance(path):
+    """
+    :param path: path to the .routes file (possibly inside an archive)
+    :return: True if the instance is stored in the binary format of the cache (e.g. written by generator.py --binary)
+            instead of text, only the regular files can be mapped
+    """
+    if split_archive_path(path)[0] is not None or not os.path.isfile(path):
+        return False
+    with open(path, 'rb') as file:
+        return file.read(len(MAGIC)) == MAGIC
+
+
+def load_instance(path, use_cache=True, cache_dir=CACHE_DIR):
+    """
+    Load an instance, from the binary cache if the same content has already been loaded. The instance is parsed and
+    added to the cache otherwise.
+    :param path: path to the .routes file (possibly inside an archive, see utils.split_archive_path)
+    :param use_cache: if False, the instance is always parsed and the cache is not written
+    :param cache_dir: the directory containing the cached instances
+    :return: a tuple (n, symptoms, endpoints) where n is the number of nodes, symptoms a SymptomMatrix and endpoints
+            a list of tuples containing the starting and ending nodes of each route
+    """
+    arrays, symptoms = load_arrays(path, use_cache, cache_dir)
+    return arrays.n, symptoms, arrays.endpoints()
+
+
+def load_arrays(path, use_cache=True, cache_dir=CACHE_DIR):
+    """
+    Same as load_instance, but returns the InstanceArrays of the instance instead of its endpoints
+    :return: an InstanceArrays and the SymptomMatrix of the instance
+    """
+    if is_binary_instance(path):
+        return read_cache(path)
+
+    if use_cache:
+        cached = cache_file(content_hash(path, cache_dir), cache_dir)
+        if os.path.isfile(cached):
+            try:
+                return read_cache(cached)
+            except (ValueError, TypeError, struct.error):
+                pass  # corrupted or outdated cache, parse the instance again
+
+    arrays, symptoms = stream_instance(path)
+
+    if use_cache:
+        try:
+            write_cache(cached, arrays, symptoms)
+        except OSError:
+            pass  # read-only or full cache, the instance is parsed again by the next run
+
+    return arrays, symptoms
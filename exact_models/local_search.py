@@ -0,0 +1,128 @@
+from time import time
+
+from symptoms import popcount
+from verifier import IdentifiabilityChecker
+
+# default timelimit of the local search, in seconds : it runs after the solver, it must stay small next to its timelimit
+IMPROVE_TIMELIMIT = 1
+
+
+class LocalSearch:
+    """
+    class removing the redundant monitors of a feasible placement. The moves are evaluated with an
+    IdentifiabilityChecker (coverage counter and fingerprint of each node, updated from the measurement paths that
+    change) instead of verifying the whole placement : a monitor is dropped when the goal stays reached without it, and
+    a monitor is swapped with another node when the swap lets at least one other monitor be dropped
+    """
+
+    def __init__(self, symptoms, endpoints, monitors, goal="1id", fixed=(), nodes=None):
+        """
+        create a LocalSearch object
+        :param symptoms: a SymptomMatrix, symptoms[i] contains the indexes of the routes that cross node i
+        :param endpoints: a list of tuples : endpoints[j] contains the starting and ending nodes of route j
+        :param monitors: a feasible set of monitors
+        :param goal: "cover" or "1id"
+        :param fixed: nodes that are monitors in every solution (e.g. the independent nodes), they are never moved
+        :param nodes: the nodes to identify, all the nodes if None
+        """
+        self.n = symptoms.n
+        self.goal = goal
+        self.fixed = set(fixed)
+        self.checker = IdentifiabilityChecker(symptoms, endpoints, monitors, nodes=nodes)
+        self.swaps = 0
+
+    def reached(self):
+        return self.checker.is_1id() if self.goal == "1id" else self.checker.is_covered()
+
+    def _feasible(self, add=(), remove=()):
+        uncovered, collisions = self.checker.delta(add, remove, self.goal)
+        return uncovered == 0 and not collisions
+
+    def drop(self, deadline=None):
+        """
+        Remove the monitors whose removal keeps the goal reached, the monitors crossed by the fewest measurement paths
+        first
+        :param deadline: the time at which the search stops
+        :return: the list of removed monitors
+        """
+        checker = self.checker
+
+        def paths(node):
+            return popcount((checker.starting[node] | checker.ending[node]) & checker.path_mask)
+
+        removed = []
+        for node in sorted(checker.monitors - self.fixed, key=lambda node: (paths(node), node)):
+            if deadline is not None and time() > deadline:
+                break
+            if self._feasible(remove=(node,)):
+                checker.remove_monitor(node)
+                removed.append(node)
+        return removed
+
+    def swap(self, deadline=None):
+        """
+        Look for a monitor u and a node v such that replacing u by v keeps the goal reached and lets another monitor
+        be dropped. The first improving swap is applied
+        :param deadline: the time at which the search stops
+        :return: the list of monitors removed by the swap and the following drops, empty if no swap improves the
+                placement
+        """
+        checker = self.checker
+        for monitor in sorted(checker.monitors - self.fixed):
+            for node in range(self.n):
+                if deadline is not None and time() > deadline:
+                    return []
+                if node in checker.monitors or not self._feasible(add=(node,), remove=(monitor,)):
+                    continue
+                checker.add_monitor(node)
+                checker.remove_monitor(monitor)
+                self.fixed.add(node)
+                dropped = self.drop(deadline)
+                self.fixed.discard(node)
+                if dropped:
+                    self.swaps += 1
+                    return [monitor] + dropped
+                # no monitor can be dropped after the swap, undo it
+                checker.add_monitor(monitor)
+                checker.remove_monitor(node)
+        return []
+
+    def run(self, timelimit=IMPROVE_TIMELIMIT):
+        """
+        Drop the redundant monitors, then apply improving swaps until there are none left or the timelimit is reached.
+        A swap pass costs O(monitors x n) moves, it is only tried when some monitors were redundant : a placement
+        without redundant monitors is already a local optimum of the solver (e.g. the greedy heuristic)
+        :param timelimit: the timelimit in seconds (None for no limit)
+        :return: the list of removed monitors
+        """
+        deadline = None if timelimit is None else time() + timelimit
+        removed = self.drop(deadline)
+        while removed and (deadline is None or time() < deadline):
+            swapped = self.swap(deadline)
+            if not swapped:
+                break
+            removed += swapped
+        return removed
+
+
+def improve_monitors(symptoms, endpoints, monitors, goal="1id", fixed=(), timelimit=IMPROVE_TIMELIMIT, nodes=None):
+    """
+    Remove the redundant monitors of the solution of a solver (see LocalSearch)
+    :param symptoms: a SymptomMatrix, symptoms[i] contains the indexes of the routes that cross node i
+    :param endpoints: a list of tuples : endpoints[j] contains the starting and ending nodes of route j
+    :param monitors: a set of monitors, it is returned unchanged if it does not reach the goal
+    :param goal: "cover" or "1id"
+    :param fixed: nodes that are monitors in every solution, they are never moved
+    :param timelimit: the timelimit in seconds (None for no limit)
+    :param nodes: the nodes to identify, all the nodes if None
+    :return: the sorted list of monitors, and a dictionary containing the number of monitors saved, the number of
+            improving swaps and the time spent
+    """
+    start_timer = time()
+    monitors = sorted(set(monitors))
+    search = LocalSearch(symptoms, endpoints, monitors, goal, set(fixed) & set(monitors), nodes)
+    if search.reached() and search.run(timelimit):
+        improved = sorted(search.checker.monitors)
+    else:
+        improved = monitors
+    return improved, {"saved": len(monitors) - len(improved), "swaps": search.swaps, "time": time() - start_timer}
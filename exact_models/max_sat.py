@@ -1,104 +1,228 @@
 import os
+import pty
+import select
+import shutil
 import subprocess
+import tempfile
+import threading
 import time
-import gc
+from itertools import compress
+from math import floor
+
+from greedy import GreedyPlacement
+from profiling import phase, record_model
+from verifier import indistinguishable_pairs, measurement_paths
 
 MEM_LIMIT = 20*1000
+# seconds runsolver waits between SIGTERM and SIGKILL when the time limit is reached, a run lasts up to timelimit + this
+RUNSOLVER_DELAY = 3
+# size (in bytes) of the write buffer of the clause files
+WRITE_BUFFER = 1 << 20
+TMP_DIR = os.path.join(os.path.dirname(__file__), "tmp")
+# seconds between two checks of the incumbent while NuWLS-c runs
+POLL_INTERVAL = 0.1
+# statuses proven by the solver, indexed by its exit code (the status line is not printed with -print_every_model)
+EXIT_STATUSES = {20: "UNSATISFIABLE", 30: "OPTIMUM FOUND"}
+
+
+def tmp_path(kind, instance_name="clause", goal="cover"):
+    """
+    Create a unique temporary file for a run, so that concurrent runs on the same instance do not overwrite each
+    other's files
+    :param kind: the subdirectory of tmp/ where the file is created ("clauses", "stats" or "watcher_info")
+    :param instance_name: name of the instance
+    :param goal: "cover" or "1id"
+    :return: the path to the created (empty) file
+    """
+    directory = os.path.join(TMP_DIR, kind)
+    os.makedirs(directory, exist_ok=True)
+    fd, path = tempfile.mkstemp(prefix=f"{instance_name}_{goal}_", suffix=".tmp", dir=directory)
+    os.close(fd)
+    return path
 
 
-def write_clauses_monitor_problem(n, symptoms, endpoints, goal="cover",
-                                independant_nodes=None, biconnected_components=None,
-                                instance_name="clause"):
+class WcnfWriter:
     """
-    Write the model into wncf format in the given file
+    class writing clauses in wcnf format straight into a binary sink, one clause at a time
+    """
+    # translation of the binary representation of a bitset into selectors for itertools.compress
+    _SELECTORS = bytes.maketrans(b'01', b'\x00\x01')
+
+    def __init__(self, sink, routes_nbr=0, route_offset=0):
+        """
+        create a WcnfWriter object
+        :param sink: a file-like object opened in binary mode (preferably buffered)
+        :param routes_nbr: the number of routes
+        :param route_offset: the variable of route j is j + route_offset
+        """
+        self.sink = sink
+        self.clauses = 0
+        # hard clauses, their literals, and bytes written
+        self.hard_clauses = 0
+        self.literals = 0
+        self.bytes = 0
+        self._route_literals = [b"%d" % (route + route_offset) for route in range(routes_nbr)]
+        self._route_format = f"0{routes_nbr}b"
+
+    def soft(self, weight, literals):
+        """
+        Write a soft clause
+        :param weight: the weight of the clause
+        :param literals: an iterable of non-zero integers
+        """
+        line = f"{weight} {' '.join(map(str, literals))} 0\n".encode()
+        self.sink.write(line)
+        self.clauses += 1
+        self.bytes += len(line)
+
+    def hard(self, literals):
+        """
+        Write a hard clause
+        :param literals: an iterable of non-zero integers
+        """
+        literals = tuple(literals)
+        line = f"h {' '.join(map(str, literals))} 0\n".encode()
+        self.sink.write(line)
+        self.clauses += 1
+        self.hard_clauses += 1
+        self.literals += len(literals)
+        self.bytes += len(line)
+
+    def hard_routes(self, routes):
+        """
+        Write the hard clause "at least one of the routes is a measurement path"
+        :param routes: a bitset over the routes
+        """
+        selectors = format(routes, self._route_format)[::-1].encode().translate(self._SELECTORS)
+        line = b"h " + b" ".join(compress(self._route_literals, selectors)) + b" 0\n"
+        self.sink.write(line)
+        self.clauses += 1
+        self.hard_clauses += 1
+        self.literals += routes.bit_count()
+        self.bytes += len(line)
+
+    def at_most(self, literals, bound, first_variable):
+        """
+        Write the hard clauses "at most bound of the literals are true" (sequential counter encoding)
+        :param literals: a list of non-zero integers
+        :param bound: a non-negative integer
+        :param first_variable: the first unused variable, the counter uses (len(literals) - 1) x bound new variables
+        :return: the first variable left unused by the encoding
+        """
+        size = len(literals)
+        if bound >= size:
+            return first_variable
+        if bound == 0:
+            for literal in literals:
+                self.hard((-literal,))
+            return first_variable
+
+        # counter[i][j] is true if at least j+1 of the first i+1 literals are true
+        def counter(i, j):
+            return first_variable + i * bound + j
+
+        self.hard((-literals[0], counter(0, 0)))
+        for j in range(1, bound):
+            self.hard((-counter(0, j),))
+        for i in range(1, size - 1):
+            self.hard((-literals[i], counter(i, 0)))
+            self.hard((-counter(i - 1, 0), counter(i, 0)))
+            for j in range(1, bound):
+                self.hard((-literals[i], -counter(i - 1, j - 1), counter(i, j)))
+                self.hard((-counter(i - 1, j), counter(i, j)))
+            self.hard((-literals[i], -counter(i - 1, bound - 1)))
+        self.hard((-literals[size - 1], -counter(size - 2, bound - 1)))
+        return first_variable + (size - 1) * bound
+
+
+def write_clauses(writer, n, symptoms, endpoints, goal="cover", independant_nodes=None, biconnected_components=None,
+                  constraints=None, upper_bound=None):
+    """
+    Stream the clauses of the model into a WcnfWriter
+    :param writer: a WcnfWriter
     :param n: number of nodes
-    :param number_route: number of routes
-    :param symptoms: a list of set, symptoms[i] contains the indexes of the routes that cross node i
+    :param symptoms: a SymptomMatrix, symptoms[i] contains the indexes of the routes that cross node i
     :param endpoints: a list of tuples : endpoints[j] contains the starting and ending nodes of route j
     :param goal: "cover" or "1id", indicates the goal
     :param independant_nodes: a set of integer, it contains the independent nodes
     :param biconnected_components: a 2D list, containing each biconnected components
                                 that contains exactly one articulation point, this articulation point is not present in the lists
-    :param instance_name: name of the file to store the clauses
+    :param constraints: a list of bitsets over the routes (see pruning.prune_constraints), if given they replace
+                        the cover and 1-identifiability clauses
+    :param upper_bound: an upper bound on the number of monitors (e.g. the size of a feasible warm start)
+    :return: the number of variables of the model
     """
-
-    # path to store temporary store the clauses
-    if not os.path.isdir(os.path.join(os.path.dirname(__file__), f"tmp/clauses/")):
-        os.makedirs(os.path.join(os.path.dirname(__file__), f"tmp/clauses/"))
-    clause_path = os.path.join(os.path.dirname(__file__), f"tmp/clauses/{instance_name}_{goal}.tmp")
-    clauses = []
-
-    file = open(clause_path, 'w')
-
     # weights of monitors
     for i in range(n):
-        clauses.append(["1", -(i + 1)])
-
-    file.write(clauses_to_wcnf(clauses))
-    file.flush()
-
-    clauses = []
+        writer.soft(1, (-(i + 1),))
 
     # route is measurement path <-> its endpoints are both monitors
     for index, (src, dest) in enumerate(endpoints):
-        clauses.append(["h", src+1, -(index+1+n)])
-        clauses.append(["h", dest+1, -(index+1+n)])
-        clauses.append(["h", -(src+1), -(dest+1), index+1+n])
-
-    file.write(clauses_to_wcnf(clauses))
-    file.flush()
-
-    clauses = []
-
-    # cover clauses
-    for symptom in symptoms:
-        clause = ["h"]
-        for route in symptom:
-            clause.append(route+1+n)
-
-        clauses.append(clause)
-
-    file.write(clauses_to_wcnf(clauses))
-    file.flush()
-
-    clauses = []
-
-    # 1-identifiability clauses
-    if goal == '1id':
-        for node_a in range(n):
-            for node_b in range(node_a + 1, n):
-                clause = ["h"]
-                for route in symptoms[node_a].symmetric_difference(symptoms[node_b]):
-                    clause.append(route+1+n)
-
-                clauses.append(clause)
-
-            file.write(clauses_to_wcnf(clauses))
-            file.flush()
-            clauses = []
+        writer.hard((src+1, -(index+1+n)))
+        writer.hard((dest+1, -(index+1+n)))
+        writer.hard((-(src+1), -(dest+1), index+1+n))
+
+    if constraints is not None:
+        # pruned cover (and 1-identifiability) clauses
+        for routes in constraints:
+            writer.hard_routes(routes)
+    else:
+        # cover clauses
+        for routes in symptoms.rows:
+            writer.hard_routes(routes)
+
+        # 1-identifiability clauses
+        if goal == '1id':
+            for _, _, routes in symptoms.pair_masks():
+                writer.hard_routes(routes)
 
     # each independant node must be a monitor
     if independant_nodes is not None:
         for node in independant_nodes:
-            clauses.append(["h", node+1])
-
-        del independant_nodes
-        gc.collect()
+            writer.hard((node+1,))
 
     # if a biconnected components contains only one articulation points
     # then at least one of its node should be a monitor
     if biconnected_components is not None:
         for component in biconnected_components:
-            clause = ["h"]
-            for node in component:
-                clause.append(node+1)
-            clauses.append(clause)
+            writer.hard([node+1 for node in component])
+
+    # at most upper_bound monitors
+    if upper_bound is not None:
+        return writer.at_most([i + 1 for i in range(n)], upper_bound, n + len(endpoints) + 1) - 1
+    return n + len(endpoints)
+
+
+def write_clauses_monitor_problem(n, symptoms, endpoints, goal="cover",
+                                independant_nodes=None, biconnected_components=None,
+                                instance_name="clause", constraints=None, clause_path=None, upper_bound=None):
+    """
+    Write the model into wncf format in the given file
+    :param n: number of nodes
+    :param symptoms: a SymptomMatrix, symptoms[i] contains the indexes of the routes that cross node i
+    :param endpoints: a list of tuples : endpoints[j] contains the starting and ending nodes of route j
+    :param goal: "cover" or "1id", indicates the goal
+    :param independant_nodes: a set of integer, it contains the independent nodes
+    :param biconnected_components: a 2D list, containing each biconnected components
+                                that contains exactly one articulation point, this articulation point is not present in the lists
+    :param instance_name: name of the instance, used to name the clause file
+    :param constraints: a list of bitsets over the routes (see pruning.prune_constraints), if given they replace
+                        the cover and 1-identifiability clauses
+    :param clause_path: path of the file (or FIFO) to write, by default a unique file is created in tmp/clauses/
+    :param upper_bound: an upper bound on the number of monitors (e.g. the size of a feasible warm start)
+    :return: the path to the clause file
+    """
+    if clause_path is None:
+        clause_path = tmp_path("clauses", instance_name, goal)
 
-        del biconnected_components
-        gc.collect()
+    with phase("wcnf"), open(clause_path, 'wb', buffering=WRITE_BUFFER) as file:
+        writer = WcnfWriter(file, routes_nbr=len(endpoints), route_offset=n+1)
+        variables = write_clauses(writer, n, symptoms, endpoints, goal, independant_nodes, biconnected_components,
+                                  constraints, upper_bound)
+    record_model(variables=variables, constraints=writer.hard_clauses, nonzeros=writer.literals,
+                 clause_bytes=writer.bytes)
 
-    file.write(clauses_to_wcnf(clauses))
-    file.close()
+    return clause_path
 
 
 def clauses_to_wcnf(clauses):
@@ -107,12 +231,7 @@ def clauses_to_wcnf(clauses):
     :param clauses: a 2D list containing each clause
     :return: a string containing the model in wcnf format
     """
-    output_string = ""
-    for clause in clauses:
-        for elem in clause:
-            output_string+=str(elem) + " "
-        output_string += "0\n"
-    return output_string
+    return "".join([" ".join(map(str, clause)) + " 0\n" for clause in clauses])
 
 
 def get_solve_time(stat_file):
@@ -133,6 +252,20 @@ def get_solve_time(stat_file):
     return None
 
 
+def get_exit_status(watcher_file):
+    """
+    Retrieve the status proven by the solver from its exit code, reported by runsolver
+    :param watcher_file: path to the file containing the information written by runsolver
+    :return: a string containing the status if the solver exited with the code of a proven status, None otherwise
+            (e.g. when it is stopped by the time limit or by a signal)
+    """
+    with open(watcher_file, 'r') as file:
+        for line in file:
+            if line.startswith("Child status:"):
+                return EXIT_STATUSES.get(int(line.split(":")[1]))
+    return None
+
+
 def get_solution_paths(output):
     sol = None
     status = None
@@ -165,42 +298,243 @@ def get_solution_monitors(output, n):
     return sol, status
 
 
-def solve_maxsat(goal = "cover",instance_name="clause", timelimit=1800, nodes_nbr=None):
+def run_solver(command, nodes_nbr, incumbent=None):
+    """
+    Run NuWLS-c and collect its output. If an incumbent is given, the solver prints every improving model, which is
+    reported to the incumbent as soon as it is printed, and the solver is stopped once the incumbent is closed
+    :param command: the command running the solver (see solve_maxsat)
+    :param nodes_nbr: the number of nodes
+    :param incumbent: an object with the interface of portfolio.SharedIncumbent (e.g. anytime.Trajectory)
+    :return: a string containing the output of the solver, with only the last model printed
+    """
+    if incumbent is None:
+        return subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True).stdout
+
+    # the solver is statically linked and buffers its whole output unless it writes to a terminal
+    master, slave = pty.openpty()
+    process = subprocess.Popen(command[:-1] + ["-print_every_model=1", command[-1]], stdout=slave,
+                               stderr=subprocess.STDOUT)
+    os.close(slave)
+    lines = []
+    model = None
+    pending = b""
+    stopped = False
+    try:
+        while True:
+            if select.select([master], [], [], POLL_INTERVAL)[0]:
+                try:
+                    data = os.read(master, 1 << 16)
+                except OSError:  # the solver exited
+                    data = b""
+                if not data:
+                    break
+                *complete, pending = (pending + data).split(b"\n")
+                for line in complete:
+                    line = line.decode(errors="replace").rstrip()
+                    if line.startswith("v "):
+                        model = line
+                        incumbent.report(get_solution_monitors(line, nodes_nbr)[0], "nuwls-c")
+                    else:
+                        lines.append(line)
+            if not stopped and incumbent.closed():
+                # runsolver forwards the signal to the solver, which prints its status and stops
+                process.terminate()
+                stopped = True
+    finally:
+        os.close(master)
+        process.wait()
+    if model is not None:
+        lines.append(model)
+    return "\n".join(lines)
+
+
+def solve_maxsat(goal = "cover",instance_name="clause", timelimit=1800, nodes_nbr=None, clause_path=None,
+                 incumbent=None, memory=None, keep_clauses=False):
     """
     Use NuWLS-c to solve the problem
     :param goal: "cover" or "1id"
-    :param instance_name: name of the file containing the clauses
+    :param instance_name: name of the instance
     :param timelimit: time limit (in seconds) for the solver
     :param nodes_nbr: the number of nodes
+    :param clause_path: path of the file (or FIFO) containing the clauses, a regular file is removed after the run
+    :param incumbent: an object with the interface of portfolio.SharedIncumbent, if given every improving solution is
+                    reported to it while the solver runs, and the solver is stopped when it is closed
+    :param memory: the memory limit of the solver, in MB (MEM_LIMIT by default)
+    :param keep_clauses: if True, the clause file is not removed (e.g. a cached model, see model_cache.cached_wcnf)
     :return: a list containing index of monitors in the graph, the total runtime (load + solving time) in seconds,
             the solving time in seconds, the status of the solver
     """
 
-    # file where the stats will be written
-    if not os.path.isdir(os.path.join(os.path.dirname(__file__), f"tmp/stats/")):
-        os.makedirs(os.path.join(os.path.dirname(__file__), f"tmp/stats/"))
-    if not os.path.isdir(os.path.join(os.path.dirname(__file__), f"tmp/watcher_info/")):
-        os.makedirs(os.path.join(os.path.dirname(__file__), f"tmp/watcher_info/"))
-    stats_path = os.path.join(os.path.dirname(__file__), f"tmp/stats/{instance_name}_{goal}.tmp")
-    watch_path = os.path.join(os.path.dirname(__file__), f"tmp/watcher_info/{instance_name}_{goal}.tmp")
+    # files where the stats will be written
+    stats_path = tmp_path("stats", instance_name, goal)
+    watch_path = tmp_path("watcher_info", instance_name, goal)
     # file where the clauses are written
-    clause_path = os.path.join(os.path.dirname(__file__), f"tmp/clauses/{instance_name}_{goal}.tmp")
+    if clause_path is None:
+        clause_path = os.path.join(TMP_DIR, f"clauses/{instance_name}_{goal}.tmp")
     # path to the solver
     executable_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "maxsat_solvers/NuWLS-c-2023/bin")
 
     start_time = time.perf_counter()
     # solve the problem
-    output = subprocess.getoutput(f"{os.path.join(executable_dir, 'run')} -W {timelimit} -d 3 -v {stats_path} "
-                                     f"-w {watch_path} -M {MEM_LIMIT} "
-                                     f"{os.path.join(executable_dir, 'NuWLS-c_static')} {clause_path}")
+    output = run_solver([os.path.join(executable_dir, 'run'), "-W", str(timelimit), "-d", str(RUNSOLVER_DELAY),
+                         "-v", stats_path, "-w", watch_path, "-M", str(memory or MEM_LIMIT),
+                         os.path.join(executable_dir, 'NuWLS-c_static'),
+                         clause_path], nodes_nbr, incumbent)
     total_time = time.perf_counter() - start_time
 
     solution, status = get_solution_monitors(output, nodes_nbr)
+    # the last status line printed with an incumbent is the one of an improving model, not the final one
+    status = get_exit_status(watch_path) or status
     solve_time = get_solve_time(stats_path)
 
     # remove the temp files
     os.remove(stats_path)
     os.remove(watch_path)
-    os.remove(clause_path)
+    if os.path.isfile(clause_path) and not keep_clauses:
+        os.remove(clause_path)
+
+    return solution, total_time, solve_time, status
 
-    return solution, total_time, solve_time, status
\ No newline at end of file
+
+def solve_maxsat_streaming(n, symptoms, endpoints, goal="cover", independant_nodes=None,
+                           biconnected_components=None, instance_name="clause", constraints=None, timelimit=1800,
+                           upper_bound=None, incumbent=None, memory=None):
+    """
+    Use NuWLS-c to solve the problem, the clauses are fed to the solver through a FIFO while they are generated,
+    so that the model is never stored on disk
+    :param n: number of nodes
+    :param symptoms: a SymptomMatrix, symptoms[i] contains the indexes of the routes that cross node i
+    :param endpoints: a list of tuples : endpoints[j] contains the starting and ending nodes of route j
+    :param goal: "cover" or "1id", indicates the goal
+    :param independant_nodes: a set of integer, it contains the independent nodes
+    :param biconnected_components: a 2D list, containing each biconnected components
+                                that contains exactly one articulation point, this articulation point is not present in the lists
+    :param instance_name: name of the instance
+    :param constraints: a list of bitsets over the routes (see pruning.prune_constraints), if given they replace
+                        the cover and 1-identifiability clauses
+    :param timelimit: time limit (in seconds) for the solver
+    :param upper_bound: an upper bound on the number of monitors (e.g. the size of a feasible warm start)
+    :param incumbent: an object with the interface of portfolio.SharedIncumbent (see solve_maxsat)
+    :param memory: the memory limit of the solver, in MB (MEM_LIMIT by default)
+    :return: a list containing index of monitors in the graph, the total runtime (load + solving time) in seconds,
+            the solving time in seconds, the status of the solver
+    """
+    fifo_dir = tempfile.mkdtemp(prefix="nuwls-")
+    clause_path = os.path.join(fifo_dir, f"{instance_name}_{goal}.wcnf")
+    os.mkfifo(clause_path)
+
+    def feed():
+        try:
+            write_clauses_monitor_problem(n, symptoms, endpoints, goal, independant_nodes, biconnected_components,
+                                          instance_name, constraints, clause_path, upper_bound)
+        except BrokenPipeError:
+            # the solver stopped before reading the whole model (e.g. timeout)
+            pass
+
+    writer = threading.Thread(target=feed, daemon=True)
+    writer.start()
+    try:
+        return solve_maxsat(goal, instance_name, timelimit, n, clause_path, incumbent, memory)
+    finally:
+        if writer.is_alive():
+            # the solver never opened the FIFO : open it on its side to unblock the writer
+            try:
+                os.close(os.open(clause_path, os.O_RDONLY | os.O_NONBLOCK))
+            except OSError:
+                pass
+        writer.join()
+        shutil.rmtree(fifo_dir, ignore_errors=True)
+
+
+def solve_maxsat_lazy(n, symptoms, endpoints, independant_nodes=None, biconnected_components=None,
+                      instance_name="clause", constraints=None, timelimit=1800, stats=None, upper_bound=None,
+                      memory=None):
+    """
+    Use NuWLS-c to solve the 1-identifiability problem by constraint generation : the cover model is solved, then the
+    1-identifiability clauses violated by the solution are added and the model is solved again, until the solution
+    is 1-identifiable. Each round gets the remaining time, minus the delay runsolver may take to stop NuWLS-c. When the
+    time runs out, the last solution is completed into a 1-identifiable one by the greedy heuristic.
+    NuWLS-c only reads the clause file, it cannot be given the previous solution as a hint
+    :param n: number of nodes
+    :param symptoms: a SymptomMatrix, symptoms[i] contains the indexes of the routes that cross node i
+    :param endpoints: a list of tuples : endpoints[j] contains the starting and ending nodes of route j
+    :param independant_nodes: a set of integer, it contains the independent nodes
+    :param biconnected_components: a 2D list, containing each biconnected components
+                                that contains exactly one articulation point, this articulation point is not present in the lists
+    :param instance_name: name of the instance
+    :param constraints: a list of bitsets over the routes (see pruning.prune_constraints) replacing the cover clauses
+    :param timelimit: time limit (in seconds) for the whole loop
+    :param stats: a dictionary, if given the number of lazy cuts and iterations are stored in it
+    :param upper_bound: an upper bound on the number of monitors (e.g. the size of a feasible warm start)
+    :param memory: the memory limit of the solver, in MB (MEM_LIMIT by default)
+    :return: a list containing index of monitors in the graph, the total runtime (load + solving time) in seconds,
+            the solving time in seconds, the status of the solver ('Timeout' if the time ran out before a
+            1-identifiable solution was found)
+    """
+    clauses = list(constraints) if constraints is not None else list(symptoms.rows)
+    cuts = 0
+    iterations = 0
+    total_time = 0
+    solve_time = 0
+    # time spent by a round outside of the solver, at least the delay of runsolver
+    overhead = RUNSOLVER_DELAY
+    solution = None
+    last_cover = None
+    while True:
+        write_start = time.perf_counter()
+        clause_path = write_clauses_monitor_problem(n, symptoms, endpoints, "cover", independant_nodes,
+                                                    biconnected_components, instance_name, clauses,
+                                                    upper_bound=upper_bound)
+        # the model of each round is written before the solver starts, its writing time counts in the time limit
+        total_time += time.perf_counter() - write_start
+        round_limit = floor(timelimit - total_time - overhead)
+        if round_limit < 1:
+            os.remove(clause_path)
+            status = 'Timeout'
+            break
+        round_solution, run_time, run_solve_time, status = solve_maxsat("1id", instance_name, round_limit, n,
+                                                                        clause_path, memory=memory)
+        iterations += 1
+        total_time += run_time
+        solve_time += run_solve_time or 0
+        overhead = max(overhead, run_time - (run_solve_time or 0))
+        if not round_solution:
+            if status != "UNSATISFIABLE":
+                status = 'Timeout'
+            break
+
+        violated = indistinguishable_pairs(symptoms, measurement_paths(endpoints, round_solution))
+        if not violated:
+            solution = round_solution
+            break
+        last_cover = round_solution
+        clauses.extend(symptoms.pair_mask(node_a, node_b) for node_a, node_b in violated)
+        cuts += len(violated)
+
+    if status == 'Timeout' and last_cover is not None:
+        # the last solution only misses some 1-identifiability clauses
+        repair_start = time.perf_counter()
+        solution = complete_1id(symptoms, endpoints, last_cover)
+        total_time += time.perf_counter() - repair_start
+
+    if stats is not None:
+        stats["cuts"] = cuts
+        stats["iterations"] = iterations
+
+    return solution, total_time, solve_time, status
+
+
+def complete_1id(symptoms, endpoints, monitors):
+    """
+    Add monitors to a set of monitors until every node is 1-identifiable, with the greedy heuristic, then remove the
+    redundant ones (see greedy.GreedyPlacement)
+    :param symptoms: a SymptomMatrix, symptoms[i] contains the indexes of the routes that cross node i
+    :param endpoints: a list of tuples : endpoints[j] contains the starting and ending nodes of route j
+    :param monitors: the initial monitors (e.g. a solution of the cover model)
+    :return: the sorted list of monitors, None if the nodes cannot all be 1-identifiable
+    """
+    placement = GreedyPlacement(symptoms, endpoints, monitors)
+    if not placement.solve("1id"):
+        return None
+    placement.remove_redundant("1id")
+    return sorted(placement.monitors)
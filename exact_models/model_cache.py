@@ -0,0 +1,379 @@
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+import tempfile
+from itertools import compress
+
+from instance_cache import CACHE_DIR, content_hash, load_instance
+from max_sat import WRITE_BUFFER, write_clauses_monitor_problem
+from pruning import prune_constraints
+from reductions import load_reductions
+from symptoms import iter_bits
+
+MODEL_VERSION = 1
+# magic, version, number of nodes, number of routes, number of constraints, size of the metadata (json)
+HEADER = struct.Struct("<4sIIIIQ")
+MAGIC = b"MPMC"
+FORMATS = ("wcnf", "lp", "mps", "dzn")
+# number of terms written on each line of the lp files
+LP_TERMS_PER_LINE = 32
+
+
+class Model:
+    """
+    class representing a built monitor placement model, independent of the solvers : the constraints over the routes
+    (the pruned cover and 1-identifiability constraints, see pruning.prune_constraints), the independent nodes and the
+    biconnected components given by the reductions. The routes are linked to their endpoints as in every backend
+    """
+
+    def __init__(self, n, endpoints, goal, constraints, independent=None, components=None, stats=None, path=None):
+        """
+        create a Model object
+        :param n: number of nodes
+        :param endpoints: a list of tuples : endpoints[j] contains the starting and ending nodes of route j
+        :param goal: "cover" or "1id"
+        :param constraints: a list of bitsets over the routes, at least one route of each must be a measurement path
+        :param independent: the nodes that must be monitors
+        :param components: a 2D list, at least one node of each list must be a monitor
+        :param stats: the statistics of the pruning
+        :param path: the path of the cached model, if it is cached
+        """
+        self.n = n
+        self.m = len(endpoints)
+        self.endpoints = endpoints
+        self.goal = goal
+        self.constraints = constraints
+        self.independent = list(independent or [])
+        self.components = [list(component) for component in components or []]
+        self.stats = stats
+        self.path = path
+
+    def wcnf_path(self):
+        """
+        :return: the path of the wcnf export stored next to the cached model, None if the model is not cached
+        """
+        return None if self.path is None else self.path[:-len(".mdl")] + ".wcnf"
+
+
+def build_model(n, symptoms, endpoints, goal, independant_nodes=None, biconnected_components=None):
+    """
+    Build the model of an instance : its constraints are pruned (see pruning.prune_constraints)
+    :param n: number of nodes
+    :param symptoms: a SymptomMatrix, symptoms[i] contains the indexes of the routes that cross node i
+    :param endpoints: a list of tuples : endpoints[j] contains the starting and ending nodes of route j
+    :param goal: "cover" or "1id"
+    :param independant_nodes: the independent nodes, None to not use the problem reductions
+    :param biconnected_components: the biconnected components containing exactly one articulation point
+    :return: a Model
+    """
+    constraints, stats = prune_constraints(symptoms, goal)
+    return Model(n, endpoints, goal, constraints, independant_nodes, biconnected_components, stats)
+
+
+def model_key(digest, goal, independant_nodes=None, biconnected_components=None):
+    """
+    :param digest: the content hash of the instance
+    :param goal: "cover" or "1id"
+    :param independant_nodes: the independent nodes, None to not use the problem reductions
+    :param biconnected_components: the biconnected components containing exactly one articulation point
+    :return: a string identifying the model : the hash of the instance content, of the goal and of the reductions
+    """
+    reductions = None
+    if independant_nodes is not None:
+        components = sorted(sorted(component) for component in biconnected_components or [])
+        reductions = [sorted(independant_nodes), components]
+    return hashlib.sha256(json.dumps([digest, goal, reductions, MODEL_VERSION]).encode()).hexdigest()
+
+
+def model_file(key, cache_dir=CACHE_DIR):
+    """
+    :param key: the key of the model (see model_key)
+    :param cache_dir: the directory containing the cached models
+    :return: the path to the cached model
+    """
+    return os.path.join(cache_dir, f"{key}.mdl")
+
+
+def write_model(path, model):
+    """
+    Store a model in binary format : a header, the metadata of the model (json) and the packed constraints. The file
+    is written atomically so that concurrent runs can share the cache
+    :param path: path to the cache file
+    :param model: a Model
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    metadata = json.dumps({"goal": model.goal, "independent": model.independent, "components": model.components,
+                           "stats": model.stats}).encode()
+    row_bytes = (model.m + 7) >> 3
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, 'wb', buffering=WRITE_BUFFER) as file:
+        file.write(HEADER.pack(MAGIC, MODEL_VERSION, model.n, model.m, len(model.constraints), len(metadata)))
+        file.write(metadata)
+        for routes in model.constraints:
+            file.write(routes.to_bytes(row_bytes, 'little'))
+    os.replace(tmp, path)
+
+
+def read_model(path, endpoints):
+    """
+    Read a cached model
+    :param path: path to the cache file
+    :param endpoints: the endpoints of the routes of the instance
+    :return: a Model
+    """
+    with open(path, 'rb') as file:
+        buffer = memoryview(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
+
+    magic, version, n, m, count, metadata_size = HEADER.unpack_from(buffer)
+    if magic != MAGIC or version != MODEL_VERSION or m != len(endpoints):
+        raise ValueError(f"{path} is not a valid model cache")
+    offset = HEADER.size
+    metadata = json.loads(bytes(buffer[offset:offset + metadata_size]))
+    offset += metadata_size
+
+    row_bytes = (m + 7) >> 3
+    constraints = [int.from_bytes(buffer[start:start + row_bytes], 'little')
+                   for start in range(offset, offset + count * row_bytes, row_bytes)]
+    return Model(n, endpoints, metadata["goal"], constraints, metadata["independent"], metadata["components"],
+                 metadata["stats"], path)
+
+
+def load_model(instance, n, symptoms, endpoints, goal, independant_nodes=None, biconnected_components=None,
+               cache_dir=CACHE_DIR):
+    """
+    Load the model of an instance from the model cache if it has already been built for the same instance content,
+    goal and reductions. The model is built and added to the cache otherwise
+    :param instance: the instance file, or <archive>.tar.gz:<member>
+    :param n: number of nodes
+    :param symptoms: a SymptomMatrix, symptoms[i] contains the indexes of the routes that cross node i
+    :param endpoints: a list of tuples : endpoints[j] contains the starting and ending nodes of route j
+    :param goal: "cover" or "1id"
+    :param independant_nodes: the independent nodes, None to not use the problem reductions
+    :param biconnected_components: the biconnected components containing exactly one articulation point
+    :param cache_dir: the directory containing the cached models
+    :return: a Model, and True if it has been read from the cache
+    """
+    key = model_key(content_hash(instance, cache_dir), goal, independant_nodes, biconnected_components)
+    cached = model_file(key, cache_dir)
+    if os.path.isfile(cached):
+        try:
+            return read_model(cached, endpoints), True
+        except (ValueError, TypeError, KeyError, struct.error):
+            pass  # corrupted or outdated cache, build the model again
+
+    model = build_model(n, symptoms, endpoints, goal, independant_nodes, biconnected_components)
+    write_model(cached, model)
+    model.path = cached
+    return model, False
+
+
+def write_wcnf(path, model, upper_bound=None):
+    """
+    Export a model in wcnf format (see max_sat.write_clauses)
+    :param path: the file to write
+    :param model: a Model
+    :param upper_bound: an upper bound on the number of monitors, encoded as cardinality clauses
+    :return: the path to the file
+    """
+    return write_clauses_monitor_problem(model.n, None, model.endpoints, model.goal, model.independent,
+                                         model.components, constraints=model.constraints, clause_path=path,
+                                         upper_bound=upper_bound)
+
+
+def cached_wcnf(model):
+    """
+    Get the wcnf export of a cached model, stored next to it so that NuWLS-c reads it directly in the next runs. It is
+    written atomically on the first call
+    :param model: a Model read from (or added to) the model cache
+    :return: the path to the wcnf file
+    """
+    path = model.wcnf_path()
+    if not os.path.isfile(path):
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        os.close(fd)
+        os.replace(write_wcnf(tmp, model), path)
+    return path
+
+
+class _RouteTerms:
+    """
+    class translating the bitsets over the routes into the names of their variables, without iterating over the bits
+    """
+    # translation of the binary representation of a bitset into selectors for itertools.compress
+    _SELECTORS = bytes.maketrans(b'01', b'\x00\x01')
+
+    def __init__(self, names):
+        self.names = names
+        self._format = f"0{len(names)}b"
+
+    def __call__(self, routes):
+        return compress(self.names, format(routes, self._format)[::-1].encode().translate(self._SELECTORS))
+
+
+def _lp_sum(terms, separator=" + "):
+    """
+    :return: the sum of the terms in lp format (or their list if separator is " "), split in lines of
+            LP_TERMS_PER_LINE terms
+    """
+    terms = list(terms)
+    return f"\n  {separator}".join(separator.join(terms[start:start + LP_TERMS_PER_LINE])
+                                   for start in range(0, len(terms), LP_TERMS_PER_LINE))
+
+
+def write_lp(path, model):
+    """
+    Export a model in CPLEX lp format (as read by CPLEX, Gurobi, HiGHS or SCIP), with the variables and constraints of
+    the Gurobi model (see monitor_placement.min_set_gurobi) : X_i = 1 if node i is a monitor, Y_j = 1 if route j is a
+    measurement path. The brackets of the Gurobi names are not valid in lp names
+    :param path: the file to write
+    :param model: a Model
+    :return: the path to the file
+    """
+    x = [f"X_{node}" for node in range(model.n)]
+    y = [f"Y_{route}" for route in range(model.m)]
+    terms = _RouteTerms(y)
+    with open(path, 'w', buffering=WRITE_BUFFER) as file:
+        file.write(f"\\ monitor placement problem ({model.goal})\nMinimize\n obj: {_lp_sum(x)}\nSubject To\n")
+        for route, (src, dest) in enumerate(model.endpoints):
+            file.write(f" s{route}: {x[src]} - {y[route]} >= 0\n d{route}: {x[dest]} - {y[route]} >= 0\n"
+                       f" p{route}: {y[route]} - {x[src]} - {x[dest]} >= -1\n")
+        for index, routes in enumerate(model.constraints):
+            file.write(f" c{index}: {_lp_sum(terms(routes))} >= 1\n")
+        for node in model.independent:
+            file.write(f" i{node}: {x[node]} = 1\n")
+        for index, component in enumerate(model.components):
+            file.write(f" b{index}: {_lp_sum(x[node] for node in component)} >= 1\n")
+        file.write(f"Binaries\n {_lp_sum(x, ' ')}\n {_lp_sum(y, ' ')}\nEnd\n")
+    return path
+
+
+def write_mps(path, model):
+    """
+    Export a model in (free) mps format, with the same variables and constraints as write_lp
+    :param path: the file to write
+    :param model: a Model
+    :return: the path to the file
+    """
+    # the constraints are stored row-wise, the mps columns need the constraints containing each route
+    route_rows = [[] for _ in range(model.m)]
+    routes_of = _RouteTerms(range(model.m))
+    for index, routes in enumerate(model.constraints):
+        for route in routes_of(routes):
+            route_rows[route].append(index)
+    entries = [f" c{index} 1\n" for index in range(len(model.constraints))]
+    node_rows = [[] for _ in range(model.n)]
+    for route, (src, dest) in enumerate(model.endpoints):
+        node_rows[src] += [f" s{route} 1\n", f" p{route} -1\n"]
+        node_rows[dest] += [f" d{route} 1\n", f" p{route} -1\n"]
+    for node in model.independent:
+        node_rows[node].append(f" i{node} 1\n")
+    for index, component in enumerate(model.components):
+        for node in component:
+            node_rows[node].append(f" b{index} 1\n")
+
+    with open(path, 'w', buffering=WRITE_BUFFER) as file:
+        file.write(f"NAME monitor_placement_{model.goal}\nROWS\n N obj\n")
+        file.writelines(f" G s{route}\n G d{route}\n G p{route}\n" for route in range(model.m))
+        file.writelines(f" G c{index}\n" for index in range(len(model.constraints)))
+        file.writelines(f" E i{node}\n" for node in model.independent)
+        file.writelines(f" G b{index}\n" for index in range(len(model.components)))
+        file.write("COLUMNS\n MARKER 'MARKER' 'INTORG'\n")
+        for node, rows in enumerate(node_rows):
+            column = f" X_{node}"
+            # each entry of a column starts with the name of the column
+            file.write(column + column.join([" obj 1\n"] + rows))
+        for route, rows in enumerate(route_rows):
+            column = f" Y_{route}"
+            file.write(f"{column} s{route} -1\n{column} d{route} -1\n{column} p{route} 1\n")
+            if rows:
+                file.write(column + column.join(map(entries.__getitem__, rows)))
+        file.write(" MARKER 'MARKER' 'INTEND'\nRHS\n")
+        file.writelines(f" rhs p{route} -1\n" for route in range(model.m))
+        file.writelines(f" rhs c{index} 1\n" for index in range(len(model.constraints)))
+        file.writelines(f" rhs i{node} 1\n" for node in model.independent)
+        file.writelines(f" rhs b{index} 1\n" for index in range(len(model.components)))
+        file.write("BOUNDS\n")
+        file.writelines(f" BV bnd X_{node}\n" for node in range(model.n))
+        file.writelines(f" BV bnd Y_{route}\n" for route in range(model.m))
+        file.write("ENDATA\n")
+    return path
+
+
+def write_dzn(path, n, symptoms, endpoints, independant_nodes=None, biconnected_components=None):
+    """
+    Export an instance as the data of the MiniZinc models (minizinc_model/monitor_cover.mzn and monitor_1id.mzn), in
+    the format of the .dzn files of minizinc_model/instances (the nodes are numbered from 1)
+    :param path: the file to write
+    :param n: number of nodes
+    :param symptoms: a SymptomMatrix, symptoms[i] contains the indexes of the routes that cross node i
+    :param endpoints: a list of tuples : endpoints[j] contains the starting and ending nodes of route j
+    :param independant_nodes: the independent nodes (leaf_nodes)
+    :param biconnected_components: the biconnected components containing exactly one articulation point (bi_comp)
+    :return: the path to the file
+    """
+    routes = [[] for _ in endpoints]
+    for node, row in enumerate(symptoms.rows):
+        for route in iter_bits(row):
+            routes[route].append(node + 1)
+    components = biconnected_components or []
+
+    with open(path, 'w', buffering=WRITE_BUFFER) as file:
+        file.write(f"n = {n};\nr = {len(endpoints)};\nb = {len(components)};\n\n")
+        file.write("routes_ends = array2d(1..r, 1..2, [\n")
+        file.write(",".join(f"{src + 1}, {dest + 1}" for src, dest in endpoints))
+        file.write(",]);\n\nroutes = [\n")
+        file.writelines("{" + ", ".join(map(str, nodes)) + "}," for nodes in routes)
+        file.write("];\n\nleaf_nodes = {" + ", ".join(str(node + 1) for node in sorted(independant_nodes or [])))
+        file.write("};\n\nbi_comp = [\n")
+        file.writelines("{" + ", ".join(str(node + 1) for node in component) + "}," for component in components)
+        file.write("];\n")
+    return path
+
+
+def export_instance(instance, goal, output, file_format=None, reductions=False, use_cache=True):
+    """
+    Export the model of an instance for an external solver
+    :param instance: the instance file, or <archive>.tar.gz:<member>
+    :param goal: "cover" or "1id"
+    :param output: the file to write
+    :param file_format: "wcnf", "lp", "mps" or "dzn", by default the extension of output
+    :param reductions: if True, use the problem reductions (see reductions.load_reductions)
+    :param use_cache: if False, always parse the instance and build the model
+    :return: the path to the file
+    """
+    file_format = file_format or os.path.splitext(output)[1][1:]
+    if file_format not in FORMATS:
+        raise ValueError(f"unknown format {file_format}, expected one of {', '.join(FORMATS)}")
+    n, symptoms, endpoints = load_instance(instance, use_cache=use_cache)
+    indy_nodes, bicon_comp = None, None
+    if reductions:
+        indy_nodes, bicon_comp, _ = load_reductions(instance, symptoms, endpoints, goal, use_cache)
+    if file_format == "dzn":
+        # the MiniZinc models build their constraints from the routes
+        return write_dzn(output, n, symptoms, endpoints, indy_nodes, bicon_comp)
+
+    if use_cache:
+        model = load_model(instance, n, symptoms, endpoints, goal, indy_nodes, bicon_comp)[0]
+    else:
+        model = build_model(n, symptoms, endpoints, goal, indy_nodes, bicon_comp)
+    writer = {"wcnf": write_wcnf, "lp": write_lp, "mps": write_mps}[file_format]
+    return writer(output, model)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="export the model of an instance for an external solver")
+    parser.add_argument('-i', '--input', help="instance file, or <archive>.tar.gz:<member> to read it from an archive",
+                        required=True)
+    parser.add_argument('-g', '--goal', help="goal of model", choices=["cover", "1id"], required=True)
+    parser.add_argument('-o', '--output', help="file to write", required=True)
+    parser.add_argument('-f', '--format', help="format of the file (by default, the extension of the output file)",
+                        choices=FORMATS, required=False)
+    parser.add_argument('-r', '--reductions', help="use problem reductions", required=False, action='store_true')
+    parser.add_argument('--no-cache', help="always parse the instance and build the model", required=False,
+                        action='store_true')
+
+    args = parser.parse_args()
+    export_instance(args.input, args.goal, args.output, args.format, args.reductions, not args.no_cache)
@@ -1,99 +1,160 @@
 import argparse
 import gc
-from ortools.sat.python import cp_model
-import gurobipy as gp
-from gurobipy import GRB
+import os
+import threading
 from time import time
-from itertools import combinations
 
-from utils import parse_instance, read_reductions, compute_symptoms
-from max_sat import write_clauses_monitor_problem, solve_maxsat
+from utils import read_solution
+from instance_cache import load_instance
+from symptoms import iter_bits, mask_from_indices
+from max_sat import write_clauses_monitor_problem, solve_maxsat, solve_maxsat_streaming, solve_maxsat_lazy
+from pruning import prune_constraints
+from greedy import min_set_greedy
+from portfolio import POLL_INTERVAL, is_optimal, min_set_portfolio
+from decomposition import min_set_decomposition
+from anytime import Trajectory
+from bounds import BOUND_TIMELIMIT, lower_bound
+from planner import plan_model
+from model_cache import cached_wcnf, load_model
+from local_search import IMPROVE_TIMELIMIT, improve_monitors
+from graph import read_edges
+from reductions import load_reductions
+from scope import read_nodes, scope_problem
+from verifier import is_1id, is_covered, measurement_paths, indistinguishable_pairs
+from profiling import Profiler, phase, profile_values, record_model
 from pathlib import Path
 
 DEFAULT_TIMEOUT = 1800
 MEM_LIMIT = 20
 RANDOM_SEED = 1863947
+# the Gurobi environment of the process and the pid of the process (see gurobi_env)
+_gurobi_env = None
+# columns of the csv output
+CSV_FIELDS = ("instance", "solver", "goal", "reductions", "monitors_nbr", "solving_time", "total_time", "status",
+              "coverage", "1id")
 
 
 def min_set_ortools(n, number_route, symptoms, endpoints, timelimit, independant_nodes=None,
                     biconnected_components=None,
-                    goal="cover"):
+                    goal="cover", constraints=None, lazy=False, stats=None, warm_start=None, upper_bound=None,
+                    threads=1, incumbent=None, lower_bound=None, memory=None):
     """
     CP model to find the smallest set of monitors such as all nodes are 1-identifiable
     :param n: number of nodes
     :param number_route: number of routes
-    :param symptoms: a list of set, symptoms[i] contains the indexes of the routes that cross node i
+    :param symptoms: a SymptomMatrix, symptoms[i] contains the indexes of the routes that cross node i
     :param endpoints: a list of tuples : endpoints[j] contains the starting and ending nodes of route j
     :param timelimit : the timelimit for the resolution of the model, in seconds
     :param independant_nodes: a set of integer, it contains the independent nodes
     :param biconnected_components: a 2D list, containing each biconnected components
                                 that contains exactly one articulation point, this articulation point is not present in the lists
     :param goal: "cover" or "1id", indicates the goal
+    :param constraints: a list of bitsets over the routes (see pruning.prune_constraints), if given they replace
+                        the cover and 1-identifiability constraints
+    :param lazy: if True and goal is "1id", the model starts with the cover constraints only and is solved again
+                with the violated 1-identifiability constraints until the solution is 1-identifiable
+    :param stats: a dictionary, if given the number of lazy cuts and iterations are stored in it
+    :param warm_start: a collection of monitors, given to the solver as hints
+    :param upper_bound: an upper bound on the number of monitors (e.g. the size of a feasible warm start)
+    :param threads: the number of search workers of the solver
+    :param incumbent: a portfolio.SharedIncumbent, if given the solutions and bounds found are shared through it and
+                    the search stops when the gap is closed
+    :param lower_bound: a lower bound on the number of monitors (see bounds.lower_bound), added as an objective cut
+    :param memory: the memory limit of the solver, in MB (MEM_LIMIT GB by default)
     :return: a list containing index of monitors in the graph, the total runtime (load + solving time) in seconds,
             the solving time in seconds, the status of the solver
     """
-    start_timer = time()
-    model = cp_model.CpModel()
-
-    # Variables
-
-    # x[i] = 1 if i is a monitor, 0 otherwise
-    x = []
-    for i in range(n):
-        x.append(model.NewBoolVar(f"x[i]"))
-
-    # y[j] = 1 if both ends of route j are monitors i.e.  x[orig(route(j))]=1 and x[dest[route(j)]=1
-    y = []
-    for i in range(number_route):
-        y.append(model.NewBoolVar(f"y[i]"))
+    # the solver modules are only imported by the backends using them
+    from ortools.sat.python import cp_model
+    from ortools_callback import IncumbentCallback
+    from sparse_model import add_cpsat_clauses, add_cpsat_model, covering_masks
 
-    # Constraints
-    # y[j] = 1 iff x[start[j]] = 1 AND x[end[j]] = 1
-    for index, (src, dest) in enumerate(endpoints):
-        model.Add(x[src] + x[dest] == 2).OnlyEnforceIf(y[index])
+    start_timer = time()
+    lazy = lazy and goal == "1id"
+    with phase("build"):
+        model = cp_model.CpModel()
 
-    # each node needs to be covered by at least one route
-    for p in symptoms:
-        model.Add(sum([y[route] for route in p]) > 0)
+        # Variables
 
-    if goal == "1id":
-        # each node needs to be distinguishable of every other nodes by at least one route
+        # x[i] = 1 if i is a monitor, 0 otherwise
+        x = []
         for i in range(n):
-            for j in range(i + 1, n):
-                model.Add(sum([y[route] for route in symptoms[i].symmetric_difference(symptoms[j])]) > 0)
+            x.append(model.NewBoolVar(f"x[i]"))
 
-    # Redundant constraints and reductions
+        # y[j] = 1 if both ends of route j are monitors i.e.  x[orig(route(j))]=1 and x[dest[route(j)]=1
+        y = []
+        for i in range(number_route):
+            y.append(model.NewBoolVar(f"y[i]"))
 
-    # each independant node is assumed to be a monitor
-    if independant_nodes is not None:
-        for node in independant_nodes:
-            model.Add(x[node] == 1)
+        # Constraints
+        # y[j] = 1 iff x[start[j]] = 1 AND x[end[j]] = 1
+        # each node needs to be covered by at least one route, and distinguishable of every other nodes by at least
+        # one route (1id), unless the pruned constraints are given
+        _, nonzeros = add_cpsat_model(model, endpoints, x, y, covering_masks(symptoms, goal, constraints, lazy))
 
-        del independant_nodes
-        gc.collect()
+        # Redundant constraints and reductions
 
-    # if a biconnected components contains only one articulation points
-    # then at least one of its node should be a monitor
-    if biconnected_components is not None:
-        for component in biconnected_components:
-            model.Add(sum([x[node] for node in component]) > 0)
+        # each independant node is assumed to be a monitor
+        if independant_nodes is not None:
+            for node in independant_nodes:
+                model.Add(x[node] == 1)
 
-        del biconnected_components
-        gc.collect()
+            del independant_nodes
+            gc.collect()
 
-    # Objective function
-    # We want to minimize the number of monitors
-    monitors_nbr = sum(x)
-    model.Minimize(monitors_nbr)
+        # if a biconnected components contains only one articulation points
+        # then at least one of its node should be a monitor
+        if biconnected_components is not None:
+            for component in biconnected_components:
+                model.Add(sum([x[node] for node in component]) > 0)
 
-    solver = cp_model.CpSolver()
-    solver.parameters.num_search_workers = 1
-    solver.parameters.max_memory_in_mb = 1000 * MEM_LIMIT
-    solver.parameters.max_time_in_seconds = timelimit
+            del biconnected_components
+            gc.collect()
 
-    status = solver.Solve(model)
+        # Objective function
+        # We want to minimize the number of monitors
+        monitors_nbr = sum(x)
+        model.Minimize(monitors_nbr)
+
+        # start the search from a known solution
+        if warm_start is not None:
+            warm_start = set(warm_start)
+            for index, i in enumerate(x):
+                model.AddHint(i, index in warm_start)
+            for index, (src, dest) in enumerate(endpoints):
+                model.AddHint(y[index], src in warm_start and dest in warm_start)
+        if upper_bound is not None:
+            model.Add(monitors_nbr <= upper_bound)
+        if lower_bound is not None:
+            model.Add(monitors_nbr >= lower_bound)
+
+        solver = cp_model.CpSolver()
+        solver.parameters.num_search_workers = threads
+        solver.parameters.max_memory_in_mb = memory or 1000 * MEM_LIMIT
+        solver.parameters.max_time_in_seconds = timelimit
+        proto = model.Proto()
+        record_model(variables=len(proto.variables), constraints=len(proto.constraints), nonzeros=nonzeros)
+
+    if incumbent is not None and not lazy:
+        # the search is also stopped when the incumbent is closed between two solutions (bound of another solver,
+        # stagnation)
+        finished = threading.Event()
+
+        def watch():
+            while not finished.wait(POLL_INTERVAL):
+                if incumbent.closed():
+                    solver.stop_search()
+                    return
+
+        watcher = threading.Thread(target=watch, daemon=True)
+        watcher.start()
+        solver.best_bound_callback = incumbent.report_bound
+        status = solver.Solve(model, IncumbentCallback(x, incumbent))
+        finished.set()
+        watcher.join()
+    else:
+        status = solver.Solve(model)
     solving_time = solver.WallTime()
-    end_timer = time()
 
     monitors = []
     # if a solution has been found, retrieves it
@@ -102,6 +163,40 @@ def min_set_ortools(n, number_route, symptoms, endpoints, timelimit, independant
             if solver.Value(i):
                 monitors.append(index)
 
+    cuts = 0
+    iterations = 1
+    while lazy and monitors:
+        # add the distinguishability constraints violated by the current solution, and solve again from it
+        violated = indistinguishable_pairs(symptoms, measurement_paths(endpoints, monitors))
+        if not violated:
+            break
+        add_cpsat_clauses(model, y, [symptoms.pair_mask(node_a, node_b) for node_a, node_b in violated])
+        cuts += len(violated)
+
+        remaining = timelimit - solving_time
+        if remaining <= 0:
+            monitors = []
+            status = cp_model.UNKNOWN
+            break
+        model.ClearHints()
+        for index, i in enumerate(x):
+            model.AddHint(i, index in monitors)
+        solver.parameters.max_time_in_seconds = remaining
+
+        status = solver.Solve(model)
+        solving_time += solver.WallTime()
+        iterations += 1
+        monitors = []
+        if status == 4 or status == 2:
+            for index, i in enumerate(x):
+                if solver.Value(i):
+                    monitors.append(index)
+
+    if stats is not None and lazy:
+        stats["cuts"] = cuts
+        stats["iterations"] = iterations
+
+    end_timer = time()
     total_time = end_timer - start_timer
 
     solver_status = status
@@ -109,82 +204,158 @@ def min_set_ortools(n, number_route, symptoms, endpoints, timelimit, independant
     return monitors, total_time, solving_time, solver_status
 
 
+def gurobi_env():
+    """
+    :return: the Gurobi environment of the process, started on the first call (starting an environment checks the
+            license). A process forked from the owner of the environment starts its own
+    """
+    global _gurobi_env
+    if _gurobi_env is None or _gurobi_env[0] != os.getpid():
+        import gurobipy as gp
+        env = gp.Env(empty=True)
+        env.setParam('OutputFlag', 0)
+        env.start()
+        _gurobi_env = (os.getpid(), env)
+    return _gurobi_env[1]
+
+
 def min_set_gurobi(n, number_route, symptoms, endpoints, timelimit, independant_nodes=None, biconnected_components=None,
-                   goal="cover"):
+                   goal="cover", constraints=None, lazy=False, stats=None, warm_start=None, threads=1,
+                   incumbent=None, lower_bound=None, memory=None):
     """
     ILP model to find the smallest set of monitors such as each node is 1-identifiable
     :param n: number of nodes
     :param number_route: number of routes
-    :param symptoms: a list of set, symptoms[i] contains the indexes of the routes that cross node i
+    :param symptoms: a SymptomMatrix, symptoms[i] contains the indexes of the routes that cross node i
     :param endpoints: a list of tuples : endpoints[j] contains the starting and ending nodes of route j
     :param timelimit : the timelimit for the resolution of the model, in seconds
     :param independant_nodes: a set of integer, it contains the independent nodes
     :param biconnected_components: a 2D list, containing each biconnected components
                                 that contains exactly one articulation point, this articulation point is not present in the lists
     :param goal: "cover" or "1id", indicates the goal
+    :param constraints: a list of bitsets over the routes (see pruning.prune_constraints), if given they replace
+                        the cover and 1-identifiability constraints
+    :param lazy: if True and goal is "1id", the model starts with the cover constraints only and the violated
+                1-identifiability constraints are added as lazy constraints on each new incumbent
+    :param stats: a dictionary, if given the number of lazy cuts is stored in it
+    :param warm_start: a collection of monitors, used as MIP start
+    :param threads: the number of threads of the solver
+    :param incumbent: a portfolio.SharedIncumbent, if given the solutions and bounds found are shared through it,
+                    the better solutions found by other solvers are injected and the search stops when the gap is closed
+    :param lower_bound: a lower bound on the number of monitors (see bounds.lower_bound), added as an objective cut
+    :param memory: the memory limit of the solver, in MB (MEM_LIMIT GB by default)
     :return: a list containing index of monitors in the graph, the total runtime (load + solving time) in seconds,
             the solving time in seconds, the status of the solver
     """
+    import gurobipy as gp
+    from gurobipy import GRB
+    from sparse_model import add_gurobi_model, covering_masks
+
+    lazy = lazy and goal == "1id"
 
     try:
-        env = gp.Env(empty=True)
-        env.setParam('OutputFlag', 0)
-        env.start()
+        env = gurobi_env()
         start_timer = time()
         m = gp.Model("1id", env=env)
         m.setParam("NonConvex", 0)
         m.setParam('TimeLimit', timelimit)
-        m.setParam('SoftMemLimit', MEM_LIMIT)
+        m.setParam('SoftMemLimit', memory / 1000 if memory else MEM_LIMIT)
         m.setParam('Seed', RANDOM_SEED)
         #m.setParam('Presolve', 0)
-        m.setParam(GRB.Param.Threads, 1)
-
-        # Variables
-
-        # x[i] = 1 if i is a monitor, 0 otherwise
-        x = m.addVars([i for i in range(n)], name="X", vtype=GRB.BINARY)
-        # y[j] = 1 if both ends of route j are monitors i.e.  x[orig(route(j))]=1 and x[dest[route(j)]=1
-        y = m.addVars([j for j in range(number_route)], name="Y",
-                      vtype=GRB.BINARY)
-
-        # The objective is to minimize the number of monitors
-        m.setObjective(gp.quicksum(x), GRB.MINIMIZE)
-
-        # Constraints
-
-        # y_ij <-> x_i · x_j
-        m.addConstrs(x[src] - y[index] >= 0 for index, (src, dest) in enumerate(endpoints))
-        m.addConstrs(x[dest] - y[index] >= 0 for index, (src, dest) in enumerate(endpoints))
-        m.addConstrs(y[index] >= x[src] + x[dest] - 1 for index, (src, dest) in enumerate(endpoints))
-
-        # each node needs to be covered by at least one route
-        for i in range(n):
-            m.addConstr(gp.quicksum([y[l] for l in symptoms[i]]) >= 1)
-
-        if goal == "1id":
-            # each node needs to be distinguishable of every other nodes by at least one route
-            for i in range(n):
-                for j in range(i + 1, n):
-                    m.addConstr(gp.quicksum([y[l] for l in symptoms[i].symmetric_difference(symptoms[j])]) >= 1)
-
-        # each independant node is assumed to be a monitor
-        if independant_nodes is not None:
-            for node in independant_nodes:
-                m.addConstr(x[node] == 1.0)
-
-            del independant_nodes
-            gc.collect()
-
-        # if a biconnected components contains only one articulation points
-        # then at least one of its node should be a monitor
-        if biconnected_components is not None:
-            for component in biconnected_components:
-                m.addConstr(gp.quicksum([x[i] for i in component]) >= 1)
-
-            del biconnected_components
-            gc.collect()
-
-        m.optimize()
+        m.setParam(GRB.Param.Threads, threads)
+
+        with phase("build"):
+            # Variables
+
+            # x[i] = 1 if i is a monitor, 0 otherwise
+            x = m.addVars([i for i in range(n)], name="X", vtype=GRB.BINARY)
+            # y[j] = 1 if both ends of route j are monitors i.e.  x[orig(route(j))]=1 and x[dest[route(j)]=1
+            y = m.addVars([j for j in range(number_route)], name="Y",
+                          vtype=GRB.BINARY)
+
+            # The objective is to minimize the number of monitors
+            m.setObjective(gp.quicksum(x), GRB.MINIMIZE)
+            if lower_bound is not None:
+                m.addConstr(x.sum() >= lower_bound)
+
+            # Constraints
+
+            # y_ij <-> x_i · x_j
+            # each node needs to be covered by at least one route, and distinguishable of every other nodes by at least
+            # one route (1id), unless the pruned constraints are given
+            x_vars = [x[i] for i in range(n)]
+            y_vars = [y[j] for j in range(number_route)]
+            add_gurobi_model(m, n, endpoints, x_vars, y_vars, covering_masks(symptoms, goal, constraints, lazy))
+
+            # each independant node is assumed to be a monitor
+            if independant_nodes is not None:
+                for node in independant_nodes:
+                    m.addConstr(x[node] == 1.0)
+
+                del independant_nodes
+                gc.collect()
+
+            # if a biconnected components contains only one articulation points
+            # then at least one of its node should be a monitor
+            if biconnected_components is not None:
+                for component in biconnected_components:
+                    m.addConstr(gp.quicksum([x[i] for i in component]) >= 1)
+
+                del biconnected_components
+                gc.collect()
+
+            # start the search from a known solution
+            if warm_start is not None:
+                warm_start = set(warm_start)
+                for i in range(n):
+                    x[i].Start = 1 if i in warm_start else 0
+                for index, (src, dest) in enumerate(endpoints):
+                    y[index].Start = 1 if src in warm_start and dest in warm_start else 0
+
+            m.update()
+            record_model(variables=m.NumVars, constraints=m.NumConstrs, nonzeros=m.NumNZs)
+
+        m._cuts = 0
+        m._pushed = n + 1  # size of the last solution received from the incumbent store
+        if lazy:
+            # the distinguishability constraints are only added when an incumbent violates them
+            m.setParam(GRB.Param.LazyConstraints, 1)
+
+        def callback(model, where):
+            if where == GRB.Callback.MIPSOL:
+                values = model.cbGetSolution(x_vars)
+                monitors = [i for i in range(n) if values[i] > 0.5]
+                violated = indistinguishable_pairs(symptoms, measurement_paths(endpoints, monitors)) if lazy else []
+                for node_a, node_b in violated:
+                    routes = symptoms.pair_mask(node_a, node_b)
+                    model.cbLazy(gp.quicksum([y[l] for l in iter_bits(routes)]) >= 1)
+                    model._cuts += 1
+                if incumbent is not None and not violated:
+                    incumbent.report(monitors, "gurobi")
+            elif incumbent is None:
+                return
+            elif where == GRB.Callback.MIP:
+                incumbent.report_bound(model.cbGet(GRB.Callback.MIP_OBJBND))
+                if incumbent.closed():
+                    model.terminate()
+            elif where == GRB.Callback.MIPNODE and model.cbGet(GRB.Callback.MIPNODE_STATUS) == GRB.OPTIMAL:
+                # a better solution has been found by another solver
+                size = incumbent.best_size()
+                if size < min(model._pushed, model.cbGet(GRB.Callback.MIPNODE_OBJBST)):
+                    size, monitors = incumbent.best()
+                    monitors = set(monitors)
+                    model.cbSetSolution(x_vars, [1 if i in monitors else 0 for i in range(n)])
+                    model.cbSetSolution(y_vars, [1 if src in monitors and dest in monitors else 0
+                                                 for src, dest in endpoints])
+                    model.cbUseSolution()
+                    model._pushed = size
+
+        if lazy or incumbent is not None:
+            m.optimize(callback)
+            if stats is not None and lazy:
+                stats["cuts"] = m._cuts
+        else:
+            m.optimize()
         end_timer = time()
 
         monitors = []
@@ -205,6 +376,8 @@ def min_set_gurobi(n, number_route, symptoms, endpoints, timelimit, independant_
             status = 'Infeasible'
         elif m.status == 17:
             status = 'MemoryError'
+        elif m.status == 11:
+            status = 'Interrupted'
         else:
             status = 'Error'
 
@@ -217,46 +390,429 @@ def min_set_gurobi(n, number_route, symptoms, endpoints, timelimit, independant_
         print('Error code : ' + str(e))
 
 
-def verify_1id(nbr_nodes, symptoms, path_set):
+def verify_1id(nbr_nodes, symptoms, path_set, nodes=None):
     """
     Test if the given set of measurement path allows each node to be 1-identifiable
     :param nbr_nodes: number of nodes in the graph
-    :param symptoms: a list of set, symptoms[i] contains the indexes of the routes that cross node i
-    :param path_set: a set containing the indexes of each measurement path
+    :param symptoms: a SymptomMatrix, symptoms[i] contains the indexes of the routes that cross node i
+    :param path_set: a set (or a bitset) containing the indexes of each measurement path
+    :param nodes: the nodes to identify, all the nodes if None
     :return: True if each node is 1-identifiable, False otherwise
     """
-    for pair in combinations(range(nbr_nodes), 2):
-        path_for_distinguish = symptoms[pair[0]].symmetric_difference(symptoms[pair[1]])
-        if len(path_set.intersection(path_for_distinguish)) == 0:
-            return False
-
-    return True
+    if not isinstance(path_set, int):
+        path_set = mask_from_indices(path_set, symptoms.m)
+    return is_1id(symptoms, path_set, nodes)
 
 
-def verify_cover(nbr_nodes, symptoms, path_set):
+def verify_cover(nbr_nodes, symptoms, path_set, nodes=None):
     """
         Test if the given set of measurement path allows each node to be 1-covered
         :param nbr_nodes: number of nodes in the graph
-        :param symptoms: a list of set, symptoms[i] contains the indexes of the routes that cross node i
-        :param path_set: a set containing the indexes of each measurement path
+        :param symptoms: a SymptomMatrix, symptoms[i] contains the indexes of the routes that cross node i
+        :param path_set: a set (or a bitset) containing the indexes of each measurement path
+        :param nodes: the nodes to identify, all the nodes if None
         :return: True if each node is covered, False otherwise
         """
-    for node in range(nbr_nodes):
-        if len(symptoms[node].intersection(path_set)) == 0:
-            return False
+    if not isinstance(path_set, int):
+        path_set = mask_from_indices(path_set, symptoms.m)
+    return is_covered(symptoms, path_set, nodes)
+
 
-    return True
+def is_valid(result):
+    """
+    :param result: a dictionary returned by solve_problem or solve_instance
+    :return: True if the solution meets the goal of the resolution (coverage or 1-identifiability)
+    """
+    return result["1id" if result["goal"] == "1id" else "coverage"]
+
+
+def solve_instance(instance, solver, goal, reductions=False, prune=False, lazy=False, fifo=False, use_cache=True,
+                   timelimit=DEFAULT_TIMEOUT, warm_start=None, threads=None, decompose=False, incumbent=None,
+                   bounds=False, memory=None, model_cache=False, improve=True, identify=None, candidates=None,
+                   profile=False, profile_dump=None, profile_memory=False):
+    """
+    Load an instance, solve the monitor placement problem and verify the solution
+    :param instance: the instance file, or <archive>.tar.gz:<member>
+    :param solver: "gurobi", "ortools", "nuwls-c", "greedy" or "portfolio"
+    :param goal: "cover" or "1id"
+    :param reductions: if True, use the problem reductions stored in the .rdc file next to the instance (computed and
+                    cached if there is no such file, see reductions.load_reductions)
+    :param prune: if True, remove duplicated and subsumed constraints before building the model
+    :param lazy: if True, add the 1-identifiability constraints only when a solution violates them
+    :param fifo: if True, feed the clauses to nuwls-c through a FIFO
+    :param use_cache: if False, always parse the instance
+    :param timelimit: the timelimit for the resolution, in seconds
+    :param warm_start: a solution file, or "greedy" to start from the solution of the greedy heuristic. If the warm
+                    start is feasible, its size bounds the number of monitors and it is returned if the solver does
+                    not find a better solution
+    :param threads: the number of threads of Gurobi and OR-Tools (1 by default), or the total number of threads of
+                    the portfolio (all the cores by default)
+    :param decompose: if True, solve the blocks of the network given by the .edges file next to the instance
+                    separately (see decomposition.min_set_decomposition)
+    :param incumbent: an anytime.Trajectory (or any object with the interface of portfolio.SharedIncumbent), every
+                    improving solution found is reported to it and the search stops when it is closed
+    :param bounds: if True, compute a lower bound on the number of monitors first (see bounds.lower_bound) : it is
+                added to the models as an objective cut, and the search stops as soon as a solution reaches it
+    :param memory: a memory budget in MB, the model is chosen so that its estimated size fits in it (see
+                planner.plan_model) and the solver is limited to it
+    :param model_cache: if True, read the pruned constraints from the model cache (see model_cache.load_model), they
+                    are built and cached if the model of the instance has never been built
+    :param improve: if True, remove the redundant monitors of a solution that is not proven optimal (see
+                local_search.improve_monitors)
+    :param identify: the nodes to identify, the other nodes need not be covered nor distinguished (all the nodes if
+                    None). The reductions, the lazy constraints, the bounds, the decomposition and the model cache are
+                    not used when the problem is scoped (see scope.scope_problem)
+    :param candidates: the candidate monitors, the routes whose endpoints are not both candidates are removed before
+                    the model is built (all the nodes if None)
+    :param profile: if True, measure the wall time and the CPU time of each phase of the run, its peak RSS, and the
+                    size of the model given to the solver (see profiling.Profiler)
+    :param profile_dump: a file receiving the cProfile statistics of the construction of the model (implies profile)
+    :param profile_memory: if True, also trace the Python allocations to measure the peak memory of each phase
+                        (implies profile, the phases run several times slower)
+    :return: a dictionary containing the solution and the statistics of the resolution
+    """
+    if profile or profile_memory or profile_dump is not None:
+        with Profiler(profile_memory, profile_dump) as profiler:
+            result = solve_instance(instance, solver, goal, reductions, prune, lazy, fifo, use_cache, timelimit,
+                                    warm_start, threads, decompose, incumbent, bounds, memory, model_cache, improve,
+                                    identify, candidates)
+        result["profile"] = profiler.report()
+        return result
+
+    with phase("load"):
+        n, symptoms, endpoints = load_instance(instance, use_cache=use_cache)
+    scoped = identify is not None or candidates is not None
+
+    indy_nodes = None
+    bicon_comp = None
+    reduction_stats = None
+    if reductions:
+        with phase("reductions"):
+            indy_nodes, bicon_comp, reduction_stats = load_reductions(instance, symptoms, endpoints, goal, use_cache)
+
+    if warm_start is not None and warm_start != "greedy":
+        warm_start = read_solution(warm_start)
+
+    adjacency = None
+    if decompose:
+        adjacency = read_edges(instance.replace('.routes', '.edges'))[1]
+
+    model = None
+    cached_model = None
+    if model_cache and not decompose and not scoped and solver != "greedy":
+        # in lazy mode, only the cover constraints are built up front
+        with phase("model"):
+            model, cached_model = load_model(instance, n, symptoms, endpoints, "cover" if lazy else goal, indy_nodes,
+                                             bicon_comp)
+
+    result = {"instance": instance, "reductions": reductions, "model_cache": cached_model, "profile": None}
+    result.update(solve_problem(n, symptoms, endpoints, solver, goal, indy_nodes, bicon_comp, prune, lazy, fifo,
+                                timelimit, warm_start, threads, Path(instance).stem, adjacency, reduction_stats,
+                                incumbent, bounds, memory, model, improve, identify, candidates))
+    return result
+
+
+def solve_problem(n, symptoms, endpoints, solver, goal, indy_nodes=None, bicon_comp=None, prune=False, lazy=False,
+                  fifo=False, timelimit=DEFAULT_TIMEOUT, warm_start=None, threads=None, instance_name="clause",
+                  adjacency=None, reduction_stats=None, incumbent=None, bounds=False, memory=None, model=None,
+                  improve=True, identify=None, candidates=None):
+    """
+    Solve the monitor placement problem of a loaded instance and verify the solution (see solve_instance)
+    :param n: number of nodes
+    :param symptoms: a SymptomMatrix, symptoms[i] contains the indexes of the routes that cross node i
+    :param endpoints: a list of tuples : endpoints[j] contains the starting and ending nodes of route j
+    :param indy_nodes: the independent nodes, None to not use the problem reductions
+    :param bicon_comp: the biconnected components containing exactly one articulation point
+    :param warm_start: a list of monitors, or "greedy" to start from the solution of the greedy heuristic
+    :param instance_name: name of the instance, used to name the temporary files
+    :param adjacency: the adjacency of the network (a list of n sets), if given the instance is decomposed into the
+                    blocks of the network
+    :param reduction_stats: the statistics returned by reductions.load_reductions along with indy_nodes and bicon_comp
+    :param incumbent: an anytime.Trajectory (or any object with the interface of portfolio.SharedIncumbent), every
+                    improving solution found is reported to it and the search stops when it is closed
+    :param bounds: if True, compute a lower bound on the number of monitors first (see solve_instance)
+    :param memory: a memory budget in MB (see solve_instance)
+    :param model: a model_cache.Model of the instance, its pruned constraints are used instead of building them
+    :param improve: if True, remove the redundant monitors of a solution that is not proven optimal
+    :param identify: the nodes to identify (see solve_instance), all the nodes if None
+    :param candidates: the candidate monitors (see solve_instance), all the nodes if None
+    :return: a dictionary containing the solution and the statistics of the resolution
+    """
+    constraints = None
+    pruning_stats = None
+    nodes = None
+    scope_stats = None
+    with phase("model"):
+        if identify is not None or candidates is not None:
+            # the reductions, the lazy constraints, the bounds and the decomposition hold for the whole set of nodes
+            symptoms, endpoints, nodes, constraints, scope_stats = scope_problem(symptoms, endpoints, goal, identify,
+                                                                                 candidates)
+            indy_nodes = bicon_comp = reduction_stats = adjacency = None
+            lazy = bounds = False
+            # the scoped constraints are already deduplicated
+            prune = True
+            if warm_start is None and solver == "portfolio":
+                # the greedy heuristic of the portfolio would identify every node
+                warm_start = "greedy"
+        elif model is not None:
+            constraints, pruning_stats, prune = model.constraints, model.stats, True
+        routes_nbr = len(endpoints)
+
+        plan = None
+        if memory is not None and adjacency is None and solver != "greedy":
+            # the constraints are pruned, then added lazily, if the model asked for does not fit in the budget
+            plan, constraints, pruning_stats = plan_model(n, symptoms, endpoints, goal, solver, memory, prune, lazy,
+                                                          indy_nodes, bicon_comp, constraints, pruning_stats,
+                                                          relax=scope_stats is None)
+            prune, lazy = plan["prune"], plan["lazy"]
+        elif prune and constraints is None:
+            # in lazy mode, only the cover constraints are built up front
+            constraints, pruning_stats = prune_constraints(symptoms, "cover" if lazy else goal)
+    lazy_stats = {}
+
+    warm_monitors = None
+    upper_bound = None
+    warm_time = 0
+    if warm_start is not None:
+        warm_begin = time()
+        with phase("warm_start"):
+            if warm_start == "greedy":
+                warm_monitors = min_set_greedy(n, symptoms, endpoints, timelimit, indy_nodes, goal, nodes=nodes)[0]
+            else:
+                warm_monitors = list(warm_start)
+            warm_paths = measurement_paths(endpoints, warm_monitors)
+            if verify_1id(n, symptoms, warm_paths, nodes) if goal == "1id" else \
+                    verify_cover(n, symptoms, warm_paths, nodes):
+                upper_bound = len(warm_monitors)
+                if incumbent is not None:
+                    incumbent.report(warm_monitors, "warm-start")
+        warm_time = time() - warm_begin
+
+    bound = None
+    bound_stats = None
+    if bounds:
+        with phase("bounds"):
+            bound, bound_stats = lower_bound(n, symptoms, endpoints, goal, indy_nodes, bicon_comp,
+                                             min(BOUND_TIMELIMIT, timelimit / 10))
+        if incumbent is None and solver == "nuwls-c" and not (lazy and goal == "1id"):
+            # NuWLS-c cannot prove optimality, it is stopped once it reaches the bound
+            incumbent = Trajectory()
+        if incumbent is not None:
+            incumbent.report_bound(bound)
+
+    with phase("solve"):
+        if any(stats is not None and stats["infeasible"] for stats in (pruning_stats, reduction_stats, scope_stats)):
+            # some nodes can never be covered or distinguished, no need to build the model
+            monitor_set, total_time, solving_time, status = [], 0, 0, 'Infeasible'
+        elif plan is not None and plan["strategy"] is None:
+            # no model fits in the memory budget
+            monitor_set, total_time, solving_time, status = [], 0, 0, 'MemoryError'
+        elif upper_bound is not None and upper_bound == bound:
+            # the warm start is optimal
+            monitor_set, total_time, solving_time, status = warm_monitors, 0, 0, 'Optimal'
+        elif adjacency is not None:
+            monitor_set, total_time, solving_time, status = min_set_decomposition(n, symptoms, endpoints, adjacency,
+                                                                                  solver, goal, timelimit, indy_nodes,
+                                                                                  bicon_comp, prune, lazy, fifo,
+                                                                                  threads, lazy_stats)
+        elif solver == "greedy":
+            monitor_set, total_time, solving_time, status = min_set_greedy(n, symptoms, endpoints, timelimit,
+                                                                           indy_nodes, goal, nodes=nodes)
+        elif solver == "portfolio":
+            monitor_set, total_time, solving_time, status = min_set_portfolio(n, routes_nbr, symptoms, endpoints,
+                                                                              timelimit, indy_nodes, bicon_comp, goal,
+                                                                              constraints, threads=threads,
+                                                                              instance_name=instance_name,
+                                                                              warm_start=warm_monitors
+                                                                              if upper_bound is not None else None,
+                                                                              stats=lazy_stats, trajectory=incumbent,
+                                                                              lower_bound=bound, lazy=lazy)
+        elif solver == "gurobi":
+            monitor_set, total_time, solving_time, status = min_set_gurobi(n, routes_nbr, symptoms, endpoints,
+                                                                           timelimit, indy_nodes, bicon_comp, goal,
+                                                                           constraints, lazy, lazy_stats,
+                                                                           warm_monitors, threads or 1, incumbent,
+                                                                           bound, memory)
+        elif solver == "nuwls-c" and lazy and goal == "1id":
+            monitor_set, total_time, solving_time, status = solve_maxsat_lazy(n, symptoms, endpoints, indy_nodes,
+                                                                              bicon_comp, instance_name=instance_name,
+                                                                              constraints=constraints,
+                                                                              timelimit=timelimit, stats=lazy_stats,
+                                                                              upper_bound=upper_bound, memory=memory)
+        elif solver == "nuwls-c" and fifo:
+            monitor_set, total_time, solving_time, status = solve_maxsat_streaming(n, symptoms, endpoints, goal,
+                                                                                   indy_nodes, bicon_comp,
+                                                                                   instance_name=instance_name,
+                                                                                   constraints=constraints,
+                                                                                   timelimit=timelimit,
+                                                                                   upper_bound=upper_bound,
+                                                                                   incumbent=incumbent, memory=memory)
+        elif solver == "nuwls-c" and model is not None and model.path is not None and constraints is model.constraints \
+                and upper_bound is None:
+            # the clauses of the cached model are read directly, without writing them again
+            monitor_set, total_time, solving_time, status = solve_maxsat(goal, instance_name=instance_name,
+                                                                         timelimit=timelimit, nodes_nbr=n,
+                                                                         clause_path=cached_wcnf(model),
+                                                                         incumbent=incumbent, memory=memory,
+                                                                         keep_clauses=True)
+        elif solver == "nuwls-c":
+            clause_path = write_clauses_monitor_problem(n, symptoms, endpoints, goal, indy_nodes, bicon_comp,
+                                                        instance_name=instance_name, constraints=constraints,
+                                                        upper_bound=upper_bound)
+            monitor_set, total_time, solving_time, status = solve_maxsat(goal, instance_name=instance_name,
+                                                                         timelimit=timelimit, nodes_nbr=n,
+                                                                         clause_path=clause_path, incumbent=incumbent,
+                                                                         memory=memory)
+        else:  # ortools
+            monitor_set, total_time, solving_time, status = min_set_ortools(n, routes_nbr, symptoms, endpoints,
+                                                                            timelimit, indy_nodes, bicon_comp, goal,
+                                                                            constraints, lazy, lazy_stats,
+                                                                            warm_monitors, upper_bound, threads or 1,
+                                                                            incumbent, bound, memory)
+
+    # the warm start (greedy heuristic or verification of the given solution) is part of the solving process
+    total_time += warm_time
+    solving_time += warm_time
+    if bound_stats is not None:
+        total_time += bound_stats["time"]
+
+    # no solution has been found
+    if monitor_set is None:
+        monitor_set = []
+
+    # the solver did not improve the warm start
+    if upper_bound is not None and (not monitor_set or len(monitor_set) > upper_bound):
+        monitor_set = warm_monitors
+
+    if candidates is not None:
+        # the nodes that are not candidates are the endpoints of no route, they are never needed
+        candidates = set(candidates)
+        monitor_set = [node for node in monitor_set if node in candidates]
+
+    improvement = None
+    if improve and monitor_set and not is_optimal(status) and solver != "greedy":
+        # a solver stopped by its timelimit often returns monitors that can be removed, the greedy heuristic already
+        # removes its redundant monitors
+        with phase("improve"):
+            monitor_set, improvement = improve_monitors(symptoms, endpoints, monitor_set, goal, indy_nodes or (),
+                                                        min(IMPROVE_TIMELIMIT, timelimit), nodes)
+        total_time += improvement["time"]
+
+    # compute the set of measurement paths from the set of monitor
+    with phase("verify"):
+        path_set = measurement_paths(endpoints, monitor_set)
+        coverage = verify_cover(n, symptoms, path_set, nodes)
+        identifiability = verify_1id(n, symptoms, path_set, nodes)
+    valid = identifiability if goal == "1id" else coverage
+    if monitor_set and not valid:
+        # e.g. a solution of a relaxed model, whatever the solver reported it is not a solution of the problem
+        status = 'Invalid'
+    if incumbent is not None and monitor_set and valid:
+        # the backends without callbacks (greedy, decomposition, lazy re-solves) only give their final solution
+        incumbent.report(monitor_set, solver)
+    gap = None
+    if bound is not None and monitor_set and valid:
+        gap = len(monitor_set) - bound
+        if gap == 0:
+            status = 'Optimal'
+
+    return {
+        "solver": solver,
+        "goal": goal,
+        "nodes": n,
+        "routes": routes_nbr,
+        "monitors": sorted(monitor_set),
+        "monitors_nbr": len(monitor_set),
+        "solving_time": solving_time,
+        "total_time": total_time,
+        "status": status,
+        # Verification of solutions
+        "coverage": coverage,
+        "1id": identifiability,
+        "cuts": lazy_stats.get("cuts"),
+        "warm_start": upper_bound,
+        "portfolio": lazy_stats.get("portfolio"),
+        "decomposition": lazy_stats.get("decomposition"),
+        "reduction": reduction_stats,
+        "pruning": pruning_stats,
+        "lower_bound": bound,
+        "gap": gap,
+        "bounds": bound_stats,
+        "plan": plan,
+        "improvement": improvement,
+        "scope": scope_stats,
+    }
+
+
+def csv_line(result, profile=None):
+    """
+    :param result: a dictionary returned by solve_instance
+    :param profile: if True, the measures of each phase follow the statistics (see profiling.profile_fields), empty if
+                    the run was not profiled. By default, they are only written for the profiled runs
+    :return: the statistics of the resolution, in csv format
+    """
+    if profile is None:
+        profile = result.get("profile") is not None
+    values = [result[key] for key in CSV_FIELDS]
+    if profile:
+        values += profile_values(result.get("profile"))
+    return ";".join(str(value) for value in values)
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
-    parser.add_argument('-i', '--input', help="instance file", required=True)
+    parser.add_argument('-i', '--input', help="instance file, or <archive>.tar.gz:<member> to read it from an archive",
+                        required=True)
     parser.add_argument('-s', '--solver', help="choice of model",
-                        choices=["gurobi", "ortools", "nuwls-c"], required=True)
+                        choices=["gurobi", "ortools", "nuwls-c", "greedy", "portfolio"], required=True)
     parser.add_argument('-g', '--goal', help="goal of model",
                         choices=["cover", "1id"], required=True)
-    parser.add_argument('-r', '--reductions', help="use problem reductions", required=False,
+    parser.add_argument('-r', '--reductions', help="use problem reductions (computed if there is no .rdc file next to "
+                                                   "the instance)", required=False,
+                        action='store_true')
+    parser.add_argument('-p', '--prune', help="remove duplicated and subsumed constraints before building the model",
+                        required=False, action='store_true')
+    parser.add_argument('--lazy', help="add the 1-identifiability constraints only when a solution violates them",
+                        required=False, action='store_true')
+    parser.add_argument('--fifo', help="feed the clauses to nuwls-c through a FIFO instead of a temporary file",
+                        required=False, action='store_true')
+    parser.add_argument('--no-cache', help="always parse the instance, do not use the binary instance cache",
+                        required=False, action='store_true')
+    parser.add_argument('--warm-start', help="start from the solution stored in the given file (see --solution), or "
+                                             "from the greedy heuristic if no file is given", required=False,
+                        nargs='?', const="greedy")
+    parser.add_argument('--threads', help="number of threads of gurobi and ortools (1 by default), or of the whole "
+                                          "portfolio (all the cores by default)", required=False, type=int)
+    parser.add_argument('--decompose', help="solve the blocks (biconnected components) of the network separately, "
+                                            "using the .edges file next to the instance", required=False,
+                        action='store_true')
+    parser.add_argument('--bounds', help="compute a lower bound on the number of monitors first, the search stops "
+                                         "as soon as a solution reaches it", required=False, action='store_true')
+    parser.add_argument('--target', help="stop as soon as a solution with at most this number of monitors is found",
+                        required=False, type=int)
+    parser.add_argument('--stagnation', help="stop when no better solution is found for this number of seconds",
+                        required=False, type=float)
+    parser.add_argument('--trajectory', help="file to store the improving solutions and the time to find them (csv)",
+                        required=False)
+    parser.add_argument('--memory', help="memory budget in MB, the constraints are pruned or added lazily if the "
+                                         "model does not fit in it", required=False, type=int)
+    parser.add_argument('--model-cache', help="reuse the pruned model built by a previous run on the same instance, "
+                                              "goal and reductions", required=False, action='store_true')
+    parser.add_argument('--no-improve', help="do not remove the redundant monitors of the solutions that are not "
+                                             "proven optimal", required=False, action='store_true')
+    parser.add_argument('--identify', help="nodes to identify, the other nodes need not be covered nor distinguished "
+                                           "(a file containing the nodes, as written by --solution, or a comma "
+                                           "separated list)", required=False, type=read_nodes)
+    parser.add_argument('--candidates', help="candidate monitors, the other nodes are never monitors (a file "
+                                             "containing the nodes, or a comma separated list)", required=False,
+                        type=read_nodes)
+    parser.add_argument('--profile', help="measure the time of each phase, the peak RSS and the size of the model "
+                                          "(appended to the csv output)", required=False, action='store_true')
+    parser.add_argument('--profile-memory', help="also measure the peak Python allocations of each phase, the phases "
+                                                 "run several times slower (implies --profile)", required=False,
                         action='store_true')
+    parser.add_argument('--profile-dump', help="file to save the cProfile statistics of the construction of the model "
+                                               "(implies --profile)", required=False)
     parser.add_argument('-c', '--csv', help="set the output in csv format", required=False, action='store_true')
     parser.add_argument( '--solution', help="file to save the solution", required=False)
     parser.add_argument('-t', '--timelimit',
@@ -269,65 +825,91 @@ if __name__ == "__main__":
     else:
         timeout = DEFAULT_TIMEOUT
 
-    n, routes_list = parse_instance(args.input)
+    trajectory = None
+    if args.target is not None or args.stagnation is not None or args.trajectory:
+        trajectory = Trajectory(args.target, args.stagnation)
 
-    routes_nbr = len(routes_list)
-    symptoms = compute_symptoms(n, routes_list)
-    endpoints = [(route.start, route.end) for route in routes_list]
-
-    del routes_list
-    gc.collect()
-
-    indy_nodes = None
-    bicon_comp = None
-    if args.reductions:
-        # loads reductions
-        reductions_file = args.input.replace('.routes', '.rdc')
-        indy_nodes, bicon_comp = read_reductions(reductions_file)
-
-    if args.solver == "gurobi":
-        monitor_set, total_time, solving_time, status = min_set_gurobi(n, routes_nbr, symptoms,
-                                                                                         endpoints,
-                                                                                         timeout, indy_nodes,
-                                                                                         bicon_comp, args.goal)
-    elif args.solver == "nuwls-c":
-        write_clauses_monitor_problem(n, symptoms, endpoints, args.goal, indy_nodes, bicon_comp,
-                                       instance_name=Path(args.input).stem)
-        monitor_set, total_time, solving_time, status = solve_maxsat(args.goal,
-                                                                     instance_name=Path(args.input).stem,
-                                                                     timelimit=timeout,
-                                                                     nodes_nbr=n)
-    else:  # ortools
-        monitor_set, total_time, solving_time, status = min_set_ortools(n, routes_nbr, symptoms, endpoints,
-                                                                        timeout, indy_nodes, bicon_comp, args.goal)
-
-    # compute the set of measurement paths from the set of monitor
-    path_set = set()
-    for index, (src, dest) in enumerate(endpoints):
-        if src in monitor_set and dest in monitor_set:
-            path_set.add(index)
+    result = solve_instance(args.input, args.solver, args.goal, args.reductions, args.prune, args.lazy, args.fifo,
+                            not args.no_cache, timeout, args.warm_start, args.threads, args.decompose, trajectory,
+                            args.bounds, args.memory, args.model_cache, not args.no_improve, args.identify,
+                            args.candidates, args.profile, args.profile_dump, args.profile_memory)
 
-    # Verification of solutions
-    is_covered = verify_cover(n, symptoms, path_set)
-    is_one_id = verify_1id(n, symptoms, path_set)
+    # Register the improving solutions
+    if args.trajectory:
+        with open(args.trajectory, 'w') as file:
+            file.write("time;monitors_nbr;solver\n")
+            for elapsed, size, backend in trajectory.curve():
+                file.write(f"{elapsed};{size};{backend}\n")
 
     # Register the solution
     if args.solution:
         solution_string = ""
-        for monitor in monitor_set:
+        for monitor in result["monitors"]:
             solution_string += f"{monitor} "
         file = open(args.solution, 'w')
         file.write(solution_string)
         file.close()
 
     if args.csv:
-        print(
-            f"{args.input};{args.model};{args.goal};{args.reductions};{len(monitor_set)};{solving_time};{total_time};"
-            f"{status};{is_covered};{is_one_id}")
+        print(csv_line(result))
     else:
-        print(f"Status : {status}\n"
-              f"Number of monitors : {len(monitor_set)}\n"
-              f"Solving Time (s) : {solving_time}\n"
-              f"Total Time (s) : {total_time}\n"
-              f"Coverage : {is_covered}\n"
-              f"1id : {is_one_id}")
+        print(f"Status : {result['status']}\n"
+              f"Number of monitors : {result['monitors_nbr']}\n"
+              f"Solving Time (s) : {result['solving_time']}\n"
+              f"Total Time (s) : {result['total_time']}\n"
+              f"Coverage : {result['coverage']}\n"
+              f"1id : {result['1id']}")
+        if result["warm_start"] is not None:
+            print(f"Warm start : {result['warm_start']}")
+        if result["portfolio"] is not None:
+            print(f"Best solution found by : {result['portfolio']}")
+        if trajectory is not None and trajectory.points:
+            print(f"Improving solutions : {len(trajectory.points)} "
+                  f"(best after {trajectory.time_to_target(result['monitors_nbr']):.2f}s)")
+        reduction_stats = result["reduction"]
+        if reduction_stats is not None:
+            print(f"Reductions ({reduction_stats['source']}) : {reduction_stats['independent']} independent nodes, "
+                  f"{reduction_stats['forced']} forced monitors, {reduction_stats['components']} components")
+        decomposition_stats = result["decomposition"]
+        if decomposition_stats is not None:
+            if decomposition_stats["subproblems"]:
+                print(f"Subproblems : {decomposition_stats['subproblems']} "
+                      f"(largest : {decomposition_stats['largest']} nodes)\n"
+                      f"Lower bound : {decomposition_stats['lower_bound']}")
+            else:
+                print(f"Not decomposed : {decomposition_stats['reason']}")
+        if result["lower_bound"] is not None:
+            print(f"Certified lower bound : {result['lower_bound']} (gap : {result['gap']}, "
+                  f"{result['bounds']['time']:.2f}s)")
+        plan = result["plan"]
+        if plan is not None:
+            estimates = ", ".join(f"{strategy} {estimate:.0f}MB" for strategy, estimate in plan["estimates"].items())
+            print(f"Model : {plan['strategy'] or 'none'} (budget {plan['budget']}MB, estimates : {estimates})")
+        improvement = result["improvement"]
+        if improvement is not None:
+            print(f"Local search : {improvement['saved']} monitors saved ({improvement['swaps']} swaps, "
+                  f"{improvement['time']:.2f}s)")
+        scope_stats = result["scope"]
+        if scope_stats is not None:
+            print(f"Scope : {scope_stats['identify']} nodes to identify, {scope_stats['candidates']} candidates, "
+                  f"{scope_stats['removed_routes']} routes removed, {scope_stats['kept_constraints']} constraints")
+        profile = result["profile"]
+        if profile is not None:
+            for name, stats in profile["phases"].items():
+                print(f"Phase {name} : {stats['wall']:.3f}s wall, {stats['cpu']:.3f}s CPU" +
+                      (f", peak {stats['peak_mb']:.1f}MB" if "peak_mb" in stats else ""))
+            print(f"Peak RSS of the run : {profile['peak_rss_mb']:.0f}MB")
+            if profile["model"]:
+                print("Model size : " + ", ".join(f"{field} {value}" for field, value in profile["model"].items()))
+        if result["cuts"] is not None:
+            print(f"Lazy cuts : {result['cuts']}")
+        if result["model_cache"] is not None:
+            print(f"Model cache : {'hit' if result['model_cache'] else 'built and stored'}")
+        pruning_stats = result["pruning"]
+        if pruning_stats is not None:
+            print(f"Removed constraints : {pruning_stats['removed_constraints']} / {pruning_stats['constraints']}\n"
+                  f"Removed nonzeros : {pruning_stats['removed_nonzeros']} / {pruning_stats['nonzeros']}")
+            if pruning_stats["uncoverable_nodes"]:
+                print(f"Uncoverable nodes : {pruning_stats['uncoverable_nodes']}")
+            if pruning_stats["identical_pairs"]:
+                print(f"Nodes with identical symptoms : {pruning_stats['identical_pairs']}")
@@ -0,0 +1,23 @@
+from ortools.sat.python import cp_model
+
+
+class IncumbentCallback(cp_model.CpSolverSolutionCallback):
+    """
+    class sharing the solutions and bounds found by CP-SAT with the other solvers of a portfolio
+    """
+
+    def __init__(self, x, incumbent):
+        """
+        create an IncumbentCallback object
+        :param x: the monitor variables
+        :param incumbent: a portfolio.SharedIncumbent
+        """
+        cp_model.CpSolverSolutionCallback.__init__(self)
+        self.x = x
+        self.incumbent = incumbent
+
+    def on_solution_callback(self):
+        self.incumbent.report([index for index, i in enumerate(self.x) if self.Value(i)], "ortools")
+        self.incumbent.report_bound(self.BestObjectiveBound())
+        if self.incumbent.closed():
+            self.StopSearch()
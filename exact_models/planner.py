@@ -0,0 +1,188 @@
+from collections import Counter
+
+from pruning import PrunedConstraints, prune_constraints
+from symptoms import iter_bits, mask_from_indices, popcount
+
+# memory used by each backend, in bytes per nonzero of the constraints (linking constraints included) and per row
+# (constraint or variable). Fitted on the peak RSS of the zoo and rocketfuel instances (Colt, Esnet, rf3257), so that
+# the estimates are above the measures, up to twice as large on the largest models
+BYTES_PER_NONZERO = {"gurobi": 30, "ortools": 60, "nuwls-c": 48}
+BYTES_PER_ROW = {"gurobi": 400, "ortools": 3000, "nuwls-c": 0}
+# NuWLS-c stores the neighbours of each variable (the variables sharing a clause with it) as integers : their number
+# is bounded by the sum of the squared lengths of the clauses and by the square of the number of variables
+BYTES_PER_NEIGHBOUR = 4
+# memory used by the Python process whatever the backend (interpreter, solver modules), in MB
+BASE_MEMORY = 100
+# share of the pair constraints expected to be added as lazy cuts
+LAZY_SHARE = 0.05
+# solvers that add the lazy 1-identifiability constraints themselves (the portfolio passes them on to its solvers)
+LAZY_SOLVERS = ("gurobi", "ortools", "nuwls-c", "portfolio")
+
+
+def route_lengths(symptoms):
+    """
+    :param symptoms: a SymptomMatrix
+    :return: a list of m integers, the number of nodes crossed by each route
+    """
+    lengths = [0] * symptoms.m
+    for row in symptoms.rows:
+        for route in iter_bits(row):
+            lengths[route] += 1
+    return lengths
+
+
+def _digits(value):
+    return len(str(value))
+
+
+def _digit_classes(n, m):
+    """
+    Split the route variables of the wcnf model (route j is the variable n+1+j) by their number of digits
+    :return: a list of tuples (number of digits, bitset of the routes whose variable has this number of digits)
+    """
+    classes = []
+    first = 0
+    while first < m:
+        digits = _digits(n + 1 + first)
+        last = min(m, 10 ** digits - n - 1)
+        classes.append((digits, mask_from_indices(range(first, last), m)))
+        first = last
+    return classes
+
+
+def _clause_bytes(literals, literal_bytes):
+    """
+    :return: the size of the wcnf line "h <literals> 0" (see max_sat.WcnfWriter.hard_routes)
+    """
+    return 5 + literal_bytes + max(literals - 1, 0)
+
+
+def estimate_model(n, symptoms, endpoints, goal, constraints=None, lazy=False, independant_nodes=None,
+                   biconnected_components=None):
+    """
+    Predict the size of the models built for an instance without building them. The sizes of the pair constraints
+    are derived from the length of the routes : the route j crossing c_j nodes belongs to the constraints of the
+    c_j * (n - c_j) pairs it splits, so that the pair constraints never need to be enumerated
+    :param n: number of nodes
+    :param symptoms: a SymptomMatrix, symptoms[i] contains the indexes of the routes that cross node i
+    :param endpoints: a list of tuples : endpoints[j] contains the starting and ending nodes of route j
+    :param goal: "cover" or "1id"
+    :param constraints: a list of bitsets over the routes (see pruning.prune_constraints), if given they replace the
+                        cover and 1-identifiability constraints
+    :param lazy: if True, the 1-identifiability constraints are expected to be added as cuts (see LAZY_SHARE)
+    :param independant_nodes: the independent nodes
+    :param biconnected_components: the biconnected components containing exactly one articulation point
+    :return: a dictionary containing the number of variables, of constraints and of nonzeros, the size of the wcnf
+            file in bytes, and the memory needed by each backend in MB
+    """
+    m = len(endpoints)
+    classes = _digit_classes(n, m)
+    # in lazy mode, the given constraints are the pruned cover constraints
+    pairs = goal == "1id" and (constraints is None or lazy)
+
+    count = nonzeros = wcnf = squares = 0
+    for mask in constraints if constraints is not None else symptoms.rows:
+        literals = popcount(mask)
+        count += 1
+        nonzeros += literals
+        squares += literals * literals
+        wcnf += _clause_bytes(literals, sum(digits * popcount(mask & routes) for digits, routes in classes))
+    # the pruned constraints only store their nodes, the constraints read from the model cache are bitsets of m bits
+    if constraints is None:
+        bitsets = 0
+    elif isinstance(constraints, PrunedConstraints):
+        bitsets = constraints.nbytes()
+    else:
+        bitsets = len(constraints) * (28 + m // 8)
+    if pairs:
+        lengths = route_lengths(symptoms)
+        pair_count = n * (n - 1) // 2
+        # pairs of nodes with the same symptom have an empty constraint
+        identical = sum(size * (size - 1) // 2 for size in Counter(symptoms.rows).values())
+        pair_nonzeros = sum(length * (n - length) for length in lengths)
+        literal_bytes = sum(length * (n - length) * _digits(n + 1 + route) for route, length in enumerate(lengths))
+        share = LAZY_SHARE if lazy else 1
+        count += int(share * pair_count)
+        nonzeros += int(share * pair_nonzeros)
+        # the lengths of the pair constraints are unknown, only their mean is
+        squares += int(share * pair_nonzeros * pair_nonzeros / max(pair_count, 1))
+        wcnf += int(share * (5 * pair_count + literal_bytes + pair_nonzeros - pair_count + identical))
+
+    # soft clauses of the monitors, linking constraints between the routes and their endpoints
+    wcnf += sum(6 + _digits(node + 1) for node in range(n))
+    for route, (src, dest) in enumerate(endpoints):
+        wcnf += 23 + 3 * _digits(n + 1 + route) + 2 * _digits(src + 1) + 2 * _digits(dest + 1)
+    count += 3 * m
+    nonzeros += 7 * m
+    squares += 17 * m
+    for node in independant_nodes or []:
+        count += 1
+        nonzeros += 1
+        wcnf += 5 + _digits(node + 1)
+    for component in biconnected_components or []:
+        count += 1
+        nonzeros += len(component)
+        squares += len(component) ** 2
+        wcnf += _clause_bytes(len(component), sum(_digits(node + 1) for node in component))
+
+    variables = n + m
+    memory = {backend: BASE_MEMORY + (bitsets + BYTES_PER_NONZERO[backend] * nonzeros +
+                                      BYTES_PER_ROW[backend] * (count + variables)) / 1e6
+              for backend in BYTES_PER_NONZERO}
+    memory["nuwls-c"] += BYTES_PER_NEIGHBOUR * min(squares, variables * variables) / 1e6
+    memory["portfolio"] = sum(memory.values())
+    return {"variables": variables, "constraints": count, "nonzeros": nonzeros, "wcnf_bytes": wcnf, "memory": memory}
+
+
+def plan_model(n, symptoms, endpoints, goal, solver, memory, prune=False, lazy=False, independant_nodes=None,
+               biconnected_components=None, constraints=None, pruning_stats=None, relax=True):
+    """
+    Choose how to build the model of an instance so that it fits in the memory budget. The model asked for is
+    estimated first, then the cheaper (and still exact) models are tried in turn : the pruned constraints, then the
+    1-identifiability constraints added lazily (only for the LAZY_SOLVERS). The pruned constraints are computed only if
+    the model asked for does not fit
+    :param n: number of nodes
+    :param symptoms: a SymptomMatrix, symptoms[i] contains the indexes of the routes that cross node i
+    :param endpoints: a list of tuples : endpoints[j] contains the starting and ending nodes of route j
+    :param goal: "cover" or "1id"
+    :param solver: "gurobi", "ortools", "nuwls-c" or "portfolio"
+    :param memory: the memory budget, in MB
+    :param prune: if True, the pruned constraints are asked for
+    :param lazy: if True, the lazy 1-identifiability constraints are asked for
+    :param independant_nodes: the independent nodes
+    :param biconnected_components: the biconnected components containing exactly one articulation point
+    :param constraints: the pruned constraints if they are already known (e.g. read from the model cache)
+    :param pruning_stats: the statistics of the pruning of the given constraints
+    :param relax: if False, only the model asked for is estimated (e.g. the constraints of scope.scope_problem, which
+                only bear on some nodes and cannot be replaced)
+    :return: a dictionary describing the plan (the strategy, None if no model fits, whether the constraints are pruned
+            and lazy, the budget and the estimates of the models tried), the pruned constraints (None if they are not
+            used) and the statistics of the pruning (see pruning.prune_constraints)
+    """
+    lazy = lazy and goal == "1id" and solver in LAZY_SOLVERS
+    plan = {"strategy": None, "prune": prune, "lazy": lazy, "budget": memory, "estimates": {}}
+    while True:
+        strategy = "lazy" if lazy else "pruned" if prune else "full"
+        if prune and constraints is None:
+            constraints, pruning_stats = prune_constraints(symptoms, "cover" if lazy else goal)
+            if pruning_stats["infeasible"]:
+                # the resolution stops before building any model
+                plan.update(strategy=strategy, prune=prune, lazy=lazy)
+                break
+        estimate = estimate_model(n, symptoms, endpoints, goal, constraints, lazy, independant_nodes,
+                                  biconnected_components)
+        plan["estimates"][strategy] = estimate["memory"][solver]
+        if estimate["memory"][solver] <= memory:
+            plan.update(strategy=strategy, prune=prune, lazy=lazy)
+            break
+        if not relax:
+            break
+        if not prune:
+            prune = True
+        elif not lazy and goal == "1id" and solver in LAZY_SOLVERS:
+            # the pruned 1-identifiability constraints are replaced by the pruned cover constraints
+            lazy = True
+            constraints = None
+        else:
+            break
+    return plan, constraints, pruning_stats
@@ -0,0 +1,294 @@
+import glob
+import multiprocessing
+import os
+import signal
+import threading
+from math import ceil
+from multiprocessing.connection import wait
+from time import sleep, time
+
+from greedy import min_set_greedy
+from max_sat import solve_maxsat, solve_maxsat_lazy, tmp_path, write_clauses_monitor_problem
+
+# solvers run by the portfolio, the greedy heuristic is run first to give an incumbent to the others
+BACKENDS = ("gurobi", "ortools", "nuwls-c")
+# seconds between two checks of the shared incumbent
+POLL_INTERVAL = 0.1
+# seconds given to the solvers to stop before they are killed (runsolver needs 3s to stop NuWLS-c)
+KILL_DELAY = 5
+# value of cp_model.OPTIMAL, compared without importing OR-Tools
+CPSAT_OPTIMAL = 4
+
+
+class SharedIncumbent:
+    """
+    class storing the best solution and the best lower bound found by the solvers of a portfolio, shared between
+    processes
+    """
+
+    def __init__(self, n, context=multiprocessing):
+        """
+        create a SharedIncumbent object
+        :param n: the number of nodes
+        :param context: the multiprocessing context used to create the solvers processes
+        """
+        self.lock = context.Lock()
+        self.size = context.Value('i', n + 1, lock=False)
+        self.lower_bound = context.Value('i', 0, lock=False)
+        self.monitors = context.Array('b', n, lock=False)
+        self.owner = context.Value('i', -1, lock=False)
+
+    def report(self, monitors, backend):
+        """
+        Store a solution if it is better than the current one
+        :param monitors: a feasible set of monitors
+        :param backend: the name of the solver that found it
+        :return: True if the solution has been stored
+        """
+        monitors = set(monitors)
+        with self.lock:
+            if len(monitors) >= self.size.value:
+                return False
+            for node in range(len(self.monitors)):
+                self.monitors[node] = node in monitors
+            self.size.value = len(monitors)
+            self.owner.value = (BACKENDS + ("greedy",)).index(backend)
+            return True
+
+    def report_bound(self, bound):
+        """
+        Store a lower bound on the number of monitors if it is better than the current one
+        :param bound: a lower bound (the objective bound of a solver)
+        """
+        bound = ceil(bound - 1e-6)
+        with self.lock:
+            if bound > self.lower_bound.value:
+                self.lower_bound.value = bound
+
+    def best_size(self):
+        return self.size.value
+
+    def best(self):
+        """
+        :return: the size of the best solution and the list of its monitors
+        """
+        with self.lock:
+            return self.size.value, [node for node, monitor in enumerate(self.monitors) if monitor]
+
+    def best_owner(self):
+        return (BACKENDS + ("greedy",))[self.owner.value] if self.owner.value >= 0 else None
+
+    def closed(self):
+        """
+        :return: True if the best solution is proven optimal by the best lower bound
+        """
+        return self.lower_bound.value >= self.size.value
+
+
+def is_optimal(status):
+    """
+    :param status: the status returned by one of the solvers
+    :return: True if the status means that the solution is proven optimal
+    """
+    return status in ('Optimal', 'OPTIMUM FOUND') or status == CPSAT_OPTIMAL
+
+
+def _run_backend(backend, problem, threads, incumbent, connection):
+    """
+    Entry point of the solvers processes
+    """
+    # the solver and its children (e.g. runsolver) can be killed at once
+    os.setpgrp()
+    from monitor_placement import min_set_gurobi, min_set_ortools
+
+    (n, number_route, symptoms, endpoints, timelimit, independant_nodes, biconnected_components, goal,
+     constraints, lazy, clause_path) = problem
+    size, warm_start = incumbent.best()
+    if size > n:
+        warm_start = None
+
+    if backend == "gurobi":
+        result = min_set_gurobi(n, number_route, symptoms, endpoints, timelimit, independant_nodes,
+                                biconnected_components, goal, constraints, lazy, warm_start=warm_start,
+                                threads=threads, incumbent=incumbent)
+    elif backend == "ortools":
+        result = min_set_ortools(n, number_route, symptoms, endpoints, timelimit, independant_nodes,
+                                 biconnected_components, goal, constraints, lazy, warm_start=warm_start,
+                                 upper_bound=len(warm_start) if warm_start else None, threads=threads,
+                                 incumbent=incumbent)
+    elif lazy and goal == "1id":
+        # the clause files of the iterations are named after the clause file of the portfolio
+        result = solve_maxsat_lazy(n, symptoms, endpoints, independant_nodes, biconnected_components,
+                                   os.path.basename(clause_path), constraints, timelimit,
+                                   upper_bound=len(warm_start) if warm_start else None)
+    else:
+        write_clauses_monitor_problem(n, symptoms, endpoints, goal, independant_nodes, biconnected_components,
+                                      constraints=constraints, clause_path=clause_path,
+                                      upper_bound=len(warm_start) if warm_start else None)
+        result = solve_maxsat(goal, os.path.basename(clause_path), timelimit, n, clause_path, incumbent)
+    connection.send(result)
+    connection.close()
+
+
+def _group_alive(pgid):
+    try:
+        os.killpg(pgid, 0)
+        return True
+    except (ProcessLookupError, PermissionError):
+        return False
+
+
+def _running(process):
+    # is_alive reaps the leader once it has exited : an unreaped (zombie) leader keeps its group visible to killpg
+    return process.is_alive() or _group_alive(process.pid)
+
+
+def stop_processes(processes):
+    """
+    Stop the solvers processes and their children : runsolver stops NuWLS-c on SIGTERM, the process groups still
+    alive after KILL_DELAY seconds are killed
+    :param processes: a list of processes started by _run_backend (each one leads its own process group)
+    """
+    for process in processes:
+        if _group_alive(process.pid):
+            os.killpg(process.pid, signal.SIGTERM)
+    deadline = time() + KILL_DELAY
+    while time() < deadline and any(_running(process) for process in processes):
+        sleep(POLL_INTERVAL)
+    for process in processes:
+        if _group_alive(process.pid):
+            os.killpg(process.pid, signal.SIGKILL)
+        process.join()
+
+
+def start_method():
+    """
+    :return: the start method of the solvers processes : fork if no other thread runs (the solvers start right away
+            from the loaded modules and instance), forking a process with several threads is unsafe (e.g. when the
+            portfolio runs in the thread of anytime.iter_solutions or of the solve service), forkserver or spawn
+            are used instead
+    """
+    methods = multiprocessing.get_all_start_methods()
+    if "fork" in methods and threading.active_count() == 1:
+        return "fork"
+    return "forkserver" if "forkserver" in methods else "spawn"
+
+
+def split_threads(backends, threads):
+    """
+    Share the threads between the solvers : NuWLS-c is sequential, CP-SAT gets half of the remaining threads (it
+    benefits the most from parallel workers) and Gurobi the rest
+    :return: a dictionary mapping each backend to its number of threads
+    """
+    shares = {}
+    remaining = threads
+    if "nuwls-c" in backends:
+        shares["nuwls-c"] = 1
+        remaining -= 1
+    if "ortools" in backends:
+        shares["ortools"] = max(1, remaining // 2 if "gurobi" in backends else remaining)
+        remaining -= shares["ortools"]
+    if "gurobi" in backends:
+        shares["gurobi"] = max(1, remaining)
+    return shares
+
+
+def min_set_portfolio(n, number_route, symptoms, endpoints, timelimit, independant_nodes=None,
+                      biconnected_components=None, goal="cover", constraints=None, backends=BACKENDS,
+                      threads=None, instance_name="clause", warm_start=None, stats=None, trajectory=None,
+                      lower_bound=None, lazy=False):
+    """
+    Run several solvers at once, each one in its own process. The solutions and lower bounds they find are shared
+    through a SharedIncumbent : Gurobi receives the better solutions found by the others, all of them start from the
+    solution of the greedy heuristic (hints and upper bound). Every solver is stopped as soon as one of them proves
+    optimality or the best lower bound meets the best solution
+    :param n: number of nodes
+    :param number_route: number of routes
+    :param symptoms: a SymptomMatrix, symptoms[i] contains the indexes of the routes that cross node i
+    :param endpoints: a list of tuples : endpoints[j] contains the starting and ending nodes of route j
+    :param timelimit : the timelimit for the resolution, in seconds
+    :param independant_nodes: a set of integer, it contains the independent nodes
+    :param biconnected_components: a 2D list, containing each biconnected components
+                                that contains exactly one articulation point, this articulation point is not present in the lists
+    :param goal: "cover" or "1id", indicates the goal
+    :param constraints: a list of bitsets over the routes (see pruning.prune_constraints), if given they replace
+                        the cover and 1-identifiability constraints
+    :param backends: the solvers to run, among BACKENDS
+    :param threads: the total number of threads (all the cores by default)
+    :param instance_name: name of the instance, used to name the clause file of NuWLS-c
+    :param warm_start: a feasible set of monitors, used instead of the greedy solution
+    :param stats: a dictionary, if given the solver that found the best solution is stored in it
+    :param trajectory: an anytime.Trajectory, if given the improving solutions of the portfolio are reported to it
+                    and the solvers are stopped when it is closed
+    :param lower_bound: a lower bound on the number of monitors (see bounds.lower_bound), the solvers are stopped as
+                    soon as a solution reaches it
+    :param lazy: if True and goal is "1id", constraints only holds the cover constraints : every solver adds the
+                violated 1-identifiability constraints itself (lazy constraints of Gurobi, re-solves of OR-Tools and
+                NuWLS-c), only 1-identifiable solutions are shared
+    :return: a list containing index of monitors in the graph, the total runtime in seconds, the solving time in seconds,
+            the status ('Optimal' if optimality is proven, 'Timeout' otherwise)
+    """
+    start_timer = time()
+    context = multiprocessing.get_context(start_method())
+    incumbent = SharedIncumbent(n, context)
+    if lower_bound is not None:
+        incumbent.report_bound(lower_bound)
+    if warm_start is None:
+        warm_start, _, _, greedy_status = min_set_greedy(n, symptoms, endpoints, timelimit, independant_nodes, goal)
+        if greedy_status == 'Feasible':
+            incumbent.report(warm_start, "greedy")
+    else:
+        incumbent.report(warm_start, "greedy")
+
+    shares = split_threads(backends, threads or len(os.sched_getaffinity(0)))
+    # the clause file is owned by the portfolio, so that it is removed even if NuWLS-c is killed
+    clause_path = tmp_path("clauses", instance_name, goal)
+    problem = (n, number_route, symptoms, endpoints, timelimit, independant_nodes, biconnected_components, goal,
+               constraints, lazy, clause_path)
+    running = {}
+    for backend in backends:
+        receiver, sender = context.Pipe(duplex=False)
+        process = context.Process(target=_run_backend, args=(backend, problem, shares[backend], incumbent, sender),
+                                  daemon=True)
+        process.start()
+        sender.close()
+        running[receiver] = (backend, process)
+
+    proven = False
+    reported = n + 1  # size of the last solution reported to the trajectory
+    try:
+        while running and not proven and not incumbent.closed():
+            if trajectory is not None:
+                if incumbent.best_size() < reported:
+                    reported, monitors = incumbent.best()
+                    trajectory.report(monitors, incumbent.best_owner())
+                trajectory.report_bound(incumbent.lower_bound.value)
+                if trajectory.closed():
+                    break
+            for receiver in wait(list(running), timeout=POLL_INTERVAL):
+                backend, process = running.pop(receiver)
+                try:
+                    monitors, _, _, status = receiver.recv()
+                except (EOFError, TypeError):  # the solver crashed (e.g. license or memory error)
+                    continue
+                finally:
+                    process.join()
+                if monitors:
+                    incumbent.report(monitors, backend)
+                    proven = proven or is_optimal(status)
+            if time() - start_timer > timelimit + POLL_INTERVAL:
+                break
+    finally:
+        stop_processes([process for _, process in running.values()])
+        # the clause files of the lazy iterations of NuWLS-c are prefixed by the name of the clause file
+        for path in [clause_path] + glob.glob(f"{glob.escape(clause_path)}_*"):
+            if os.path.isfile(path):
+                os.remove(path)
+
+    size, monitors = incumbent.best()
+    total_time = time() - start_timer
+    if stats is not None:
+        stats["portfolio"] = incumbent.best_owner()
+    if size > n:
+        return [], total_time, total_time, 'Timeout'
+    return monitors, total_time, total_time, 'Optimal' if proven or incumbent.closed() else 'Timeout'
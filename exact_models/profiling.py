@@ -0,0 +1,189 @@
+import cProfile
+import os
+import resource
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from time import perf_counter
+
+# phases of a run, in their order
+PHASES = ("load", "reductions", "model", "warm_start", "bounds", "build", "wcnf", "solve", "improve", "verify")
+# phases recorded by cProfile when a dump file is given : the construction of the solver models
+DUMP_PHASES = ("build", "wcnf")
+# measures of each phase (peak_mb only when the allocations are traced), measures of the whole run, and statistics of
+# the model given to the solver
+PHASE_FIELDS = ("wall", "cpu", "peak_mb")
+RUN_FIELDS = ("peak_rss_mb",)
+MODEL_FIELDS = ("variables", "constraints", "nonzeros", "clause_bytes")
+
+# the profiler recording the current run (see Profiler.__enter__)
+_active = None
+
+
+def _cpu_time():
+    """
+    :return: the CPU time of the process and of its terminated children (e.g. runsolver and NuWLS-c), in seconds
+    """
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+def _rss_mb():
+    """
+    :return: the peak resident set size of the process or of its largest terminated child since they started, in MB
+            (a high-water mark : it cannot be split between the phases)
+    """
+    return max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) / 1000
+
+
+class Profiler:
+    """
+    class recording the wall time and the CPU time of each phase of a run, the peak RSS of the run and the size of the
+    model given to the solver. The measures of a phase exclude the phases nested in it. The phases run by other threads
+    or processes (FIFO writer, portfolio solvers) are counted in the phase that waits for them. The peak memory of each
+    phase, the peak of the Python allocations during the phase, is only measured if the allocations are traced
+    (tracemalloc slows the model construction down several times, the times are then only comparable between traced
+    runs)
+    """
+
+    def __init__(self, trace_memory=False, dump=None):
+        """
+        create a Profiler object
+        :param trace_memory: if True, the Python allocations are traced to measure the peak memory of each phase
+        :param dump: a file receiving the cProfile statistics of the construction of the models (see DUMP_PHASES)
+        """
+        self.trace_memory = trace_memory
+        self.dump = dump
+        self.phases = {}
+        self.model = {}
+        self._profile = cProfile.Profile() if dump is not None else None
+        self._stack = []
+        self._thread = None
+        self._tracing = False
+        self._previous = None
+
+    def __enter__(self):
+        """
+        Make the profiler the one recording the phases and the model statistics (see phase and record_model)
+        """
+        global _active
+        self._previous, _active = _active, self
+        self._thread = threading.get_ident()
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._tracing = True
+        return self
+
+    def __exit__(self, *exc_info):
+        global _active
+        _active = self._previous
+        if self._tracing:
+            tracemalloc.stop()
+            self._tracing = False
+        if self._profile is not None:
+            self._profile.dump_stats(self.dump)
+
+    def _traced_peak(self):
+        return tracemalloc.get_traced_memory()[1] / 1e6 if tracemalloc.is_tracing() else 0
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Record a phase of the run, the phases run again (e.g. the re-solves of the lazy mode) are added up
+        :param name: the name of the phase (see PHASES)
+        """
+        if threading.get_ident() != self._thread:
+            yield
+            return
+        if self._stack:
+            parent = self._stack[-1]
+            parent["peak"] = max(parent["peak"], self._traced_peak())
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        frame = {"peak": 0, "children_wall": 0, "children_cpu": 0}
+        self._stack.append(frame)
+        profiled = self._profile is not None and name in DUMP_PHASES
+        if profiled:
+            self._profile.enable()
+        start_wall, start_cpu = perf_counter(), _cpu_time()
+        try:
+            yield
+        finally:
+            wall, cpu = perf_counter() - start_wall, _cpu_time() - start_cpu
+            if profiled:
+                self._profile.disable()
+            self._stack.pop()
+            frame["peak"] = max(frame["peak"], self._traced_peak())
+            stats = self.phases.setdefault(name, {"wall": 0, "cpu": 0, "calls": 0})
+            stats["wall"] += wall - frame["children_wall"]
+            stats["cpu"] += cpu - frame["children_cpu"]
+            if self.trace_memory:
+                stats["peak_mb"] = max(stats.get("peak_mb", 0), frame["peak"])
+            stats["calls"] += 1
+            if self._stack:
+                parent = self._stack[-1]
+                parent["children_wall"] += wall
+                parent["children_cpu"] += cpu
+                if tracemalloc.is_tracing():
+                    tracemalloc.reset_peak()
+
+    def record_model(self, **stats):
+        """
+        Store the statistics of the model given to the solver (see MODEL_FIELDS), the last model built replaces the
+        previous ones
+        """
+        self.model.update(stats)
+
+    def report(self):
+        """
+        :return: a dictionary containing the measures of each phase run (in the order of PHASES), the peak RSS of the
+                run (see _rss_mb) and the statistics of the model
+        """
+        order = {name: index for index, name in enumerate(PHASES)}
+        phases = {name: dict(self.phases[name]) for name in sorted(self.phases, key=lambda name: order.get(name, 99))}
+        return {"phases": phases, "peak_rss_mb": _rss_mb(), "model": dict(self.model)}
+
+
+@contextmanager
+def phase(name):
+    """
+    Record a phase of the run with the active profiler, nothing is recorded if there is none
+    :param name: the name of the phase (see PHASES)
+    """
+    if _active is None:
+        yield
+    else:
+        with _active.phase(name):
+            yield
+
+
+def record_model(**stats):
+    """
+    Store the statistics of the model given to the solver with the active profiler, if there is one
+    """
+    if _active is not None:
+        _active.record_model(**stats)
+
+
+def profile_fields():
+    """
+    :return: the csv columns of a profile : the measures of each phase, of the whole run, then the statistics of the
+            model
+    """
+    return tuple(f"{name}_{field}" for name in PHASES for field in PHASE_FIELDS) + RUN_FIELDS + MODEL_FIELDS
+
+
+def profile_values(profile):
+    """
+    :param profile: a dictionary returned by Profiler.report, or None
+    :return: the values of the columns of profile_fields (empty for the phases that were not run, and for the peak
+            memory of the phases if the allocations were not traced)
+    """
+    profile = profile or {"phases": {}, "model": {}}
+    values = []
+    for name in PHASES:
+        stats = profile["phases"].get(name, {})
+        values += [round(stats[field], 6) if field in stats else "" for field in PHASE_FIELDS]
+    values += [round(profile[field], 1) if field in profile else "" for field in RUN_FIELDS]
+    return values + [profile["model"].get(field, "") for field in MODEL_FIELDS]
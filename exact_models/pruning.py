@@ -0,0 +1,179 @@
+from array import array
+from collections import defaultdict
+from itertools import chain
+
+import numpy as np
+
+from symptoms import iter_bits, popcount
+
+# size of the folds of the bitsets compared by minimal_masks, in 64-bit words
+FOLD_WORDS = 64
+
+
+class PrunedConstraints:
+    """
+    class representing the constraints kept by prune_constraints. Only the nodes of each constraint are stored (the
+    second node is -1 for a cover constraint) : its bitset is computed again from the symptoms each time it is read, so
+    that the kept constraints take no more memory than the constraints streamed from the symptoms
+    """
+
+    def __init__(self, rows, nodes_a, nodes_b):
+        """
+        create a PrunedConstraints object
+        :param rows: the packed rows of the SymptomMatrix
+        :param nodes_a: an array of the first node of each constraint
+        :param nodes_b: an array of the second node of each constraint, -1 for a cover constraint
+        """
+        self.rows = rows
+        self.nodes_a = nodes_a
+        self.nodes_b = nodes_b
+
+    def __len__(self):
+        return len(self.nodes_a)
+
+    def __iter__(self):
+        rows = self.rows
+        for node_a, node_b in zip(self.nodes_a, self.nodes_b):
+            yield rows[node_a] if node_b < 0 else rows[node_a] ^ rows[node_b]
+
+    def nbytes(self):
+        """
+        :return: the number of bytes used by the nodes of the constraints (the rows belong to the symptoms)
+        """
+        return self.nodes_a.itemsize * len(self.nodes_a) + self.nodes_b.itemsize * len(self.nodes_b)
+
+
+def identical_symptoms(symptoms):
+    """
+    Find the pairs of nodes that can never be distinguished, i.e. nodes crossed by exactly the same routes
+    :param symptoms: a SymptomMatrix
+    :return: a list of tuples (node_a, node_b) with node_a < node_b
+    """
+    groups = defaultdict(list)
+    for node, row in enumerate(symptoms.rows):
+        groups[row].append(node)
+
+    pairs = []
+    for nodes in groups.values():
+        for index, node_a in enumerate(nodes):
+            for node_b in nodes[index + 1:]:
+                pairs.append((node_a, node_b))
+    return pairs
+
+
+def _fold(mask, words):
+    """
+    :return: the bitset folded onto FOLD_WORDS words by OR : if a bitset is a subset of another one, so is its fold
+    """
+    data = np.frombuffer(mask.to_bytes(8 * words, 'little'), dtype=np.uint64)
+    return np.bitwise_or.reduce(data.reshape(-1, FOLD_WORDS), axis=0)
+
+
+def minimal_masks(masks, m):
+    """
+    Find the bitsets that are neither duplicated nor subsumed : a bitset is subsumed if another one is a strict subset
+    of it. The bitsets are visited by increasing size, and each kept bitset is indexed by its lowest route (a kept
+    bitset can only be a subset of the bitsets containing this route). The candidates of a bitset are first filtered
+    on their folds, with numpy, before the exact test
+    :param masks: a list of non-empty bitsets
+    :param m: number of routes
+    :return: the set of the indexes of the kept bitsets (the first one of duplicated bitsets)
+    """
+    words = -(-max(m, 1) // (64 * FOLD_WORDS)) * FOLD_WORDS
+    order = sorted(range(len(masks)), key=lambda index: popcount(masks[index]))
+    folds = np.zeros((len(masks), FOLD_WORDS), dtype=np.uint64)
+    kept = set()
+    seen = set()
+    buckets = defaultdict(list)
+    indexed = 0  # the routes indexing some kept bitset
+    for index in order:
+        mask = masks[index]
+        if mask in seen:
+            continue
+        seen.add(mask)
+        fold = _fold(mask, words)
+        candidates = list(chain.from_iterable(buckets[route] for route in iter_bits(mask & indexed)))
+        if candidates:
+            candidates = np.array(candidates)
+            candidates = candidates[~np.any(folds[candidates] & ~fold, axis=1)]
+            if any(masks[candidate] & mask == masks[candidate] for candidate in candidates.tolist()):
+                continue
+        key = (mask & -mask).bit_length() - 1
+        buckets[key].append(index)
+        indexed |= 1 << key
+        folds[index] = fold
+        kept.add(index)
+    return kept
+
+
+def renumber_routes(symptoms, goal="cover"):
+    """
+    Renumber the routes by increasing number of constraints containing them : a route crossing L nodes belongs to L
+    cover constraints and, for 1-identifiability, to L(n - L) pair constraints
+    :param symptoms: a SymptomMatrix
+    :param goal: "cover" or "1id"
+    :return: the rows of the symptoms over the renumbered routes
+    """
+    n, m = symptoms.n, symptoms.m
+    nbytes = (m + 7) // 8
+
+    def unpack(row):
+        return np.unpackbits(np.frombuffer(row.to_bytes(nbytes, 'little'), dtype=np.uint8), bitorder='little')[:m]
+
+    lengths = np.zeros(m, dtype=np.int64)
+    for row in symptoms.rows:
+        lengths += unpack(row)
+    order = np.argsort(lengths * (n - lengths + 1) if goal == "1id" else lengths, kind='stable')
+    return [int.from_bytes(np.packbits(unpack(row)[order], bitorder='little').tobytes(), 'little')
+            for row in symptoms.rows]
+
+
+def prune_constraints(symptoms, goal="cover"):
+    """
+    Build the covering constraints of the problem ("at least one route of the set is a measurement path") and remove
+    the duplicated and subsumed ones. A constraint is subsumed if another constraint contains a strict subset of its
+    routes, whatever their kind (cover or pair constraints, see minimal_masks)
+    :param symptoms: a SymptomMatrix, symptoms[i] contains the indexes of the routes that cross node i
+    :param goal: "cover" or "1id", indicates the goal
+    :return: the remaining constraints, an iterable of bitsets over the routes (see PrunedConstraints), and a
+            dictionary containing the statistics of the pruning. If stats["infeasible"] is True, the problem has no
+            solution : some nodes are crossed by no route (stats["uncoverable_nodes"]) or some pairs of nodes have the
+            same symptom (stats["identical_pairs"])
+    """
+    rows = symptoms.rows
+    n = symptoms.n
+    sizes = [popcount(row) for row in rows]
+
+    stats = {
+        "constraints": n,
+        "nonzeros": sum(sizes),
+        "uncoverable_nodes": [node for node in range(n) if sizes[node] == 0],
+        "identical_pairs": identical_symptoms(symptoms) if goal == "1id" else [],
+    }
+    stats["infeasible"] = bool(stats["uncoverable_nodes"] or stats["identical_pairs"])
+
+    # the routes are renumbered so that the lowest route of a constraint, its index in minimal_masks, is a rare one
+    ranked = renumber_routes(symptoms, goal)
+    positions = [(node, None) for node in range(n) if rows[node]]
+    candidates = [ranked[node] for node, _ in positions]
+    if goal == "1id":
+        for node_a, node_b, mask in symptoms.pair_masks():
+            stats["constraints"] += 1
+            stats["nonzeros"] += popcount(mask)
+            if mask:
+                positions.append((node_a, node_b))
+                candidates.append(ranked[node_a] ^ ranked[node_b])
+    # the cover and pair constraints are pruned together : a pair constraint can be subsumed by a cover constraint or
+    # by another pair constraint, and a cover constraint by a pair constraint
+    minimal = minimal_masks(candidates, symptoms.m)
+    del candidates
+    kept = [position for index, position in enumerate(positions) if index in minimal]
+    constraints = PrunedConstraints(rows, array('i', (node_a for node_a, _ in kept)),
+                                    array('i', (-1 if node_b is None else node_b for _, node_b in kept)))
+
+    stats["kept_constraints"] = len(constraints)
+    stats["kept_nonzeros"] = sum(popcount(mask) for mask in constraints)
+    stats["removed_constraints"] = stats["constraints"] - stats["kept_constraints"]
+    stats["removed_nonzeros"] = stats["nonzeros"] - stats["kept_nonzeros"]
+
+    return constraints, stats
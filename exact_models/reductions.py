@@ -0,0 +1,145 @@
+import os
+import tempfile
+
+from graph import biconnected_components, infer_adjacency, read_edges
+from instance_cache import CACHE_DIR, content_hash
+from symptoms import iter_bits, popcount
+from utils import open_instance_file, read_reductions
+from verifier import endpoint_masks
+
+
+def independent_nodes(symptoms, endpoints):
+    """
+    :param symptoms: a SymptomMatrix, symptoms[i] contains the indexes of the routes that cross node i
+    :param endpoints: a list of tuples : endpoints[j] contains the starting and ending nodes of route j
+    :return: the nodes that are crossed by no route without being one of its endpoints, they are monitors in every
+            solution
+    """
+    starting, ending = endpoint_masks(symptoms.n, endpoints)
+    return [node for node, row in enumerate(symptoms.rows) if row & ~(starting[node] | ending[node]) == 0]
+
+
+def leaf_components(adjacency):
+    """
+    :param adjacency: a list of n sets, adjacency[i] contains the neighbours of node i
+    :return: the blocks of the network that are not bridges and contain exactly one articulation point, without their
+            articulation point (at least one of their nodes is a monitor : the routes between two nodes outside of the
+            block cannot enter it)
+    """
+    blocks, articulation_points = biconnected_components(adjacency)
+    components = []
+    for block in blocks:
+        cuts = [node for node in block if node in articulation_points]
+        if len(cuts) == 1 and len(block) > 2:
+            components.append([node for node in block if node != cuts[0]])
+    return components
+
+
+def forced_monitors(symptoms, endpoints, goal):
+    """
+    Find the nodes that are monitors in every solution : a constraint (the symptom of a node, or for 1-identifiability
+    the symmetric difference of the symptoms of two nodes) whose routes all share an endpoint forces this endpoint to
+    be a monitor. The nodes that can never be covered or distinguished are found along the way
+    :param symptoms: a SymptomMatrix, symptoms[i] contains the indexes of the routes that cross node i
+    :param endpoints: a list of tuples : endpoints[j] contains the starting and ending nodes of route j
+    :param goal: "cover" or "1id"
+    :return: the sorted list of forced monitors, the list of nodes crossed by no route and the list of pairs of nodes
+            crossed by the same routes (empty for the cover goal)
+    """
+    starting, ending = endpoint_masks(symptoms.n, endpoints)
+    incident = [start | end for start, end in zip(starting, ending)]
+    # a constraint containing more routes than any node is the endpoint of cannot force a monitor
+    largest = max(popcount(routes) for routes in incident) if incident else 0
+    forced = set()
+    uncoverable = []
+    indistinguishable = []
+
+    def check(mask):
+        if popcount(mask) > largest:
+            return
+        # the only candidates are the endpoints of any route of the constraint
+        for node in endpoints[next(iter_bits(mask))]:
+            if node not in forced and mask & ~incident[node] == 0:
+                forced.add(node)
+
+    for node, row in enumerate(symptoms.rows):
+        if row == 0:
+            uncoverable.append(node)
+        else:
+            check(row)
+    if goal == "1id":
+        for node_a, node_b, mask in symptoms.pair_masks():
+            if mask == 0:
+                indistinguishable.append((node_a, node_b))
+            else:
+                check(mask)
+    return sorted(forced), uncoverable, indistinguishable
+
+
+def write_reductions(reduction_file, independent, components):
+    """
+    Write reductions in the format of the .rdc files (see utils.read_reductions)
+    :param reduction_file: path to the file
+    :param independent: the independent nodes
+    :param components: the biconnected components containing exactly one articulation point (without it)
+    """
+    os.makedirs(os.path.dirname(reduction_file), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(reduction_file), suffix=".tmp")
+    with os.fdopen(fd, 'w') as file:
+        file.write(" ".join(str(node) for node in independent) + "\n\n")
+        for component in components:
+            file.write(" ".join(str(node) for node in component) + "\n")
+    os.replace(tmp, reduction_file)
+
+
+def _exists(path):
+    try:
+        with open_instance_file(path):
+            return True
+    except (FileNotFoundError, KeyError):
+        return False
+
+
+def load_reductions(instance, symptoms, endpoints, goal, use_cache=True, cache_dir=CACHE_DIR):
+    """
+    Get the problem reductions of an instance : from the .rdc file next to the instance if there is one, otherwise
+    they are computed in linear time from the network (the .edges file next to the instance, or the links used by the
+    routes) and cached. The independent nodes are extended with the monitors forced by the goal
+    :param instance: the instance file, or <archive>.tar.gz:<member>
+    :param symptoms: a SymptomMatrix, symptoms[i] contains the indexes of the routes that cross node i
+    :param endpoints: a list of tuples : endpoints[j] contains the starting and ending nodes of route j
+    :param goal: "cover" or "1id"
+    :param use_cache: if False, do not read nor write the cache
+    :param cache_dir: the directory containing the cached reductions
+    :return: the independent nodes (with the forced monitors), the biconnected components containing exactly one
+            articulation point (without it) and no forced monitor, and a dictionary of statistics : the source of the
+            reductions ("file", "cache", "edges" or "routes"), the number of independent nodes, of components and of
+            forced monitors, and whether some nodes can never be covered or distinguished
+    """
+    reduction_file = instance.replace('.routes', '.rdc')
+    cached = os.path.join(cache_dir, f"{content_hash(instance, cache_dir)}.rdc") if use_cache else None
+    if _exists(reduction_file):
+        source = "file"
+        independent, components = read_reductions(reduction_file)
+    elif cached is not None and os.path.isfile(cached):
+        source = "cache"
+        independent, components = read_reductions(cached)
+    else:
+        edges_file = instance.replace('.routes', '.edges')
+        if _exists(edges_file):
+            source = "edges"
+            adjacency = read_edges(edges_file)[1]
+        else:
+            source = "routes"
+            adjacency = infer_adjacency(instance)
+        independent, components = independent_nodes(symptoms, endpoints), leaf_components(adjacency)
+        if cached is not None:
+            write_reductions(cached, independent, components)
+
+    forced, uncoverable, indistinguishable = forced_monitors(symptoms, endpoints, goal)
+    monitors = set(independent) | set(forced)
+    # a component containing a monitor does not need its constraint
+    components = [component for component in components if monitors.isdisjoint(component)]
+    stats = {"source": source, "independent": len(independent), "components": len(components),
+             "forced": len(monitors) - len(set(independent)), "infeasible": bool(uncoverable or indistinguishable)}
+    return sorted(monitors), components, stats
@@ -0,0 +1,88 @@
+import os
+
+from symptoms import SymptomMatrix, iter_bits, mask_from_indices, popcount
+from utils import read_solution
+
+
+def read_nodes(value):
+    """
+    Read a set of nodes given on the command line
+    :param value: the path to a file containing the nodes separated by whitespaces (e.g. a solution written by
+                monitor_placement.py --solution), or the nodes separated by commas
+    :return: the sorted list of the nodes
+    """
+    if os.path.isfile(value):
+        return sorted(set(read_solution(value)))
+    return sorted({int(node) for node in value.split(",") if node.strip()})
+
+
+def restrict_routes(symptoms, endpoints, candidates):
+    """
+    Remove the routes that can never be measurement paths, i.e. the routes whose endpoints are not both candidate
+    monitors. The kept routes are renumbered in their original order
+    :param symptoms: a SymptomMatrix, symptoms[i] contains the indexes of the routes that cross node i
+    :param endpoints: a list of tuples : endpoints[j] contains the starting and ending nodes of route j
+    :param candidates: a set of nodes, the only nodes that may be monitors
+    :return: the symptoms and the endpoints of the kept routes
+    """
+    kept = [route for route, (src, dest) in enumerate(endpoints) if src in candidates and dest in candidates]
+    position = {route: index for index, route in enumerate(kept)}
+    kept_mask = mask_from_indices(kept, len(endpoints))
+    rows = [mask_from_indices([position[route] for route in iter_bits(row & kept_mask)], len(kept))
+            for row in symptoms.rows]
+    return SymptomMatrix(symptoms.n, len(kept), rows), [endpoints[route] for route in kept]
+
+
+def scoped_constraints(symptoms, nodes, goal="1id"):
+    """
+    Build the covering constraints of the nodes to identify : each of them is crossed by a measurement path, and (for
+    1-identifiability) each pair of them is split by a measurement path. The other nodes get no constraint. The
+    duplicated constraints are only kept once
+    :param symptoms: a SymptomMatrix, symptoms[i] contains the indexes of the routes that cross node i
+    :param nodes: the sorted list of the nodes to identify
+    :param goal: "cover" or "1id"
+    :return: a list of bitsets over the routes, and the number of constraints before the removal of the duplicates
+    """
+    rows = symptoms.rows
+    kept = dict.fromkeys(rows[node] for node in nodes)
+    count = len(nodes)
+    if goal == "1id":
+        for index, node_a in enumerate(nodes):
+            row_a = rows[node_a]
+            for node_b in nodes[index + 1:]:
+                kept.setdefault(row_a ^ rows[node_b], None)
+        count += len(nodes) * (len(nodes) - 1) // 2
+    return list(kept), count
+
+
+def scope_problem(symptoms, endpoints, goal, identify=None, candidates=None):
+    """
+    Restrict an instance to a set of nodes to identify and a set of candidate monitors. The routes between two
+    candidates are kept, and the constraints only bear on the nodes to identify : the pair constraints shrink from
+    n(n-1)/2 to t(t-1)/2 for t nodes to identify. The nodes that are not candidates are the endpoints of no kept route,
+    they are thus never needed as monitors
+    :param symptoms: a SymptomMatrix, symptoms[i] contains the indexes of the routes that cross node i
+    :param endpoints: a list of tuples : endpoints[j] contains the starting and ending nodes of route j
+    :param goal: "cover" or "1id"
+    :param identify: the nodes to identify, all the nodes if None
+    :param candidates: the candidate monitors, all the nodes if None
+    :return: the restricted symptoms and endpoints, the sorted nodes to identify, the constraints (see
+            scoped_constraints) and a dictionary containing the statistics of the restriction. If stats["infeasible"]
+            is True, the problem has no solution : some nodes to identify are crossed by no kept route, or some pairs
+            of them are crossed by the same kept routes
+    """
+    n = symptoms.n
+    identify = sorted(set(identify)) if identify is not None else list(range(n))
+    candidates = set(candidates) if candidates is not None else set(range(n))
+    outside = [node for node in identify + sorted(candidates) if not 0 <= node < n]
+    if outside:
+        raise ValueError(f"nodes {sorted(set(outside))} are not nodes of the network (0 to {n - 1})")
+
+    routes_nbr = len(endpoints)
+    symptoms, endpoints = restrict_routes(symptoms, endpoints, candidates)
+    constraints, count = scoped_constraints(symptoms, identify, goal)
+    stats = {"identify": len(identify), "candidates": len(candidates), "routes": len(endpoints),
+             "removed_routes": routes_nbr - len(endpoints), "constraints": count,
+             "kept_constraints": len(constraints), "kept_nonzeros": sum(popcount(mask) for mask in constraints),
+             "infeasible": 0 in constraints}
+    return symptoms, endpoints, identify, constraints, stats
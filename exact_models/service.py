@@ -0,0 +1,429 @@
+import argparse
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+import threading
+from collections import OrderedDict
+from contextlib import nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from time import time
+
+from graph import read_edges
+from instance_cache import load_instance
+from model_cache import build_model, load_model
+from monitor_placement import DEFAULT_TIMEOUT, solve_problem
+from profiling import Profiler, phase
+from pruning import PrunedConstraints
+from reductions import load_reductions
+from utils import split_archive_path
+
+# memory cap of the resident instances, reductions and models, in MB
+DEFAULT_CACHE_MEMORY = 2000
+# approximate size of the Python objects holding an instance, in bytes : an int per packed row, a tuple of two ints
+# per route
+ROW_BYTES = 28
+ENDPOINT_BYTES = 120
+# options of a solve request (see monitor_placement.solve_instance) and their default values
+SOLVE_OPTIONS = {"reductions": False, "prune": False, "lazy": False, "fifo": False, "timelimit": DEFAULT_TIMEOUT,
+                 "warm_start": None, "threads": None, "decompose": False, "bounds": False, "memory": None,
+                 "model_cache": False, "improve": True, "identify": None, "candidates": None, "profile": False,
+                 "profile_memory": False}
+
+
+class LRUCache:
+    """
+    class representing a cache of bounded size : when a new entry does not fit, the least recently used entries are
+    evicted. The size of each entry is given when it is added
+    """
+
+    def __init__(self, capacity):
+        """
+        create an LRUCache object
+        :param capacity: the maximum total size of the entries, in bytes
+        """
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """
+        :return: the value of the entry, None if the key is not in the cache
+        """
+        if key not in self.entries:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return self.entries[key][0]
+
+    def put(self, key, value, size):
+        """
+        Add an entry, the least recently used entries are evicted until it fits. An entry larger than the capacity is
+        not added
+        :param key: the key of the entry
+        :param value: the value of the entry
+        :param size: the size of the entry, in bytes
+        """
+        if key in self.entries:
+            self.size -= self.entries.pop(key)[1]
+        if size > self.capacity:
+            return
+        while self.size + size > self.capacity:
+            _, (_, evicted) = self.entries.popitem(last=False)
+            self.size -= evicted
+            self.evictions += 1
+        self.entries[key] = (value, size)
+        self.size += size
+
+    def clear(self):
+        self.entries.clear()
+        self.size = 0
+
+    def stats(self):
+        return {"entries": len(self.entries), "bytes": self.size, "capacity": self.capacity, "hits": self.hits,
+                "misses": self.misses, "evictions": self.evictions}
+
+
+def instance_key(instance):
+    """
+    :param instance: the instance file, or <archive>.tar.gz:<member>
+    :return: a tuple identifying the current content of the instance : its path, and the modification time and size
+            of the file (or archive) containing it, so that a rewritten instance is loaded again
+    """
+    archive, member = split_archive_path(instance)
+    stat = os.stat(archive or member)
+    return instance, stat.st_mtime_ns, stat.st_size
+
+
+def instance_bytes(instance):
+    n, symptoms, endpoints = instance
+    return symptoms.nbytes() + ROW_BYTES * n + ENDPOINT_BYTES * len(endpoints)
+
+
+def reductions_bytes(reductions):
+    independent, components, _ = reductions
+    return ROW_BYTES * (len(independent) + sum(len(component) for component in components)) + 1000
+
+
+def model_bytes(model):
+    if isinstance(model.constraints, PrunedConstraints):
+        return model.constraints.nbytes()
+    return sum(ROW_BYTES + ((routes.bit_length() + 7) >> 3) for routes in model.constraints)
+
+
+class SolveService:
+    """
+    class answering solve requests in a long-running process. The instances, their reductions and their pruned
+    constraints stay resident in an LRU cache between requests, and the solver modules are imported (and the Gurobi
+    environment started) on their first use only, so that a request only pays for the resolution itself. The models of
+    the solvers (Gurobi, CP-SAT, the clause file of NuWLS-c) are not resident : they are built again from the resident
+    constraints for each request. The resolutions run one at a time, the other requests wait for the lock
+    """
+
+    def __init__(self, cache_memory=DEFAULT_CACHE_MEMORY, use_cache=True):
+        """
+        create a SolveService object
+        :param cache_memory: the memory cap of the resident instances and models, in MB
+        :param use_cache: if False, the instances are parsed without using the binary instance cache
+        """
+        self.cache = LRUCache(cache_memory * 1000 * 1000)
+        self.use_cache = use_cache
+        self.requests = 0
+        self.start_timer = time()
+        # held during the resolutions and the changes of the cache, the solvers already use all the cores
+        self.lock = threading.Lock()
+        # held only while the requests are counted, so that the stats are not delayed by a resolution
+        self.requests_lock = threading.Lock()
+
+    def _resident(self, key, load, size):
+        """
+        :param key: the key of the entry
+        :param load: a function computing the value if it is not resident
+        :param size: a function giving the size of the value, in bytes
+        :return: the value, and True if it was resident
+        """
+        value = self.cache.get(key)
+        if value is not None:
+            return value, True
+        value = load()
+        self.cache.put(key, value, size(value))
+        return value, False
+
+    def solve(self, request):
+        """
+        Solve the monitor placement problem of an instance (see monitor_placement.solve_instance)
+        :param request: a dictionary containing the instance, the solver, the goal and optionally the options of
+                        SOLVE_OPTIONS. The warm start is a list of monitors or "greedy", the nodes to identify and the
+                        candidates are lists of nodes
+        :return: a dictionary containing the solution and the statistics of the resolution, and which data were
+                resident
+        """
+        start_timer = time()
+        unknown = set(request) - set(SOLVE_OPTIONS) - {"command", "instance", "solver", "goal"}
+        if unknown:
+            raise ValueError(f"unknown options {sorted(unknown)}")
+        instance, solver, goal = request["instance"], request["solver"], request["goal"]
+        options = {option: request.get(option, default) for option, default in SOLVE_OPTIONS.items()}
+        profiled = options["profile"] or options["profile_memory"]
+        profiler = Profiler(options["profile_memory"]) if profiled else nullcontext()
+        with profiler:
+            key = instance_key(instance)
+
+            with phase("load"):
+                (n, symptoms, endpoints), resident_instance = self._resident(
+                    ("instance",) + key, lambda: load_instance(instance, use_cache=self.use_cache), instance_bytes)
+            resident = {"instance": resident_instance}
+
+            indy_nodes = None
+            bicon_comp = None
+            reduction_stats = None
+            if options["reductions"]:
+                with phase("reductions"):
+                    (indy_nodes, bicon_comp, reduction_stats), resident["reductions"] = self._resident(
+                        ("reductions", goal) + key,
+                        lambda: load_reductions(instance, symptoms, endpoints, goal, self.use_cache), reductions_bytes)
+
+            adjacency = None
+            if options["decompose"]:
+                adjacency, resident["edges"] = self._resident(
+                    ("edges",) + key, lambda: read_edges(instance.replace('.routes', '.edges'))[1],
+                    lambda adjacency: ROW_BYTES * sum(len(neighbours) + 8 for neighbours in adjacency))
+
+            model = None
+            scoped = options["identify"] is not None or options["candidates"] is not None
+            if (options["prune"] or options["model_cache"]) and not options["decompose"] and not scoped and \
+                    solver != "greedy":
+                # in lazy mode, only the cover constraints are built up front
+                model_goal = "cover" if options["lazy"] else goal
+                if options["model_cache"]:
+                    def build():
+                        return load_model(instance, n, symptoms, endpoints, model_goal, indy_nodes, bicon_comp)[0]
+                else:
+                    def build():
+                        return build_model(n, symptoms, endpoints, model_goal, indy_nodes, bicon_comp)
+                # the reductions depend on the goal of the request, not on the goal of the model
+                reductions_goal = goal if options["reductions"] else None
+                with phase("model"):
+                    model, resident["model"] = self._resident(("model", model_goal, reductions_goal) + key,
+                                                              build, model_bytes)
+
+            result = {"instance": instance, "reductions": options["reductions"], "resident": resident}
+            result.update(solve_problem(n, symptoms, endpoints, solver, goal, indy_nodes, bicon_comp, options["prune"],
+                                        options["lazy"], options["fifo"], options["timelimit"], options["warm_start"],
+                                        options["threads"], Path(instance).stem, adjacency,
+                                        reduction_stats, None, options["bounds"], options["memory"], model,
+                                        options["improve"], options["identify"], options["candidates"]))
+        result["profile"] = profiler.report() if profiled else None
+        result["request_time"] = time() - start_timer
+        return result
+
+    def stats(self):
+        """
+        :return: a dictionary containing the number of requests served, the uptime and the statistics of the cache
+        """
+        return {"requests": self.requests, "uptime": time() - self.start_timer, "cache": self.cache.stats(),
+                "backends": sorted(module for module in ("gurobipy", "ortools", "scipy") if module in sys.modules)}
+
+    def handle(self, request):
+        """
+        Answer a request, the errors are reported in the response instead of stopping the service
+        :param request: a dictionary, its "command" is "solve" (by default), "stats" or "clear" (evict every resident
+                        entry)
+        :return: a dictionary {"ok": True, "result": ...} or {"ok": False, "error": ...}
+        """
+        with self.requests_lock:
+            self.requests += 1
+        command = request.get("command", "solve")
+        try:
+            if command == "solve":
+                with self.lock:
+                    result = self.solve(request)
+            elif command == "stats":
+                # answered right away, even during a resolution
+                result = self.stats()
+            elif command == "clear":
+                with self.lock:
+                    self.cache.clear()
+                result = self.stats()
+            else:
+                raise ValueError(f"unknown command {command}, expected solve, stats or clear")
+        except MemoryError:
+            with self.lock:
+                self.cache.clear()
+            return {"ok": False, "error": "MemoryError"}
+        except Exception as e:
+            return {"ok": False, "error": f"{type(e).__name__}: {e}"}
+        return {"ok": True, "result": result}
+
+
+def encode(response):
+    return (json.dumps(response, default=str) + "\n").encode()
+
+
+def decode_and_handle(service, line, command=None):
+    """
+    :param service: a SolveService
+    :param line: a JSON request
+    :param command: the command of the request, if it is not given in the request
+    :return: the response of the service
+    """
+    try:
+        request = json.loads(line)
+    except json.JSONDecodeError as e:
+        return {"ok": False, "error": f"JSONDecodeError: {e}"}
+    if not isinstance(request, dict):
+        return {"ok": False, "error": "a request must be a JSON object"}
+    if command is not None:
+        request["command"] = command
+    return service.handle(request)
+
+
+class SocketHandler(socketserver.StreamRequestHandler):
+    """
+    class answering the requests of a client connected to the Unix socket : one JSON request per line, answered by one
+    JSON response per line
+    """
+
+    def handle(self):
+        for line in self.rfile:
+            if line.strip():
+                self.wfile.write(encode(decode_and_handle(self.server.service, line)))
+                self.wfile.flush()
+
+
+class HttpHandler(BaseHTTPRequestHandler):
+    """
+    class answering the HTTP requests : POST /solve with a JSON request as body, GET /stats, POST /clear
+    """
+
+    def _respond(self, response):
+        body = encode(response)
+        self.send_response(200 if response["ok"] else 400)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/stats":
+            self._respond(self.server.service.handle({"command": "stats"}))
+        else:
+            self._respond({"ok": False, "error": f"unknown path {self.path}, expected /stats"})
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        command = self.path.strip("/")
+        if command in ("solve", "stats", "clear"):
+            self._respond(decode_and_handle(self.server.service, body if body.strip() else b"{}", command))
+        else:
+            self._respond({"ok": False, "error": f"unknown path {self.path}, expected /solve, /stats or /clear"})
+
+    def log_message(self, format, *args):
+        pass  # the requests are not logged
+
+
+def serve(service, socket_path=None, port=None):
+    """
+    Answer the requests until the process is interrupted. Each connection is served by its own thread, so that a
+    connected client does not block the others, but the resolutions run one at a time (see SolveService)
+    :param service: a SolveService
+    :param socket_path: the path of the Unix socket to listen on
+    :param port: the local TCP port to listen on (HTTP), used if no socket path is given
+    """
+    if socket_path is not None:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)  # left by a previous service
+        server = socketserver.ThreadingUnixStreamServer(socket_path, SocketHandler)
+        server.daemon_threads = True  # the connected clients do not prevent the service from stopping
+    else:
+        server = ThreadingHTTPServer(("127.0.0.1", port), HttpHandler)
+    server.service = service
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if socket_path is not None and os.path.exists(socket_path):
+            os.remove(socket_path)
+
+
+class SolveClient:
+    """
+    class sending requests to a SolveService listening on a Unix socket
+    """
+
+    def __init__(self, socket_path, timeout=None):
+        """
+        create a SolveClient object, connected to the service
+        :param socket_path: the path of the Unix socket of the service
+        :param timeout: the timeout of the requests, in seconds (None for no timeout)
+        """
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.settimeout(timeout)
+        self.socket.connect(socket_path)
+        self.file = self.socket.makefile('rwb')
+
+    def request(self, request):
+        """
+        :param request: a dictionary (see SolveService.handle)
+        :return: the response of the service
+        """
+        self.file.write((json.dumps(request) + "\n").encode())
+        self.file.flush()
+        line = self.file.readline()
+        if not line:
+            raise ConnectionError("the service closed the connection")
+        return json.loads(line)
+
+    def solve(self, instance, solver, goal, **options):
+        """
+        :return: the result of the resolution (see SolveService.solve)
+        """
+        response = self.request({"instance": instance, "solver": solver, "goal": goal, **options})
+        if not response["ok"]:
+            raise RuntimeError(response["error"])
+        return response["result"]
+
+    def close(self):
+        self.file.close()
+        self.socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    address = parser.add_mutually_exclusive_group(required=True)
+    address.add_argument('--socket', help="Unix socket to listen on (or to send --request to)")
+    address.add_argument('--port', help="local port to listen on, the requests are sent over HTTP", type=int)
+    parser.add_argument('--cache-memory', help="memory cap of the resident instances and models in MB "
+                                               f"({DEFAULT_CACHE_MEMORY} by default)", type=int,
+                        default=DEFAULT_CACHE_MEMORY)
+    parser.add_argument('--no-cache', help="always parse the instances, do not use the binary instance cache",
+                        required=False, action='store_true')
+    parser.add_argument('--request', help="send a JSON request to the service listening on --socket and print the "
+                                          "response, instead of starting a service", required=False)
+
+    args = parser.parse_args()
+
+    if args.request is not None:
+        if args.socket is None:
+            parser.error("--request needs --socket")
+        with SolveClient(args.socket) as client:
+            print(json.dumps(client.request(json.loads(args.request)), indent=1))
+    else:
+        # a terminated service removes its socket
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        serve(SolveService(args.cache_memory, not args.no_cache), args.socket, args.port)
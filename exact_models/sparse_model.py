@@ -0,0 +1,161 @@
+from itertools import chain, islice
+
+import numpy as np
+
+# size of the bit matrix unpacked at once, in bytes (one byte per route and per constraint)
+BLOCK_BYTES = 1 << 24
+
+
+def covering_masks(symptoms, goal, constraints=None, lazy=False):
+    """
+    :param symptoms: a SymptomMatrix, symptoms[i] contains the indexes of the routes that cross node i
+    :param goal: "cover" or "1id"
+    :param constraints: a list of bitsets over the routes (see pruning.prune_constraints), if given they replace the
+                        cover and 1-identifiability constraints
+    :param lazy: if True, the 1-identifiability constraints are left out (they are added as cuts)
+    :return: an iterable of bitsets over the routes, one per covering constraint ("at least one route of the set is a
+            measurement path")
+    """
+    if constraints is not None:
+        return constraints
+    if goal == "1id" and not lazy:
+        return chain(symptoms.rows, (mask for _, _, mask in symptoms.pair_masks()))
+    return symptoms.rows
+
+
+def csr_blocks(masks, m):
+    """
+    Convert bitsets to the compressed sparse rows of a 0/1 matrix, a block of rows at a time. The bitsets of a block are
+    unpacked together by numpy instead of iterating over their bits
+    :param masks: an iterable of bitsets over the routes
+    :param m: number of routes
+    :return: a generator of tuples (indptr, indices) of numpy arrays : the routes of the row i of the block are
+            indices[indptr[i]:indptr[i + 1]], in increasing order
+    """
+    nbytes = (m + 7) // 8
+    size = max(1, BLOCK_BYTES // max(8 * nbytes, 1))
+    masks = iter(masks)
+    while True:
+        block = list(islice(masks, size))
+        if not block:
+            return
+        buffer = b"".join(mask.to_bytes(nbytes, 'little') for mask in block)
+        bits = np.unpackbits(np.frombuffer(buffer, dtype=np.uint8).reshape(len(block), nbytes), axis=1,
+                             bitorder='little')
+        rows, indices = np.nonzero(bits)
+        indptr = np.zeros(len(block) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=len(block)), out=indptr[1:])
+        yield indptr, indices.astype(np.int32)
+
+
+def linking_matrix(n, endpoints):
+    """
+    Build the linking constraints y_j <-> x_src(j) · x_dest(j) over the variables [x_0 .. x_n-1, y_0 .. y_m-1] :
+    x_src - y_j >= 0, x_dest - y_j >= 0 and y_j - x_src - x_dest >= -1
+    :param n: number of nodes
+    :param endpoints: a list of tuples : endpoints[j] contains the starting and ending nodes of route j
+    :return: the coordinates (rows, columns, values) of the 3m x (n + m) matrix, and the right-hand sides
+    """
+    m = len(endpoints)
+    routes = np.arange(m, dtype=np.int64)
+    ends = np.array(endpoints, dtype=np.int64).reshape(m, 2)
+    rows = np.concatenate([routes, routes, m + routes, m + routes, 2 * m + routes, 2 * m + routes, 2 * m + routes])
+    columns = np.concatenate([ends[:, 0], n + routes, ends[:, 1], n + routes, n + routes, ends[:, 0], ends[:, 1]])
+    values = np.concatenate([np.ones(m), -np.ones(m), np.ones(m), -np.ones(m), np.ones(m), -np.ones(m), -np.ones(m)])
+    rhs = np.concatenate([np.zeros(2 * m), -np.ones(m)])
+    return (rows, columns, values), rhs
+
+
+def add_gurobi_rows(model, variables, indptr, indices, values, rhs):
+    """
+    Add the constraints A·v >= rhs to a Gurobi model with its matrix API
+    :param model: a gurobipy Model
+    :param variables: the list of the variables v
+    :param indptr: the compressed sparse rows of A (see csr_blocks)
+    :param indices: the columns of the nonzeros of A
+    :param values: the values of the nonzeros of A
+    :param rhs: the right-hand sides
+    """
+    import gurobipy as gp
+    try:
+        import scipy.sparse as sparse
+    except ImportError:  # the rows are added one by one
+        sparse = None
+
+    if sparse is None:
+        for row in range(len(indptr) - 1):
+            start, end = indptr[row], indptr[row + 1]
+            model.addLConstr(gp.LinExpr(values[start:end].tolist(), [variables[index] for index in
+                                                                      indices[start:end].tolist()]),
+                             gp.GRB.GREATER_EQUAL, rhs[row])
+        return
+    matrix = sparse.csr_matrix((values, indices, indptr), shape=(len(indptr) - 1, len(variables)))
+    # a route starting and ending at the same node gives twice the same column
+    matrix.sum_duplicates()
+    model.addMConstr(matrix, gp.MVar.fromlist(variables), '>', rhs)
+
+
+def add_gurobi_model(model, n, endpoints, x_vars, y_vars, masks):
+    """
+    Add the linking constraints and the covering constraints (at least one route of each set is a measurement path) to
+    a Gurobi model
+    :param model: a gurobipy Model
+    :param n: number of nodes
+    :param endpoints: a list of tuples : endpoints[j] contains the starting and ending nodes of route j
+    :param x_vars: the list of the n monitor variables
+    :param y_vars: the list of the m route variables
+    :param masks: an iterable of bitsets over the routes (see covering_masks)
+    :return: the number of constraints and of nonzeros added
+    """
+    (rows, columns, values), rhs = linking_matrix(n, endpoints)
+    order = np.lexsort((columns, rows))
+    indptr = np.zeros(len(rhs) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=len(rhs)), out=indptr[1:])
+    add_gurobi_rows(model, x_vars + y_vars, indptr, columns[order], values[order], rhs)
+    count, nonzeros = len(rhs), len(values)
+    for indptr, indices in csr_blocks(masks, len(y_vars)):
+        add_gurobi_rows(model, y_vars, indptr, indices, np.ones(len(indices)), np.ones(len(indptr) - 1))
+        count += len(indptr) - 1
+        nonzeros += len(indices)
+    return count, nonzeros
+
+
+def add_cpsat_clauses(model, y_vars, masks):
+    """
+    Add the covering constraints (a clause over the routes of each set) to a CP-SAT model, by filling its proto
+    directly instead of building a linear expression per constraint
+    :param model: a cp_model.CpModel
+    :param y_vars: the list of the m route variables, created one after the other
+    :param masks: an iterable of bitsets over the routes (see covering_masks)
+    :return: the number of constraints and of literals added
+    """
+    proto = model.Proto()
+    offset = y_vars[0].Index() if y_vars else 0
+    count = nonzeros = 0
+    for indptr, indices in csr_blocks(masks, len(y_vars)):
+        literals = (indices + offset).tolist()
+        bounds = indptr.tolist()
+        for start, end in zip(bounds, bounds[1:]):
+            proto.constraints.add().bool_or.literals.extend(literals[start:end])
+        count += len(bounds) - 1
+        nonzeros += len(literals)
+    return count, nonzeros
+
+
+def add_cpsat_model(model, endpoints, x_vars, y_vars, masks):
+    """
+    Add the linking constraints (y_j => x_src(j) AND x_dest(j)) and the covering constraints to a CP-SAT model
+    :param model: a cp_model.CpModel
+    :param endpoints: a list of tuples : endpoints[j] contains the starting and ending nodes of route j
+    :param x_vars: the list of the n monitor variables
+    :param y_vars: the list of the m route variables, created one after the other
+    :param masks: an iterable of bitsets over the routes (see covering_masks)
+    :return: the number of constraints and of literals added
+    """
+    proto = model.Proto()
+    for (src, dest), route in zip(endpoints, y_vars):
+        constraint = proto.constraints.add()
+        constraint.enforcement_literal.append(route.Index())
+        constraint.bool_and.literals.extend([x_vars[src].Index(), x_vars[dest].Index()])
+    count, nonzeros = add_cpsat_clauses(model, y_vars, masks)
+    return count + len(endpoints), nonzeros + 3 * len(endpoints)
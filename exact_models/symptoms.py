@@ -0,0 +1,235 @@
+import numpy as np
+
+
+def popcount(mask):
+    """
+    Count the number of bits set in a packed bit row
+    :param mask: a non-negative integer used as a bitset
+    :return: the number of bits set to 1
+    """
+    return mask.bit_count()
+
+
+def mask_from_indices(indices, size=0):
+    """
+    Pack a collection of indexes into a bitset
+    :param indices: an iterable of non-negative integers
+    :param size: an upper bound on the indexes (optional), used to preallocate the row
+    :return: an integer whose bit i is set iff i is in indices
+    """
+    indices = list(indices)
+    if not indices:
+        return 0
+    if size <= 0:
+        size = max(indices) + 1
+    row = bytearray((size + 7) >> 3)
+    for index in indices:
+        row[index >> 3] |= 1 << (index & 7)
+    return int.from_bytes(row, 'little')
+
+
+def iter_bits(mask):
+    """
+    Iterate over the indexes of the bits set in a bitset, in increasing order
+    :param mask: a non-negative integer used as a bitset
+    :return: a generator of integers
+    """
+    if not mask:
+        return
+    bits = format(mask, 'b')[::-1]
+    index = bits.find('1')
+    while index != -1:
+        yield index
+        index = bits.find('1', index + 1)
+
+
+def bits_to_list(mask):
+    """
+    :param mask: a non-negative integer used as a bitset
+    :return: the list of indexes of the bits set in mask
+    """
+    return list(iter_bits(mask))
+
+
+def _as_mask(other):
+    if isinstance(other, SymptomRow):
+        return other.mask
+    if isinstance(other, int):
+        return other
+    return mask_from_indices(other)
+
+
+class SymptomRow:
+    """
+    set-like read-only view over the packed symptom of a node (or any set of routes)
+    """
+    __slots__ = ('mask',)
+
+    def __init__(self, mask=0):
+        """
+        create a SymptomRow object
+        :param mask: integer whose bit j is set iff route j belongs to the row
+        """
+        self.mask = mask
+
+    def __iter__(self):
+        return iter_bits(self.mask)
+
+    def __len__(self):
+        return popcount(self.mask)
+
+    def __bool__(self):
+        return self.mask != 0
+
+    def __contains__(self, route):
+        return route >= 0 and (self.mask >> route) & 1 == 1
+
+    def __eq__(self, other):
+        # only rows compare equal, use to_set() to compare with a set of routes
+        if isinstance(other, SymptomRow):
+            return self.mask == other.mask
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.mask)
+
+    def to_set(self):
+        """
+        :return: the set of the routes of the row
+        """
+        return set(iter_bits(self.mask))
+
+    def __str__(self):
+        return str(set(self))
+
+    def symmetric_difference(self, other):
+        return SymptomRow(self.mask ^ _as_mask(other))
+
+    def intersection(self, other):
+        return SymptomRow(self.mask & _as_mask(other))
+
+    def union(self, other):
+        return SymptomRow(self.mask | _as_mask(other))
+
+    def difference(self, other):
+        return SymptomRow(self.mask & ~_as_mask(other))
+
+    def isdisjoint(self, other):
+        return self.mask & _as_mask(other) == 0
+
+    def issubset(self, other):
+        return self.mask & ~_as_mask(other) == 0
+
+    __xor__ = symmetric_difference
+    __and__ = intersection
+    __or__ = union
+    __sub__ = difference
+
+
+class SymptomMatrix:
+    """
+    class representing the node x route incidence matrix, each node symptom is stored as a packed bit row
+    """
+    __slots__ = ('n', 'm', 'rows')
+
+    def __init__(self, n, m, rows=None):
+        """
+        create a SymptomMatrix object
+        :param n: the number of nodes
+        :param m: the number of routes
+        :param rows: a list of n integers, bit j of rows[i] is set iff route j crosses node i
+        """
+        self.n = n
+        self.m = m
+        self.rows = list(rows) if rows is not None else [0] * n
+
+    @classmethod
+    def from_routes(cls, n, routes_list):
+        """
+        Build the matrix from a list of routes
+        :param n: the number of nodes
+        :param routes_list: a list of Route objects, routes_list[j].index must be j
+        :return: a SymptomMatrix
+        """
+        crossed = [[] for _ in range(n)]
+        for route in routes_list:
+            for node in route.nodes:
+                crossed[node].append(route.index)
+        m = len(routes_list)
+        return cls(n, m, [mask_from_indices(routes, m) for routes in crossed])
+
+    def __len__(self):
+        return self.n
+
+    def __getitem__(self, node):
+        return SymptomRow(self.rows[node])
+
+    def __iter__(self):
+        for row in self.rows:
+            yield SymptomRow(row)
+
+    def row_size(self, node):
+        """
+        :param node: index of the node
+        :return: the number of routes crossing node
+        """
+        return popcount(self.rows[node])
+
+    def nonzeros(self):
+        """
+        :return: the number of (node, route) incidences stored in the matrix
+        """
+        return sum(popcount(row) for row in self.rows)
+
+    def pair_mask(self, node_a, node_b):
+        """
+        :return: the bitset of the routes that distinguish node_a from node_b
+        """
+        return self.rows[node_a] ^ self.rows[node_b]
+
+    def pair_masks(self):
+        """
+        Iterate over the symmetric differences of every pair of nodes, in hash_pair order
+        :return: a generator of tuples (node_a, node_b, mask) with node_a < node_b
+        """
+        rows = self.rows
+        for node_a in range(self.n):
+            row_a = rows[node_a]
+            for node_b in range(node_a + 1, self.n):
+                yield node_a, node_b, row_a ^ rows[node_b]
+
+    def packed(self):
+        """
+        :return: a numpy array of shape (n, ceil(m / 64)) and dtype uint64, the words of each row (little endian)
+        """
+        nbytes = 8 * ((self.m + 63) >> 6)
+        return np.frombuffer(b''.join(row.to_bytes(nbytes, 'little') for row in self.rows),
+                             dtype=np.uint64).reshape(self.n, nbytes // 8)
+
+    def pair_difference_counts(self):
+        """
+        Compute the size of the symmetric difference of every pair of nodes, one node against all the following ones
+        at a time (xor and popcount of the packed rows)
+        :return: a numpy array of integers, indexed by hash_pair(node_a, node_b, n)
+        """
+        packed = self.packed()
+        counts = [np.bitwise_count(packed[node + 1:] ^ packed[node]).sum(axis=1, dtype=np.int64)
+                  for node in range(self.n - 1)]
+        return np.concatenate(counts) if counts else np.zeros(0, dtype=np.int64)
+
+    def signatures(self, path_mask):
+        """
+        Restrict each node symptom to a set of measurement paths
+        :param path_mask: bitset of the measurement paths
+        :return: a list of integers, the restricted symptom of each node
+        """
+        return [row & path_mask for row in self.rows]
+
+    def copy(self):
+        return SymptomMatrix(self.n, self.m, self.rows)
+
+    def nbytes(self):
+        """
+        :return: the approximate number of bytes used by the packed rows
+        """
+        return sum((row.bit_length() + 7) >> 3 for row in self.rows)
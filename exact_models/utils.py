@@ -1,14 +1,28 @@
+from array import array
+import csv
+from contextlib import contextmanager
 from copy import deepcopy
 from itertools import combinations
 from time import perf_counter, time
+import io
 import subprocess
 import os
+import posixpath
+import tarfile
+
+import numpy as np
+
+from symptoms import SymptomMatrix
+
+ARCHIVE_SUFFIXES = ('.tar.gz', '.tgz', '.tar')
 
 
 class Route:
     """
-    class representing the routes
+    class representing the routes, a lightweight view over one route of an instance (see InstanceArrays.routes)
     """
+    __slots__ = ('start', 'end', 'nodes', 'index')
+
     def __init__(self, start, end, nodes, index):
         """
         create a Route object
@@ -25,26 +39,150 @@ class Route:
     def __str__(self):
         return f"{self.index} | {self.start} {self.end} | {self.nodes}"
 
+
+class InstanceArrays:
+    """
+    class representing the routes of an instance as flat arrays : starts[j] and ends[j] are the endpoints of route j,
+    and the nodes crossed by route j are indices[indptr[j]:indptr[j+1]] (CSR format)
+    """
+    __slots__ = ('n', 'm', 'starts', 'ends', 'indptr', 'indices')
+
+    def __init__(self, n, starts, ends, indptr, indices):
+        """
+        create an InstanceArrays object
+        :param n: the number of nodes
+        :param starts: a sequence of m integers, the starting node of each route
+        :param ends: a sequence of m integers, the destination node of each route
+        :param indptr: a sequence of m+1 integers, the offsets of each route in indices
+        :param indices: a sequence of integers, the nodes crossed by the routes
+        """
+        self.n = n
+        self.m = len(starts)
+        self.starts = starts
+        self.ends = ends
+        self.indptr = indptr
+        self.indices = indices
+
+    @classmethod
+    def from_routes(cls, n, routes_list):
+        """
+        :param n: the number of nodes
+        :param routes_list: a list of Route objects, routes_list[j].index must be j
+        :return: an InstanceArrays
+        """
+        indptr = array('q', [0])
+        indices = array('i')
+        for route in routes_list:
+            indices.extend(route.nodes)
+            indptr.append(len(indices))
+        starts = array('i', [route.start for route in routes_list])
+        ends = array('i', [route.end for route in routes_list])
+        return cls(n, starts, ends, indptr, indices)
+
+    def endpoints(self):
+        """
+        :return: a list of tuples : endpoints[j] contains the starting and ending nodes of route j
+        """
+        return list(zip(self.starts, self.ends))
+
+    def route_nodes(self, index):
+        """
+        :return: the nodes crossed by the given route
+        """
+        return self.indices[self.indptr[index]:self.indptr[index + 1]]
+
+    def routes(self):
+        """
+        :return: a generator of Route objects, one for each route of the instance
+        """
+        for index in range(self.m):
+            yield Route(self.starts[index], self.ends[index], set(self.route_nodes(index)), index)
+
+    def symptoms(self):
+        """
+        :return: a SymptomMatrix, symptoms[i] contains the indexes of the routes that cross node i
+        """
+        indptr = np.asarray(self.indptr, dtype=np.int64)
+        nodes = np.asarray(self.indices, dtype=np.int64)
+        # the route of each incidence, grouped by node
+        routes = np.repeat(np.arange(self.m, dtype=np.int64), np.diff(indptr))
+        order = np.argsort(nodes, kind='stable')
+        routes = routes[order]
+        bounds = np.searchsorted(nodes[order], np.arange(self.n + 1))
+        rows = []
+        for node in range(self.n):
+            bits = np.zeros(self.m, dtype=np.uint8)
+            bits[routes[bounds[node]:bounds[node + 1]]] = 1
+            rows.append(int.from_bytes(np.packbits(bits, bitorder='little').tobytes(), 'little'))
+        return SymptomMatrix(self.n, self.m, rows)
+
+
+def split_archive_path(path):
+    """
+    Split a path pointing inside an archive, of the form <archive>.tar.gz:<member> or <archive>.tar.gz/<member>
+    :param path: a path
+    :return: a tuple (archive, member), archive is None if the path does not point inside an archive
+    """
+    for suffix in ARCHIVE_SUFFIXES:
+        for separator in (':', '/'):
+            index = path.find(suffix + separator)
+            if index != -1:
+                return path[:index + len(suffix)], path[index + len(suffix) + 1:]
+    return None, path
+
+
+@contextmanager
+def open_instance_file(path, mode='r'):
+    """
+    Open an instance file (.routes, .rdc, .edges), either a regular file or a member of a tar archive
+    (see split_archive_path), without extracting the archive
+    :param path: the path to the file
+    :param mode: 'r' or 'rb'
+    :return: a file object
+    """
+    archive, member = split_archive_path(path)
+    if archive is None:
+        with open(path, mode) as file:
+            yield file
+        return
+
+    with tarfile.open(archive) as tar:
+        try:
+            raw = tar.extractfile(member)
+        except KeyError:
+            raw = None
+        if raw is None:
+            raise FileNotFoundError(f"{member} not found in {archive}")
+        yield raw if 'b' in mode else io.TextIOWrapper(raw)
+
+
+def archive_instances(archive):
+    """
+    List the instances contained in a tar archive
+    :param archive: path to the archive
+    :return: a list of paths of the form <archive>:<member> pointing to each .routes file of the archive
+    """
+    with tarfile.open(archive) as tar:
+        return [f"{archive}:{member.name}" for member in tar.getmembers()
+                if member.isfile() and member.name.endswith('.routes') and
+                not os.path.basename(member.name).startswith('._')]
+
+
 def compute_symptoms(n, routes_list):
     """
     Compute the symptom of each node from the set of availables routes
     :param n: the number of nodes
     :param routes_list: a list of Route objects containing the routes
-    :return: a list of sets containing the symptom of each node
+    :return: a SymptomMatrix, symptoms[i] is a set-like view of the routes crossing node i
     """
-    symptoms = [set() for i in range(n)]
-    for route in routes_list:
-        for node in route.nodes:
-            symptoms[node].add(route.index)
-
-    return symptoms
+    return SymptomMatrix.from_routes(n, routes_list)
 
 
 def routes_from_symptoms(m, symptoms, used_routes):
     """
     Retrieves the routes definition from the symptoms
     :param m: the number of routes
-    :param symptoms: a list of sets containing the symptom of each node
+    :param symptoms: a SymptomMatrix containing the symptom of each node
     :param used_routes: the indexes of the wanted routes
     :return: a list of Route objects containing the wanted routes
     """
@@ -57,15 +195,25 @@ def routes_from_symptoms(m, symptoms, used_routes):
     return [route for index, route in enumerate(routes) if index in used_routes]
 
 
+def read_solution(solution_file):
+    """
+    Read a solution written by monitor_placement.py --solution
+    :param solution_file: the path to the file containing the solution
+    :return: a list containing the monitors
+    """
+    with open(solution_file) as file:
+        return [int(monitor) for monitor in file.read().split()]
+
+
 def read_reductions(reduction_file):
     """
     Parse reductions files for monitor problem
-    :param reduction_file: path to the file containing the reductions definitions
+    :param reduction_file: path to the file containing the reductions definitions (possibly inside an archive)
     :return: a list containing the independant nodes, and a 2D list containing the biconnected components
             of the network that contains exactly one articulation point (the articulation point are removed from the
             components definitions)
     """
-    with open(reduction_file, 'r') as file:
+    with open_instance_file(reduction_file) as file:
         lines = file.readlines()
     if lines[0].strip(): # si la ligne n'est pas vide
         independent_nodes = [int(node) for node in lines[0].strip().split(' ')]
@@ -80,25 +228,82 @@ def read_reductions(reduction_file):
     return independent_nodes, biconnected_components
 
 
+def read_graphs_csv(path):
+    """
+    Read the description of the instances of a directory
+    :param path: path to a graphs.csv file (possibly inside an archive)
+    :return: a dictionary mapping the path of each instance (next to graphs.csv) to its number of nodes and routes
+    """
+    sizes = {}
+    directory = posixpath.dirname(path)
+    with open_instance_file(path) as file:
+        for row in csv.DictReader(file, delimiter=';'):
+            instance = posixpath.join(directory, posixpath.basename(row["Name"]))
+            sizes[instance] = (int(row["Nodes"]), int(row["Routes"]))
+    return sizes
+
+
+def read_header(input_file):
+    """
+    :param input_file: a file object opened on an instance
+    :return: the number of nodes and the number of routes of the instance
+    """
+    nodes_number, route_number = input_file.readline().split()[:2]
+    return int(nodes_number), int(route_number)
+
+
+def iter_routes(input_file, route_number):
+    """
+    Parse the routes of an instance one line at a time
+    :param input_file: a file object opened on an instance, after its header (see read_header)
+    :param route_number: the number of routes to read
+    :return: a generator of tuples (start, end, nodes), nodes is the list of the nodes crossed by the route
+    """
+    for _, line in zip(range(route_number), input_file):
+        indexes, _, route_string = line.partition('|')
+        index_a, index_b = indexes.split()
+        yield int(index_a), int(index_b), [int(node) for node in route_string.split()]
+
+
+def stream_instance(filename):
+    """
+    Parse an instance in a single pass over the file : each route is written right away in the flat arrays of the
+    instance and in the symptom of the nodes it crosses, no route object is ever built
+    :param filename: the path to the file containing the instance (possibly inside an archive)
+    :return: an InstanceArrays and the SymptomMatrix of the instance
+    """
+    starts, ends = array('i'), array('i')
+    indptr, indices = array('q', [0]), array('i')
+    with open_instance_file(filename) as input_file:
+        nodes_number, route_number = read_header(input_file)
+        row_bytes = (route_number + 7) >> 3
+        rows = [bytearray(row_bytes) for _ in range(nodes_number)]
+        for route, (start, end, nodes) in enumerate(iter_routes(input_file, route_number)):
+            starts.append(start)
+            ends.append(end)
+            indices.extend(nodes)
+            indptr.append(len(indices))
+            byte, bit = route >> 3, 1 << (route & 7)
+            for node in nodes:
+                rows[node][byte] |= bit
+
+    arrays = InstanceArrays(nodes_number, starts, ends, indptr, indices)
+    for node, row in enumerate(rows):
+        rows[node] = int.from_bytes(row, 'little')
+    return arrays, SymptomMatrix(nodes_number, arrays.m, rows)
+
+
 def parse_instance(filename):
     """
     parse instances
-    :param filename: the path to the file containing the instance
+    :param filename: the path to the file containing the instance (possibly inside an archive)
     :return: a tuple (nodes_number, routes) where nodes_number is an integer representing the number of nodes
             and routes is a list of Route objects containing each available route in the network
     """
-    with open(filename, 'r') as input_file:
-        lines = input_file.readlines()
-
-    nodes_number = int(lines[0].split(" ")[0])
-    route_number = int(lines[0].split(" ")[1])
-
-    routes = []
-    for i in range(1, route_number+1):
-        indexes, route_string = lines[i].split(' | ')
-        index_a, index_b = indexes.split(" ")
-        route = route_string.split(" ")
-        routes.append(Route(int(index_a), int(index_b), set([int(node) for node in route]), i-1))
+    with open_instance_file(filename) as input_file:
+        nodes_number, route_number = read_header(input_file)
+        routes = [Route(start, end, set(nodes), index)
+                  for index, (start, end, nodes) in enumerate(iter_routes(input_file, route_number))]
 
     return nodes_number, routes
 
@@ -0,0 +1,324 @@
+from collections import defaultdict
+from random import Random
+
+from symptoms import iter_bits, mask_from_indices
+
+
+def endpoint_masks(n, endpoints):
+    """
+    Compute for each node the bitsets of the routes starting and ending at this node
+    :param n: the number of nodes
+    :param endpoints: a list of tuples : endpoints[j] contains the starting and ending nodes of route j
+    :return: two lists of n bitsets over the routes (starting routes, ending routes)
+    """
+    starting = [[] for _ in range(n)]
+    ending = [[] for _ in range(n)]
+    for index, (src, dest) in enumerate(endpoints):
+        if src >= 0:
+            starting[src].append(index)
+        if dest >= 0:
+            ending[dest].append(index)
+    m = len(endpoints)
+    return [mask_from_indices(routes, m) for routes in starting], [mask_from_indices(routes, m) for routes in ending]
+
+
+def scoped_rows(symptoms, nodes=None):
+    """
+    :param symptoms: a SymptomMatrix
+    :param nodes: the nodes to consider, all the nodes if None
+    :return: an iterable of tuples (node, symptom row)
+    """
+    if nodes is None:
+        return enumerate(symptoms.rows)
+    return ((node, symptoms.rows[node]) for node in nodes)
+
+
+def route_nodes(symptoms, nodes=None):
+    """
+    Transpose the symptoms
+    :param symptoms: a SymptomMatrix
+    :param nodes: the nodes to consider (see scope.scope_problem), all the nodes if None
+    :return: a list of m tuples, the nodes crossed by each route
+    """
+    crossed = [[] for _ in range(symptoms.m)]
+    for node, row in scoped_rows(symptoms, nodes):
+        for route in iter_bits(row):
+            crossed[route].append(node)
+    return [tuple(nodes) for nodes in crossed]
+
+
+def measurement_paths(endpoints, monitors):
+    """
+    Compute the set of measurement paths from the set of monitors
+    :param endpoints: a list of tuples : endpoints[j] contains the starting and ending nodes of route j
+    :param monitors: a collection of nodes
+    :return: a bitset over the routes, bit j is set iff both endpoints of route j are monitors
+    """
+    monitors = set(monitors)
+    return mask_from_indices([index for index, (src, dest) in enumerate(endpoints)
+                              if src in monitors and dest in monitors], len(endpoints))
+
+
+def uncovered_nodes(symptoms, path_mask, nodes=None):
+    """
+    :param symptoms: a SymptomMatrix
+    :param path_mask: a bitset containing the measurement paths
+    :param nodes: the nodes to identify, all the nodes if None
+    :return: the list of nodes crossed by no measurement path
+    """
+    return [node for node, row in scoped_rows(symptoms, nodes) if row & path_mask == 0]
+
+
+def indistinguishable_pairs(symptoms, path_mask, nodes=None):
+    """
+    Find the pairs of nodes that are crossed by exactly the same measurement paths
+    :param symptoms: a SymptomMatrix
+    :param path_mask: a bitset containing the measurement paths
+    :param nodes: the sorted nodes to identify, all the nodes if None
+    :return: a list of tuples (node_a, node_b) with node_a < node_b
+    """
+    groups = defaultdict(list)
+    for node, row in scoped_rows(symptoms, nodes):
+        groups[row & path_mask].append(node)
+
+    pairs = []
+    for nodes in groups.values():
+        for index, node_a in enumerate(nodes):
+            for node_b in nodes[index + 1:]:
+                pairs.append((node_a, node_b))
+    return pairs
+
+
+def is_covered(symptoms, path_mask, nodes=None):
+    """
+    Test if each node is crossed by at least one measurement path, in O(n·m/64)
+    :param symptoms: a SymptomMatrix
+    :param path_mask: a bitset containing the measurement paths
+    :param nodes: the nodes to identify, all the nodes if None
+    :return: True if each node is covered, False otherwise
+    """
+    return all(row & path_mask for _, row in scoped_rows(symptoms, nodes))
+
+
+def is_1id(symptoms, path_mask, nodes=None):
+    """
+    Test if each node is 1-identifiable, i.e. if the symptoms restricted to the measurement paths are non-empty
+    and pairwise distinct, in O(n·m/64)
+    :param symptoms: a SymptomMatrix
+    :param path_mask: a bitset containing the measurement paths
+    :param nodes: the nodes to identify (they only need to be distinguished from each other), all the nodes if None
+    :return: True if each node is 1-identifiable, False otherwise
+    """
+    signatures = set()
+    for _, row in scoped_rows(symptoms, nodes):
+        signature = row & path_mask
+        if signature == 0 or signature in signatures:
+            return False
+        signatures.add(signature)
+    return True
+
+
+class IdentifiabilityChecker:
+    """
+    class maintaining the restricted symptoms of the nodes while monitors are added or removed. Each restricted
+    symptom is summarized by a 64 bits fingerprint (xor of random route weights) and a coverage counter, so that a move
+    only costs O(changed paths x path length) instead of O(n·m/64)
+    """
+
+    def __init__(self, symptoms, endpoints, monitors=(), seed=0, nodes=None):
+        """
+        create an IdentifiabilityChecker object
+        :param symptoms: a SymptomMatrix, symptoms[i] contains the indexes of the routes that cross node i
+        :param endpoints: a list of tuples : endpoints[j] contains the starting and ending nodes of route j
+        :param monitors: the initial set of monitors
+        :param seed: seed of the random route weights
+        :param nodes: the nodes to identify, the other nodes are neither covered nor distinguished (all the nodes if
+                    None)
+        """
+        self.symptoms = symptoms
+        self.nodes = range(symptoms.n) if nodes is None else sorted(nodes)
+        self.starting, self.ending = endpoint_masks(symptoms.n, endpoints)
+        self.route_nodes = route_nodes(symptoms, nodes)
+        generator = Random(seed)
+        self.weights = [generator.getrandbits(64) | 1 for _ in range(symptoms.m)]
+
+        self.monitors = set()
+        self.src_mask = 0  # routes starting at a monitor
+        self.dest_mask = 0  # routes ending at a monitor
+        self.path_mask = 0
+        self.fingerprints = [0] * symptoms.n
+        self.coverage = [0] * symptoms.n  # number of measurement paths crossing each node
+        self.uncovered_nbr = len(self.nodes)
+        # nodes sharing each fingerprint
+        self.groups = defaultdict(set)
+        self.groups[0] = set(self.nodes)
+        self.collisions = len(self.nodes) * (len(self.nodes) - 1) // 2
+        for monitor in monitors:
+            self.add_monitor(monitor)
+
+    def _paths_after(self, add=(), remove=()):
+        if not set(add).isdisjoint(remove):
+            raise ValueError(f"nodes both added and removed : {sorted(set(add) & set(remove))}")
+        src_mask, dest_mask = self.src_mask, self.dest_mask
+        for node in add:
+            if node not in self.monitors:
+                src_mask |= self.starting[node]
+                dest_mask |= self.ending[node]
+        for node in remove:
+            if node in self.monitors:
+                src_mask &= ~self.starting[node]
+                dest_mask &= ~self.ending[node]
+        return src_mask, dest_mask
+
+    def _changes(self, path_mask):
+        """
+        :return: two dicts giving the fingerprint and the coverage counter of each node crossed by a path that
+                changes, with the given measurement paths (the other nodes keep theirs)
+        """
+        fingerprints = {}
+        coverage = {}
+        for routes, sign in ((path_mask & ~self.path_mask, 1), (self.path_mask & ~path_mask, -1)):
+            for route in iter_bits(routes):
+                weight = self.weights[route]
+                for node in self.route_nodes[route]:
+                    fingerprints[node] = fingerprints.get(node, self.fingerprints[node]) ^ weight
+                    coverage[node] = coverage.get(node, self.coverage[node]) + sign
+        return fingerprints, coverage
+
+    def _apply(self, add=(), remove=()):
+        self.src_mask, self.dest_mask = self._paths_after(add, remove)
+        path_mask = self.src_mask & self.dest_mask
+        fingerprints, coverage = self._changes(path_mask)
+        self.path_mask = path_mask
+        for node, fingerprint in fingerprints.items():
+            self.uncovered_nbr += (coverage[node] == 0) - (self.coverage[node] == 0)
+            self.coverage[node] = coverage[node]
+            old_group = self.groups[self.fingerprints[node]]
+            old_group.discard(node)
+            self.collisions -= len(old_group)
+            if not old_group:
+                del self.groups[self.fingerprints[node]]
+            new_group = self.groups[fingerprint]
+            self.collisions += len(new_group)
+            new_group.add(node)
+            self.fingerprints[node] = fingerprint
+
+    def add_monitor(self, node):
+        """
+        Add a monitor and update the nodes crossed by the new measurement paths
+        :param node: the new monitor
+        """
+        if node not in self.monitors:
+            self._apply(add=(node,))
+            self.monitors.add(node)
+
+    def remove_monitor(self, node):
+        """
+        Remove a monitor and update the nodes crossed by the lost measurement paths
+        :param node: the removed monitor
+        """
+        if node in self.monitors:
+            self._apply(remove=(node,))
+            self.monitors.discard(node)
+
+    def uncovered(self):
+        """
+        :return: the set of nodes crossed by no measurement path
+        """
+        return {node for node in self.nodes if self.coverage[node] == 0}
+
+    def is_covered(self):
+        return self.uncovered_nbr == 0
+
+    def is_1id(self):
+        return self.uncovered_nbr == 0 and self.collisions == 0
+
+    def _colliding_pairs(self, nodes, path_mask):
+        """
+        :return: the pairs of the given nodes (sharing a fingerprint) whose symptoms restricted to path_mask are equal
+        """
+        rows = self.symptoms.rows
+        nodes = sorted(nodes)
+        return [(node_a, node_b) for index, node_a in enumerate(nodes) for node_b in nodes[index + 1:]
+                if (rows[node_a] ^ rows[node_b]) & path_mask == 0]
+
+    def offending_pairs(self):
+        """
+        :return: a list of tuples (node_a, node_b), node_a < node_b, of nodes that cannot be distinguished with the
+                current measurement paths (the fingerprints collisions are checked on the actual symptoms)
+        """
+        pairs = []
+        for nodes in self.groups.values():
+            if len(nodes) > 1:
+                pairs.extend(self._colliding_pairs(nodes, self.path_mask))
+        return pairs
+
+    def delta(self, add=(), remove=(), goal="1id"):
+        """
+        Evaluate a move without applying it
+        :param add: the monitors to add
+        :param remove: the monitors to remove, a ValueError is raised if a node is both added and removed
+        :param goal: "cover" or "1id"
+        :return: the number of uncovered nodes and the number of indistinguishable pairs of nodes after the move
+                (the latter is None if goal is "cover"), see delta_offenders to get the nodes themselves
+        """
+        src_mask, dest_mask = self._paths_after(add, remove)
+        fingerprints, coverage = self._changes(src_mask & dest_mask)
+        touched = fingerprints
+
+        uncovered = self.uncovered_nbr
+        for node in touched:
+            uncovered += (coverage[node] == 0) - (self.coverage[node] == 0)
+        if goal != "1id":
+            return uncovered, None
+
+        # collisions between untouched nodes are kept, recount the ones involving touched nodes
+        collisions = self.collisions
+        for node in touched:
+            for other in self.groups[self.fingerprints[node]]:
+                if other != node and (other not in touched or other < node):
+                    collisions -= 1
+        new_groups = defaultdict(int)
+        for node in touched:
+            fingerprint = fingerprints[node]
+            untouched = sum(1 for other in self.groups.get(fingerprint, ()) if other not in touched)
+            collisions += new_groups[fingerprint] + untouched
+            new_groups[fingerprint] += 1
+
+        return uncovered, collisions
+
+    def delta_offenders(self, add=(), remove=(), goal="1id"):
+        """
+        Evaluate a move without applying it, like delta, but report the offending nodes instead of counting them. Only
+        the nodes crossed by a changing path are regrouped, the groups of the other nodes are kept
+        :param add: the monitors to add
+        :param remove: the monitors to remove, a ValueError is raised if a node is both added and removed
+        :param goal: "cover" or "1id"
+        :return: the sorted list of uncovered nodes and the sorted list of tuples (node_a, node_b), node_a < node_b, of
+                indistinguishable nodes after the move (the latter is None if goal is "cover")
+        """
+        src_mask, dest_mask = self._paths_after(add, remove)
+        path_mask = src_mask & dest_mask
+        fingerprints, coverage = self._changes(path_mask)
+        touched = fingerprints
+
+        uncovered = {node for node in self.nodes if self.coverage[node] == 0 and node not in touched}
+        uncovered.update(node for node in touched if coverage[node] == 0)
+        if goal != "1id":
+            return sorted(uncovered), None
+
+        pairs = []
+        for nodes in self.groups.values():
+            untouched = [node for node in nodes if node not in touched]
+            if len(untouched) > 1:
+                pairs.extend(self._colliding_pairs(untouched, path_mask))
+        new_groups = defaultdict(list)
+        for node in touched:
+            new_groups[fingerprints[node]].append(node)
+        for fingerprint, nodes in new_groups.items():
+            untouched = [other for other in self.groups.get(fingerprint, ()) if other not in touched]
+            pairs.extend(self._colliding_pairs(nodes, path_mask))
+            rows = self.symptoms.rows
+            pairs.extend((min(node, other), max(node, other)) for node in nodes for other in untouched
+                         if (rows[node] ^ rows[other]) & path_mask == 0)
+        return sorted(uncovered), sorted(pairs)
@@ -0,0 +1,37 @@
+import os
+import random
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "exact_models"))
+
+from symptoms import SymptomMatrix, mask_from_indices  # noqa: E402
+
+
+@pytest.fixture
+def random_instance():
+    """
+    :return: a function building a random instance from a seed : the number of nodes, its SymptomMatrix and the
+            endpoints of its routes (the endpoints of a route are among the nodes it crosses). With unique_endpoints,
+            two routes never share both endpoints
+    """
+    def build(seed, max_nodes=9, max_routes=30, unique_endpoints=False):
+        generator = random.Random(seed)
+        n = generator.randint(2, max_nodes)
+        if unique_endpoints:
+            # at most one route between two nodes, as in the instances
+            pairs = [(src, dest) for src in range(n) for dest in range(n)]
+            endpoints = generator.sample(pairs, generator.randint(1, min(max_routes, len(pairs))))
+        else:
+            endpoints = [(generator.randrange(n), generator.randrange(n))
+                         for _ in range(generator.randint(1, max_routes))]
+        m = len(endpoints)
+        crossed = [[] for _ in range(n)]
+        for route, (src, dest) in enumerate(endpoints):
+            for node in range(n):
+                if node in (src, dest) or generator.random() < 0.3:
+                    crossed[node].append(route)
+        return n, SymptomMatrix(n, m, [mask_from_indices(routes, m) for routes in crossed]), endpoints
+    return build
@@ -0,0 +1,48 @@
+import random
+
+import pytest
+
+from incremental import IncrementalInstance
+from symptoms import SymptomMatrix
+from utils import Route
+
+
+def random_delta(generator, instance):
+    """
+    :return: the added routes, the removed routes and the changed routes of a random route delta
+    """
+    n = instance.n
+    routes = list(instance.endpoints)
+    removed = generator.sample(routes, generator.randint(0, min(2, len(routes) - 1)))
+    kept = [route for route in routes if route not in removed]
+    changed = [Route(start, end, set(generator.sample(range(n), generator.randint(0, n))) | {start, end}, None)
+               for start, end in generator.sample(kept, generator.randint(0, min(2, len(kept))))]
+    added = []
+    for _ in range(generator.randint(0, 2)):
+        start, end = generator.randrange(n), generator.randrange(n)
+        if (start, end) not in routes and all((start, end) != (route.start, route.end) for route in added):
+            added.append(Route(start, end, set(generator.sample(range(n), generator.randint(0, n))) | {start, end},
+                               None))
+    return added, removed, changed
+
+
+@pytest.mark.parametrize("seed", range(100))
+@pytest.mark.parametrize("goal", ["cover", "1id"])
+def test_patched_constraints_match_rebuild(random_instance, seed, goal):
+    # the routes of an instance are identified by their endpoints
+    n, symptoms, endpoints = random_instance(seed, unique_endpoints=True)
+    instance = IncrementalInstance(n, symptoms, endpoints)
+    instance.patch_constraints(goal)
+
+    generator = random.Random(seed)
+    for _ in range(3):
+        instance.apply_delta(*random_delta(generator, instance))
+        instance.patch_constraints(goal)
+
+        rebuilt = IncrementalInstance(n, instance.symptoms, instance.endpoints)
+        rebuilt.patch_constraints(goal)
+        assert instance.constraints == rebuilt.constraints
+        # the symptoms updated in place are those of the routes after the deltas
+        routes = [Route(start, end, set(nodes), index)
+                  for index, ((start, end), nodes) in enumerate(zip(instance.endpoints, instance.route_nodes))]
+        assert instance.symptoms.rows == SymptomMatrix.from_routes(n, routes).rows
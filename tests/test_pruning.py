@@ -0,0 +1,47 @@
+import random
+
+import pytest
+
+from pruning import minimal_masks, prune_constraints
+
+
+def naive_minimal_masks(masks):
+    """
+    :return: the set of the indexes of the first occurrence of each bitset that has no strict subset among the masks
+    """
+    kept = set()
+    for index, mask in enumerate(masks):
+        first = masks.index(mask) == index
+        subsumed = any(other & mask == other and other != mask for other in masks)
+        if first and not subsumed:
+            kept.add(index)
+    return kept
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_minimal_masks_matches_naive_subsumption(seed):
+    generator = random.Random(seed)
+    m = generator.randint(1, 200)
+    masks = [generator.getrandbits(m) | 1 << generator.randrange(m) for _ in range(generator.randint(1, 40))]
+    # some duplicated bitsets and supersets of other bitsets
+    masks += [mask | generator.getrandbits(m) for mask in generator.sample(masks, len(masks) // 2)]
+    assert minimal_masks(masks, m) == naive_minimal_masks(masks)
+
+
+@pytest.mark.parametrize("seed", range(50))
+@pytest.mark.parametrize("goal", ["cover", "1id"])
+def test_pruned_constraints_are_equivalent(random_instance, seed, goal):
+    n, symptoms, _ = random_instance(seed)
+    constraints, stats = prune_constraints(symptoms, goal)
+    kept = list(constraints)
+    masks = list(symptoms.rows)
+    if goal == "1id":
+        masks += [mask for _, _, mask in symptoms.pair_masks()]
+    if stats["infeasible"]:
+        assert 0 in masks
+        return
+    # every constraint of the model is implied by a kept one, and every kept one is a constraint of the model
+    assert all(any(constraint & mask == constraint for constraint in kept) for mask in masks)
+    assert set(kept) <= set(masks)
+    assert len(kept) == len(set(kept))
+    assert not any(other & constraint == other and other != constraint for constraint in kept for other in kept)
@@ -0,0 +1,24 @@
+import os
+
+import pytest
+
+from graph import read_edges
+from instance_cache import load_instance
+from reductions import independent_nodes, leaf_components
+from utils import read_reductions
+
+ZOO = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "instances", "IGP_weight_based",
+                   "zoo.tar.gz")
+# instances with independent nodes and one or several leaf components, and instances without any reduction
+INSTANCES = ["Arpanet196912", "Nsfcnet", "Claranet", "Pacificwave", "Noel", "Airtel", "Telecomserbia"]
+
+
+@pytest.mark.parametrize("name", INSTANCES)
+def test_reductions_match_bundled_rdc(name):
+    instance = f"{ZOO}:zoo/{name}.routes"
+    n, symptoms, endpoints = load_instance(instance, use_cache=False)
+    independent, components = read_reductions(instance.replace('.routes', '.rdc'))
+    adjacency = read_edges(instance.replace('.routes', '.edges'))[1]
+
+    assert sorted(independent_nodes(symptoms, endpoints)) == sorted(independent)
+    assert sorted(map(sorted, leaf_components(adjacency))) == sorted(map(sorted, components))
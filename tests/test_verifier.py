@@ -0,0 +1,49 @@
+import random
+
+import pytest
+
+from verifier import (IdentifiabilityChecker, indistinguishable_pairs, is_1id, is_covered, measurement_paths,
+                      uncovered_nodes)
+
+
+def random_move(generator, n, monitors):
+    """
+    :return: a list of nodes to add and a disjoint list of nodes to remove
+    """
+    add = generator.sample(range(n), generator.randint(0, 2))
+    remove = [node for node in generator.sample(sorted(monitors), min(len(monitors), generator.randint(0, 2)))
+              if node not in add]
+    return add, remove
+
+
+@pytest.mark.parametrize("seed", range(300))
+def test_delta_matches_verification_after_move(random_instance, seed):
+    n, symptoms, endpoints = random_instance(seed)
+    generator = random.Random(seed)
+    nodes = None if seed % 2 else sorted(generator.sample(range(n), generator.randint(1, n)))
+    monitors = generator.sample(range(n), generator.randint(0, n))
+    checker = IdentifiabilityChecker(symptoms, endpoints, monitors, seed=seed, nodes=nodes)
+    add, remove = random_move(generator, n, monitors)
+
+    path_mask = measurement_paths(endpoints, (set(monitors) | set(add)) - set(remove))
+    uncovered = uncovered_nodes(symptoms, path_mask, nodes)
+    pairs = indistinguishable_pairs(symptoms, path_mask, nodes)
+    assert checker.delta(add, remove, "cover") == (len(uncovered), None)
+    assert checker.delta(add, remove, "1id") == (len(uncovered), len(pairs))
+    assert checker.delta_offenders(add, remove, "1id") == (sorted(uncovered), sorted(pairs))
+
+    # the move is not applied by delta, applying it gives the same verdicts as a full verification
+    for node in add:
+        checker.add_monitor(node)
+    for node in remove:
+        checker.remove_monitor(node)
+    assert checker.is_covered() == is_covered(symptoms, path_mask, nodes)
+    assert checker.is_1id() == is_1id(symptoms, path_mask, nodes)
+    assert sorted(checker.offending_pairs()) == sorted(pairs)
+
+
+def test_delta_rejects_overlapping_moves(random_instance):
+    n, symptoms, endpoints = random_instance(0)
+    checker = IdentifiabilityChecker(symptoms, endpoints, range(n))
+    with pytest.raises(ValueError):
+        checker.delta(add=(0,), remove=(0,))